@@ -1,5 +1,6 @@
 from decimal import Decimal
 from django.conf import settings
+from django.utils.functional import cached_property
 from shop.models import Product
 from coupons.models import Coupon
 
@@ -23,12 +24,12 @@ class Cart:
         Initialize the cart with the current session.
         """
         self.session = request.session
-        cart = self.session.get(settings.CART_SESSION_ID)
-        if not cart:
-            # Create empty cart if it doesn't exist
-            cart = self.session[settings.CART_SESSION_ID] = {}
-        self.cart = cart
+        # An empty cart is only stored by `save()`, so browsing without
+        # adding anything never writes (or creates) a session
+        self.cart = self.session.get(settings.CART_SESSION_ID) or {}
         self.coupon_id = self.session.get('coupon_id')
+        # Items with their products, loaded on first iteration
+        self._items = None
 
     def add(self, product, quantity=1, override_quantity=False):
         """
@@ -52,9 +53,12 @@ class Cart:
 
     def save(self):
         """
-        Mark the session as modified to ensure it is saved.
+        Store the cart in the session and mark it as modified to ensure it
+        is saved.
         """
+        self.session[settings.CART_SESSION_ID] = self.cart
         self.session.modified = True
+        self._items = None
 
     def remove(self, product):
         """
@@ -72,22 +76,28 @@ class Cart:
         """
         Iterate over the items in the cart and attach the Product instance.
 
+        The items are built with one query on the first iteration and reused
+        by later ones, so values a view adds to them (such as the update
+        forms of `cart_detail`) are still there when the template iterates.
+
         Yields:
             dict: Contains 'product', 'price', 'quantity', and 'total_price'
         """
-        product_ids = self.cart.keys()
-        products = Product.objects.filter(id__in=product_ids)
-        cart = self.cart.copy()
+        if self._items is None:
+            products = Product.objects.filter(id__in=self.cart.keys())
+            # Copy the items too, so products and Decimals never end up in the session
+            cart = {product_id: item.copy() for product_id, item in self.cart.items()}
 
-        # Attach product instances to cart items
-        for product in products:
-            cart[str(product.id)]['product'] = product
+            # Attach product instances to cart items
+            for product in products:
+                cart[str(product.id)]['product'] = product
 
-        # Convert price to Decimal and compute total price per item
-        for item in cart.values():
-            item['price'] = Decimal(item['price'])
-            item['total_price'] = item['price'] * item['quantity']
-            yield item
+            # Convert price to Decimal and compute total price per item
+            for item in cart.values():
+                item['price'] = Decimal(item['price'])
+                item['total_price'] = item['price'] * item['quantity']
+            self._items = list(cart.values())
+        yield from self._items
 
     def __len__(self):
         """
@@ -105,13 +115,15 @@ class Cart:
         """
         Remove cart from session.
         """
-        del self.session[settings.CART_SESSION_ID]
-        self.save()
+        self.session.pop(settings.CART_SESSION_ID, None)
+        self.cart = {}
+        self._items = None
 
-    @property
+    @cached_property
     def coupon(self):
         """
-        Get the currently applied coupon, if any.
+        Get the currently applied coupon, if any. Looked up once per cart,
+        as the cart page reads it several times.
 
         Returns:
             Coupon or None
@@ -123,6 +135,14 @@ class Cart:
                 pass
         return None
 
+    def remove_coupon(self):
+        """
+        Remove the applied coupon from the cart and the session.
+        """
+        self.session['coupon_id'] = self.coupon_id = None
+        # Drop the coupon cached by the `coupon` property
+        self.__dict__.pop('coupon', None)
+
     def get_discount(self):
         """
         Compute discount amount based on applied coupon.
@@ -0,0 +1,95 @@
+import base64
+import csv
+import secrets
+from .models import Coupon
+
+# Bulk generation of single-use coupon codes.
+# Codes are drawn from a cryptographic random source and inserted in
+# fixed-size batches, so memory use does not grow with the number of codes.
+
+# 32 upper-case letters and digits without the easily confused 0/O and 1/I,
+# so every symbol encodes exactly 5 random bits
+ALPHABET = 'ABCDEFGHJKLMNPQRSTUVWXYZ23456789'
+_FROM_BASE32 = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ234567', ALPHABET)
+
+CSV_FIELDS = ['code', 'discount', 'valid_from', 'valid_to', 'max_uses']
+
+
+def random_code(length, prefix=''):
+    """
+    Returns a random coupon code.
+
+    With the default length of 12 a code carries 60 bits of entropy, so
+    collisions stay negligible across many millions of codes.
+    """
+    random_bytes = secrets.token_bytes((length * 5 + 7) // 8)
+    return prefix + base64.b32encode(random_bytes).decode()[:length].translate(_FROM_BASE32)
+
+
+def generate_coupons(count, discount, valid_from, valid_to, prefix='', length=12,
+                     max_uses=1, batch_size=5000):
+    """
+    Creates `count` unique coupons and yields them batch by batch.
+
+    Each batch drops codes that already exist, inserts the rest with
+    `bulk_create(ignore_conflicts=True)` and confirms which codes were
+    stored. Codes lost to a collision are generated again in the next
+    batch until `count` coupons have been created.
+
+    Args:
+        count (int): Number of coupons to create.
+        discount (int): Discount percentage of every coupon.
+        valid_from (datetime): Start of validity.
+        valid_to (datetime): End of validity.
+        prefix (str): Prefix of every code, e.g. a campaign name.
+        length (int): Number of random characters after the prefix.
+        max_uses (int, optional): Redemption limit per code; None for none.
+        batch_size (int): Coupons inserted per query batch.
+
+    Yields:
+        list[Coupon]: The coupons created in one batch (without primary keys).
+    """
+    remaining = count
+    while remaining > 0:
+        codes = set()
+        while len(codes) < min(batch_size, remaining):
+            codes.add(random_code(length, prefix))
+        codes -= set(Coupon.objects.filter(code__in=codes).values_list('code', flat=True))
+
+        coupons = [
+            Coupon(code=code, discount=discount, valid_from=valid_from,
+                   valid_to=valid_to, max_uses=max_uses)
+            for code in codes
+        ]
+        Coupon.objects.bulk_create(coupons, batch_size=batch_size, ignore_conflicts=True)
+        # A concurrent writer may have taken a code between the check and the insert
+        stored = set(
+            Coupon.objects
+            .filter(code__in=codes, valid_from=valid_from, valid_to=valid_to, discount=discount)
+            .values_list('code', flat=True)
+        )
+        created = [coupon for coupon in coupons if coupon.code in stored]
+        remaining -= len(created)
+        yield created
+
+
+def csv_row(coupon):
+    """
+    Returns the CSV export row of a coupon, in `CSV_FIELDS` order.
+    """
+    return [getattr(coupon, field) for field in CSV_FIELDS]
+
+
+def write_csv(stream, coupons, header=False):
+    """
+    Writes coupons to a CSV stream.
+
+    Args:
+        stream: File-like object to write to.
+        coupons (Iterable[Coupon]): Coupons to write.
+        header (bool): Write the header row first.
+    """
+    writer = csv.writer(stream)
+    if header:
+        writer.writerow(CSV_FIELDS)
+    writer.writerows(csv_row(coupon) for coupon in coupons)
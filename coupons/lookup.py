@@ -0,0 +1,58 @@
+from django.core.cache import cache
+from django.db.models import Value
+from django.db.models.functions import Upper
+from django.utils import timezone
+from .models import Coupon
+
+# Case-insensitive coupon lookup.
+# Codes are matched on UPPER(code), which is served by the functional index
+# on Coupon, and currently valid coupons are cached until they expire so a
+# popular code does not hit the database on every apply.
+
+MAX_CACHE_TIMEOUT = 60 * 60
+
+
+def _cache_key(code):
+    """
+    Returns the cache key of a coupon code, normalized to upper case.
+    """
+    return f'coupons:valid:{code.upper()}'
+
+
+def get_valid_coupon(code):
+    """
+    Returns the active coupon with the given code if it is valid now.
+
+    The code is compared case-insensitively. A valid coupon is cached until
+    its `valid_to` (at most `MAX_CACHE_TIMEOUT` seconds); saving or deleting
+    a coupon clears its entry (see `coupons.signals`).
+
+    Args:
+        code (str): Code entered by the customer.
+
+    Returns:
+        Coupon or None: The coupon, or None if no valid coupon matches.
+    """
+    now = timezone.now()
+    key = _cache_key(code)
+    coupon = cache.get(key)
+    if coupon is not None and coupon.valid_from <= now <= coupon.valid_to:
+        return coupon
+
+    coupon = (
+        Coupon.objects
+        .annotate(code_upper=Upper('code'))
+        .filter(code_upper=Upper(Value(code)), valid_from__lte=now, valid_to__gte=now, active=True)
+        .first()
+    )
+    if coupon is not None:
+        timeout = min((coupon.valid_to - now).total_seconds(), MAX_CACHE_TIMEOUT)
+        cache.set(key, coupon, timeout)
+    return coupon
+
+
+def invalidate(*codes):
+    """
+    Removes the cached coupons for the given codes.
+    """
+    cache.delete_many([_cache_key(code) for code in codes if code])
@@ -0,0 +1,90 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from coupons import redemption
+from coupons.models import Coupon
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    """
+    Measures how much coupon redemption limits slow down parallel checkouts.
+
+    Every checkout creates an order and redeems one hot coupon in a single
+    transaction. The run is repeated with an unlimited coupon and with a
+    limited one, so the cost of the locked usage counter can be compared,
+    and the limited run verifies that the limit was never exceeded. Run it
+    against a database that allows concurrent writers (PostgreSQL, or a
+    file-based SQLite database):
+
+        python manage.py bench_coupon_redemption --threads 16 --checkouts 2000 --max-uses 1000
+    """
+    help = 'Benchmark concurrent checkouts redeeming one coupon, with and without limits.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16, help='Number of parallel checkouts.')
+        parser.add_argument('--checkouts', type=int, default=1000, help='Checkouts per run.')
+        parser.add_argument('--max-uses', type=int, default=500, help='Limit of the limited coupon.')
+        parser.add_argument('--customers', type=int, default=100, help='Number of distinct e-mails.')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        coupons = []
+        try:
+            for label, max_uses, per_email in [
+                ('unlimited', None, None),
+                ('limited', options['max_uses'], None),
+                ('limited per e-mail', options['max_uses'], 5),
+            ]:
+                coupon = Coupon.objects.create(
+                    code=f'BENCH-{time.time_ns()}', valid_from=now, valid_to=now + timedelta(hours=1),
+                    discount=10, max_uses=max_uses, max_uses_per_email=per_email
+                )
+                coupons.append(coupon)
+                self.run(label, coupon, options)
+        finally:
+            Order.objects.filter(coupon__in=coupons).delete()
+            Coupon.objects.filter(id__in=[c.id for c in coupons]).delete()
+
+    def run(self, label, coupon, options):
+        """
+        Runs one round of parallel checkouts with `coupon` and reports it.
+        """
+        def checkout(i):
+            start = time.perf_counter()
+            try:
+                with transaction.atomic():
+                    order = Order.objects.create(
+                        first_name='Bench', last_name='Mark', email=f'bench{i % options["customers"]}@example.com',
+                        address='-', postal_code='00000', city='-', coupon=coupon, discount=coupon.discount
+                    )
+                    redemption.redeem(coupon, order.email)
+                redeemed = True
+            except redemption.CouponUnavailable:
+                redeemed = False
+            finally:
+                connection.close()
+            return redeemed, time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            results = list(pool.map(checkout, range(options['checkouts'])))
+        elapsed = time.perf_counter() - start
+
+        coupon.refresh_from_db()
+        redeemed = sum(1 for ok, _ in results if ok)
+        orders = Order.objects.filter(coupon=coupon).count()
+        latencies = sorted(latency for _, latency in results)
+        self.stdout.write(
+            f'{label}: {len(results)} checkouts in {elapsed:.2f}s ({len(results) / elapsed:.0f}/s), '
+            f'{redeemed} redeemed, used_count {coupon.used_count}\n'
+            f'  latency p50 {statistics.median(latencies) * 1000:.1f}ms, '
+            f'p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f}ms, '
+            f'max {latencies[-1] * 1000:.1f}ms'
+        )
+        if orders != redeemed or (coupon.max_uses is not None and coupon.used_count > coupon.max_uses):
+            raise CommandError(f'{label}: redemption limit exceeded or orders lost.')
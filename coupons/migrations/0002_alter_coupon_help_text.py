@@ -0,0 +1,39 @@
+# Generated by Django 4.2.3 on 2026-10-19 08:14
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coupons', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='coupon',
+            name='active',
+            field=models.BooleanField(default=True, help_text='Indicates whether the coupon is currently active'),
+        ),
+        migrations.AlterField(
+            model_name='coupon',
+            name='code',
+            field=models.CharField(help_text='Unique code customers enter to get a discount', max_length=50, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='coupon',
+            name='discount',
+            field=models.IntegerField(help_text='Percentage value (0 to 100)', validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(100)]),
+        ),
+        migrations.AlterField(
+            model_name='coupon',
+            name='valid_from',
+            field=models.DateTimeField(help_text='Start date/time of coupon validity'),
+        ),
+        migrations.AlterField(
+            model_name='coupon',
+            name='valid_to',
+            field=models.DateTimeField(help_text='End date/time of coupon validity'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.3 on 2026-10-19 08:27
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coupons', '0002_alter_coupon_help_text'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='coupon',
+            index=models.Index(django.db.models.functions.text.Upper('code'), name='coupon_code_upper_idx'),
+        ),
+    ]
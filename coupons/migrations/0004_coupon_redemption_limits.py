@@ -0,0 +1,42 @@
+# Generated by Django 4.2.3 on 2026-10-19 08:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coupons', '0003_coupon_code_upper_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coupon',
+            name='max_uses',
+            field=models.PositiveIntegerField(blank=True, help_text='Maximum number of orders that can use the coupon; leave empty for no limit', null=True),
+        ),
+        migrations.AddField(
+            model_name='coupon',
+            name='max_uses_per_email',
+            field=models.PositiveIntegerField(blank=True, help_text='Maximum number of orders per customer e-mail; leave empty for no limit', null=True),
+        ),
+        migrations.AddField(
+            model_name='coupon',
+            name='used_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of orders that used the coupon while it had a limit'),
+        ),
+        migrations.CreateModel(
+            name='CouponUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=254)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('coupon', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usages', to='coupons.coupon')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='couponusage',
+            constraint=models.UniqueConstraint(fields=('coupon', 'email'), name='unique_coupon_usage'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models.functions import Upper
 
 class Coupon(models.Model):
     """
@@ -11,10 +12,14 @@ class Coupon(models.Model):
         valid_to (datetime): Expiration date/time of the coupon.
         discount (int): Discount percentage (0 to 100) applied to orders.
         active (bool): Whether the coupon is currently active.
+        max_uses (int): Total number of orders that may use the coupon; empty for no limit.
+        max_uses_per_email (int): Number of orders per customer e-mail; empty for no limit.
+        used_count (int): Number of orders that used a limited coupon.
 
     Usage:
         - Can be applied during checkout to reduce the order total.
-        - Validation of active status and valid date range should be handled in forms/views.
+        - Use `coupons.lookup.get_valid_coupon` to find a valid coupon by code.
+        - Redemption limits are enforced at checkout by `coupons.redemption`.
     """
     code = models.CharField(
         max_length=50,
@@ -28,6 +33,27 @@ class Coupon(models.Model):
         help_text='Percentage value (0 to 100)'
     )
     active = models.BooleanField(default=True, help_text="Indicates whether the coupon is currently active")
+    max_uses = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Maximum number of orders that can use the coupon; leave empty for no limit"
+    )
+    max_uses_per_email = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Maximum number of orders per customer e-mail; leave empty for no limit"
+    )
+    used_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Number of orders that used the coupon while it had a limit"
+    )
+
+    class Meta:
+        indexes = [
+            # Serves the case-insensitive lookup in `coupons.lookup`
+            models.Index(Upper('code'), name='coupon_code_upper_idx')
+        ]
 
     def __str__(self):
         """
@@ -35,3 +61,24 @@ class Coupon(models.Model):
         Returns the coupon code.
         """
         return self.code
+
+
+class CouponUsage(models.Model):
+    """
+    Number of orders placed with a coupon by one customer e-mail.
+
+    Only kept for coupons with `max_uses_per_email`, so the per-customer limit
+    is checked with a conditional update of a single row instead of counting
+    orders.
+    """
+    coupon = models.ForeignKey(Coupon, related_name='usages', on_delete=models.CASCADE)
+    email = models.EmailField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['coupon', 'email'], name='unique_coupon_usage')
+        ]
+
+    def __str__(self):
+        return f'{self.coupon} used by {self.email}'
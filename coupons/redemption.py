@@ -0,0 +1,94 @@
+from django.db.models import F
+from .models import Coupon, CouponUsage
+
+# Coupon redemption limits.
+# Like stock reservations, usage counters are only changed with conditional
+# UPDATE ... SET n = n + 1 WHERE n < limit statements, so concurrent
+# checkouts cannot exceed a limit and no counter is read and written back.
+# Unpaid orders give their redemption back when their stock is released
+# (see `orders.stock`).
+
+
+class CouponUnavailable(Exception):
+    """
+    Raised when a coupon has reached its redemption limit.
+    """
+
+    def __init__(self, coupon):
+        super().__init__(f'Coupon {coupon} is no longer available')
+        self.coupon = coupon
+
+
+def redeem(coupon, email):
+    """
+    Counts one order against the coupon's redemption limits.
+
+    Must run inside the transaction that creates the order, after the stock
+    reservation: the coupon row stays locked until the transaction commits,
+    so taking it last keeps the wait of concurrent checkouts short and the
+    lock order (products, then coupon) fixed. Coupons without limits are not
+    written at all and never serialize checkouts.
+
+    Args:
+        coupon (Coupon): The coupon applied to the order.
+        email (str): The customer's e-mail address.
+
+    Raises:
+        CouponUnavailable: If a limit has been reached. The caller's
+            transaction must be rolled back.
+    """
+    if coupon.max_uses_per_email is not None:
+        email = email.lower()
+        CouponUsage.objects.bulk_create(
+            [CouponUsage(coupon=coupon, email=email)],
+            ignore_conflicts=True
+        )
+        counted = (
+            CouponUsage.objects
+            .filter(coupon=coupon, email=email, count__lt=coupon.max_uses_per_email)
+            .update(count=F('count') + 1)
+        )
+        if not counted:
+            raise CouponUnavailable(coupon)
+
+    if coupon.max_uses is not None:
+        counted = (
+            Coupon.objects
+            .filter(id=coupon.id, used_count__lt=F('max_uses'))
+            .update(used_count=F('used_count') + 1)
+        )
+        if not counted:
+            raise CouponUnavailable(coupon)
+
+
+def give_back(coupon, email):
+    """
+    Takes one order off a coupon's redemption counters, for an unpaid order
+    whose checkout was abandoned or cancelled. Counters never drop below
+    zero.
+
+    Args:
+        coupon (Coupon): The coupon applied to the order.
+        email (str): The customer's e-mail address.
+    """
+    if coupon.max_uses_per_email is not None:
+        CouponUsage.objects.filter(coupon=coupon, email=email.lower(), count__gt=0).update(count=F('count') - 1)
+    if coupon.max_uses is not None:
+        Coupon.objects.filter(id=coupon.id, used_count__gt=0).update(used_count=F('used_count') - 1)
+
+
+def count_paid(coupon, email):
+    """
+    Counts an order whose redemption was given back but that was paid
+    after all. Limits are not checked: the customer has paid and the order
+    must stand.
+
+    Args:
+        coupon (Coupon): The coupon applied to the order.
+        email (str): The customer's e-mail address.
+    """
+    if coupon.max_uses_per_email is not None:
+        # The row was created when the order was placed
+        CouponUsage.objects.filter(coupon=coupon, email=email.lower()).update(count=F('count') + 1)
+    if coupon.max_uses is not None:
+        Coupon.objects.filter(id=coupon.id).update(used_count=F('used_count') + 1)
@@ -0,0 +1,25 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .lookup import invalidate
+from .models import Coupon
+
+
+@receiver(pre_save, sender=Coupon)
+def remember_old_code(sender, instance, **kwargs):
+    """
+    Records the stored code of a coupon about to be saved, so the cache
+    entry of a renamed code can be cleared too.
+    """
+    if instance.pk:
+        instance._old_code = Coupon.objects.filter(pk=instance.pk).values_list('code', flat=True).first()
+
+
+@receiver(post_save, sender=Coupon)
+@receiver(post_delete, sender=Coupon)
+def invalidate_coupon_cache(sender, instance, **kwargs):
+    """
+    Clears the cached coupon once the change is committed.
+    """
+    codes = [instance.code, getattr(instance, '_old_code', None)]
+    transaction.on_commit(lambda: invalidate(*codes))
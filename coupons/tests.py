@@ -1,3 +1,217 @@
-from django.test import TestCase
+import csv
+import io
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Value
+from django.db.models.functions import Upper
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.urls import reverse
+from django.utils import timezone, translation
+from orders.models import Order
+from shop.models import Category, Product
+from . import generation, redemption
+from .lookup import get_valid_coupon
+from .models import Coupon, CouponUsage
 
-# Create your tests here.
+
+def create_coupon(**kwargs):
+    """
+    Creates a coupon valid today with sensible defaults for tests.
+    """
+    now = timezone.now()
+    data = {
+        'code': 'SUMMER',
+        'valid_from': now - timedelta(days=1),
+        'valid_to': now + timedelta(days=1),
+        'discount': 10,
+    }
+    data.update(kwargs)
+    return Coupon.objects.create(**data)
+
+
+class CouponLookupTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        now = timezone.now()
+        self.coupon = Coupon.objects.create(
+            code='Summer', valid_from=now - timedelta(days=1), valid_to=now + timedelta(days=1), discount=10
+        )
+
+    def test_lookup_is_case_insensitive_and_cached(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(get_valid_coupon('SUMMER'), self.coupon)
+            self.assertEqual(get_valid_coupon('summer'), self.coupon)
+
+    @skipUnless(connection.vendor == 'sqlite', 'Query plan checked on SQLite only')
+    def test_lookup_uses_functional_index(self):
+        plan = (
+            Coupon.objects
+            .annotate(code_upper=Upper('code'))
+            .filter(code_upper=Upper(Value('summer')))
+            .explain()
+        )
+        self.assertIn('coupon_code_upper_idx', plan)
+
+    def test_invalid_coupons_are_not_returned(self):
+        Coupon.objects.filter(id=self.coupon.id).update(active=False)
+        self.assertIsNone(get_valid_coupon('summer'))
+        self.assertIsNone(get_valid_coupon('winter'))
+
+    def test_cache_cleared_on_save(self):
+        get_valid_coupon('summer')
+        self.coupon.active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.coupon.save()
+        self.assertIsNone(get_valid_coupon('summer'))
+
+    def test_cache_cleared_for_renamed_code(self):
+        get_valid_coupon('summer')
+        self.coupon.code = 'Autumn'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.coupon.save()
+        self.assertIsNone(get_valid_coupon('summer'))
+        self.assertEqual(get_valid_coupon('autumn'), self.coupon)
+
+    def test_coupon_apply_stores_coupon_in_session(self):
+        with translation.override('en'):
+            self.client.post(reverse('coupons:apply'), {'code': 'sUmMeR'})
+            self.assertEqual(self.client.session['coupon_id'], self.coupon.id)
+            self.client.post(reverse('coupons:apply'), {'code': 'nope'})
+            self.assertIsNone(self.client.session['coupon_id'])
+
+
+class CouponRedemptionTests(TestCase):
+
+    def test_unlimited_coupon_is_not_written(self):
+        coupon = create_coupon()
+        with self.assertNumQueries(0):
+            redemption.redeem(coupon, 'a@example.com')
+
+    def test_total_limit(self):
+        coupon = create_coupon(max_uses=2)
+        redemption.redeem(coupon, 'a@example.com')
+        redemption.redeem(coupon, 'b@example.com')
+        with self.assertRaises(redemption.CouponUnavailable):
+            redemption.redeem(coupon, 'c@example.com')
+        coupon.refresh_from_db()
+        self.assertEqual(coupon.used_count, 2)
+
+    def test_per_email_limit_ignores_case(self):
+        coupon = create_coupon(max_uses_per_email=1)
+        redemption.redeem(coupon, 'a@example.com')
+        with self.assertRaises(redemption.CouponUnavailable):
+            redemption.redeem(coupon, 'A@Example.com')
+        redemption.redeem(coupon, 'b@example.com')
+        self.assertEqual(CouponUsage.objects.get(coupon=coupon, email='a@example.com').count, 1)
+
+    def test_order_create_rejects_exhausted_coupon(self):
+        self.enterContext(translation.override('en'))
+        coupon = create_coupon(max_uses=1, used_count=1, discount=50)
+        category = Category.objects.create(name='Tea', slug='tea')
+        product = Product.objects.create(category=category, name='Green tea', slug='green-tea', price=Decimal('10.00'))
+        self.client.post(reverse('coupons:apply'), {'code': coupon.code})
+        self.client.post(reverse('cart:cart_add', args=[product.id]), {'quantity': 1})
+        data = {
+            'first_name': 'Ali', 'last_name': 'Mammadov', 'email': 'ali@example.com',
+            'address': 'Nizami 1', 'postal_code': '12345', 'city': 'Baku',
+        }
+
+        response = self.client.post(reverse('orders:order_create'), data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'no longer available')
+        # The page shows the total the order will be placed with
+        self.assertContains(response, 'Total: $10.00')
+        self.assertNotContains(response, '50% off')
+        self.assertFalse(Order.objects.exists())
+        self.assertIsNone(self.client.session['coupon_id'])
+
+        data['idempotency_key'] = str(uuid.uuid4())
+        self.client.post(reverse('orders:order_create'), data)
+        self.assertIsNone(Order.objects.get().coupon)
+
+
+@skipUnlessDBFeature('test_db_allows_multiple_connections')
+class CouponRedemptionConcurrencyTests(TransactionTestCase):
+    """
+    Many parallel checkouts with one limited coupon must never exceed the
+    limit.
+
+    Needs a test database that accepts concurrent connections (PostgreSQL);
+    on SQLite use `manage.py bench_coupon_redemption` against a file
+    database instead.
+    """
+
+    def test_parallel_redemptions_respect_limit(self):
+        coupon = create_coupon(max_uses=25, max_uses_per_email=3)
+
+        def checkout(i):
+            try:
+                with transaction.atomic():
+                    redemption.redeem(coupon, f'customer{i % 10}@example.com')
+                return True
+            except redemption.CouponUnavailable:
+                return False
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=12) as pool:
+            results = list(pool.map(checkout, range(60)))
+
+        coupon.refresh_from_db()
+        self.assertEqual(results.count(True), 25)
+        self.assertEqual(coupon.used_count, 25)
+        self.assertTrue(all(u.count <= 3 for u in CouponUsage.objects.all()))
+
+
+class CouponGenerationTests(TestCase):
+
+    def test_generates_unique_codes_in_batches(self):
+        now = timezone.now()
+        batches = list(generation.generate_coupons(
+            25, discount=5, valid_from=now, valid_to=now + timedelta(days=1), prefix='X-', batch_size=10
+        ))
+        self.assertEqual([len(batch) for batch in batches], [10, 10, 5])
+        codes = Coupon.objects.values_list('code', flat=True)
+        self.assertEqual(len(set(codes)), 25)
+        self.assertTrue(all(code.startswith('X-') and len(code) == 14 for code in codes))
+
+    def test_collisions_are_regenerated(self):
+        create_coupon(code='TAKEN')
+        codes = iter(['TAKEN', 'A', 'A', 'B', 'C'])
+        now = timezone.now()
+        with mock.patch.object(generation, 'random_code', side_effect=lambda *args: next(codes)):
+            batches = list(generation.generate_coupons(
+                3, discount=5, valid_from=now, valid_to=now + timedelta(days=1), batch_size=2
+            ))
+        self.assertEqual(sorted(c.code for batch in batches for c in batch), ['A', 'B', 'C'])
+        self.assertEqual(Coupon.objects.count(), 4)
+
+    def test_command_writes_csv(self):
+        out = io.StringIO()
+        call_command('generate_coupons', 30, discount=20, batch_size=7, stdout=out, stderr=io.StringIO())
+        rows = list(csv.reader(io.StringIO(out.getvalue())))
+        self.assertEqual(rows[0], generation.CSV_FIELDS)
+        self.assertEqual(len(rows), 31)
+        self.assertEqual(Coupon.objects.filter(discount=20, max_uses=1).count(), 30)
+
+    def test_admin_export_streams_csv(self):
+        create_coupon(code='A')
+        create_coupon(code='B')
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        with translation.override('en'):
+            response = self.client.post(reverse('admin:coupons_coupon_changelist'), {
+                'action': 'export_codes_to_csv',
+                '_selected_action': Coupon.objects.values_list('pk', flat=True),
+            })
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([row[0] for row in rows], ['code', 'A', 'B'])
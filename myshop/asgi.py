@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myshop.settings')
 
 application = get_asgi_application()
+
+# Resolve category URLs from the first request on without a query
+from shop.category_slugs import warm_category_slugs  # noqa: E402
+
+warm_category_slugs()
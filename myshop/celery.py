@@ -6,3 +6,6 @@ app = Celery('myshop')
 app.config_from_object('django.conf:settings',namespace='CELERY')
 app.autodiscover_tasks()
 
+
+# Task duration and failure metrics
+from . import metrics  # noqa: E402,F401
@@ -0,0 +1,222 @@
+import hmac
+import os
+import time
+from contextvars import ContextVar
+import redis
+from celery.signals import task_failure, task_postrun, task_prerun, task_retry
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.views.decorators.http import require_safe
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+)
+
+# Prometheus metrics of views and Celery tasks.
+# `MetricsMiddleware` times every request and counts the database queries,
+# their time and the Redis round trips it made, labelled by URL name.
+# Queries are counted by an execute wrapper installed on every database
+# connection and Redis round trips by `RedisConnection`, the connection class
+# of the project's Redis clients; both add to the statistics of the current
+# request, if any. Celery task
+# signals time every task and count failures and retries.
+#
+# With several processes (gunicorn workers, Celery's prefork pool) set
+# `PROMETHEUS_MULTIPROC_DIR` to a directory shared by them, emptied on
+# deploy: every process then writes its metrics there and `/metrics/`
+# reports their sum.
+
+# Seconds; views of this shop take milliseconds, checkout calls Stripe
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+TASK_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+
+# Methods labelled by name; the method is sent by the client, so any other
+# is labelled 'other' to keep the number of series bounded
+METHODS = frozenset(['GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'])
+
+REQUEST_LATENCY = Histogram(
+    'myshop_request_duration_seconds', 'Time to respond to a request.',
+    ['view', 'method', 'status'], buckets=LATENCY_BUCKETS
+)
+REQUEST_QUERIES = Histogram(
+    'myshop_request_db_queries', 'Database queries made by a request.',
+    ['view'], buckets=COUNT_BUCKETS
+)
+REQUEST_QUERY_TIME = Histogram(
+    'myshop_request_db_duration_seconds', 'Time spent in database queries by a request.',
+    ['view'], buckets=LATENCY_BUCKETS
+)
+REQUEST_REDIS_CALLS = Histogram(
+    'myshop_request_redis_calls', 'Redis round trips made by a request; a pipeline is one.',
+    ['view'], buckets=COUNT_BUCKETS
+)
+TASK_DURATION = Histogram(
+    'myshop_celery_task_duration_seconds', 'Time to run a Celery task.',
+    ['task', 'state'], buckets=TASK_BUCKETS
+)
+TASK_FAILURES = Counter('myshop_celery_task_failures', 'Celery tasks that raised an exception.', ['task'])
+TASK_RETRIES = Counter('myshop_celery_task_retries', 'Celery tasks that were retried.', ['task'])
+
+
+class RequestStats:
+    """
+    Database and Redis usage of one request.
+    """
+    __slots__ = ('queries', 'query_time', 'redis_calls')
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.redis_calls = 0
+
+
+# Statistics of the request being handled by the current thread or task
+_current = ContextVar('request_stats', default=None)
+
+
+class RedisConnection(redis.Connection):
+    """
+    Redis connection that counts round trips for the current request.
+    """
+
+    def send_packed_command(self, command, check_health=True):
+        stats = _current.get()
+        if stats is not None:
+            stats.redis_calls += 1
+        return super().send_packed_command(command, check_health)
+
+
+def _count_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper that adds queries to the current request's
+    statistics.
+    """
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.query_time += time.perf_counter() - start
+
+
+@receiver(connection_created)
+def _instrument_connection(sender, connection, **kwargs):
+    # Installed once per connection: entering `execute_wrapper()` on every
+    # connection for every request would cost more than the rest of the
+    # middleware together
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+def _view_name(request):
+    """
+    Returns the metric label of the view that handled a request. URL names
+    keep the number of label values small; unmatched URLs share one.
+    """
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else 'unmatched'
+
+
+class MetricsMiddleware:
+    """
+    Records the latency, database queries and Redis round trips of every
+    request. Should come first in `MIDDLEWARE`, so the time of the other
+    middleware is included.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # (view, method, status class) -> labelled metrics
+        self.children = {}
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        # Streamed responses are timed until their first byte
+        elapsed = time.perf_counter() - start
+
+        view = _view_name(request)
+        method = request.method if request.method in METHODS else 'other'
+        key = (view, method, response.status_code // 100)
+        try:
+            latency, queries, query_time, redis_calls = self.children[key]
+        except KeyError:
+            # Looking up labelled metrics takes longer than observing them
+            latency, queries, query_time, redis_calls = self.children[key] = (
+                REQUEST_LATENCY.labels(view, method, f'{key[2]}xx'),
+                REQUEST_QUERIES.labels(view),
+                REQUEST_QUERY_TIME.labels(view),
+                REQUEST_REDIS_CALLS.labels(view),
+            )
+        latency.observe(elapsed)
+        queries.observe(stats.queries)
+        query_time.observe(stats.query_time)
+        redis_calls.observe(stats.redis_calls)
+        return response
+
+
+# task ID -> start time, of the tasks running in this process
+_task_starts = {}
+
+
+@task_prerun.connect
+def _task_started(task_id=None, **kwargs):
+    _task_starts[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def _task_finished(task_id=None, task=None, state=None, **kwargs):
+    start = _task_starts.pop(task_id, None)
+    if start is not None:
+        TASK_DURATION.labels(task.name, state or 'UNKNOWN').observe(time.perf_counter() - start)
+
+
+@task_failure.connect
+def _task_failed(sender=None, **kwargs):
+    TASK_FAILURES.labels(sender.name).inc()
+
+
+@task_retry.connect
+def _task_retried(sender=None, **kwargs):
+    TASK_RETRIES.labels(sender.name).inc()
+
+
+def _registry():
+    """
+    Returns the registry to export: this process's, or in multiprocess mode
+    one that reads the metrics of every process.
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+@require_safe
+def metrics_view(request):
+    """
+    Exports the metrics in the Prometheus text format.
+
+    Served to requests with the `METRICS_TOKEN` bearer token and to
+    addresses in `METRICS_ALLOWED_IPS`; anyone else gets a 403. Both are
+    unset by default, so the metrics are private until configured.
+    """
+    token = settings.METRICS_TOKEN
+    allowed = request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS or (
+        token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    )
+    if not allowed:
+        raise PermissionDenied
+    return HttpResponse(generate_latest(_registry()), content_type=CONTENT_TYPE_LATEST)
@@ -64,6 +64,7 @@ INSTALLED_APPS = [
 # MIDDLEWARE
 # -----------------------------
 MIDDLEWARE = [
+    'myshop.metrics.MetricsMiddleware',  # First, so it times the other middleware
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',  # For multilingual support
@@ -154,12 +155,46 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # -----------------------------
 CART_SESSION_ID = 'cart'
 
+# -----------------------------
+# SHOP SETTINGS
+# -----------------------------
+PRODUCTS_PER_PAGE = 24  # Products per catalog page and per infinite-scroll request
+CATEGORY_SLUG_CACHE_TTL = 60  # Seconds a process trusts its category slug map
+CATEGORY_SLUG_MISS_RELOAD_INTERVAL = 1  # Minimum seconds between map reloads for unknown slugs
+POPULAR_PRODUCTS_LIMIT = 5  # Most viewed products shown beside the product list
+PRODUCT_VIEWS_FLUSH_LOCK_TIMEOUT = 5 * 60  # Seconds before a stuck view flush is given up
+SEARCH_RESULTS_LIMIT = 50  # Products shown for a search query
+# Upper bounds of the price ranges of the price facet; the last range is open
+PRICE_FACET_BOUNDS = [10, 25, 50, 100]
+# Widths of the resized product images, in pixels, and their MEDIA_ROOT folder
+THUMBNAIL_WIDTHS = [160, 320, 640]
+THUMBNAIL_DIRECTORY = 'products/thumbnails'
+# Products per page of the catalog API, by default and at most
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+API_EXPORT_CHUNK_SIZE = 2000  # Rows fetched per query while streaming an export
+
+# -----------------------------
+# STOCK SETTINGS
+# -----------------------------
+# Seconds stock stays reserved for an unpaid order. Payments arriving later
+# take the stock again when the webhook is processed.
+STOCK_RESERVATION_TIMEOUT = 30 * 60
+
 # -----------------------------
 # EMAIL SETTINGS
 # -----------------------------
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 # For production: use SMTP backend with credentials
 
+# Transactional e-mails are queued in the outbox and sent in batches
+EMAIL_OUTBOX_BATCH_SIZE = 100       # E-mails sent per connection
+EMAIL_OUTBOX_MAX_BATCHES = 50       # Batches per flush task run
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5       # Attempts before an e-mail is marked failed
+EMAIL_OUTBOX_RETRY_DELAY = 60       # Seconds before the first retry, doubled per attempt
+EMAIL_OUTBOX_MAX_RETRY_DELAY = 3600 # Upper bound for the retry delay in seconds
+EMAIL_OUTBOX_LEASE = 600           # Seconds a flusher holds claimed e-mails before others retry them
+
 # -----------------------------
 # STRIPE SETTINGS
 # -----------------------------
@@ -167,6 +202,18 @@ STRIPE_PUBLISHABLE_KEY = os.environ.get('STRIPE_PUBLISHABLE_KEY')
 STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY')
 STRIPE_API_VERSION = os.environ.get('STRIPE_API_VERSION')
 STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET')
+STRIPE_API_BASE = os.environ.get('STRIPE_API_BASE', 'https://api.stripe.com')  # Point at a local emulator for tests
+
+# Stripe HTTP client: pooled keep-alive connections with strict timeouts
+STRIPE_HTTP_POOL_SIZE = 20       # Connections kept alive per process
+STRIPE_CONNECT_TIMEOUT = 3.05    # Seconds
+STRIPE_READ_TIMEOUT = 10         # Seconds
+STRIPE_MAX_NETWORK_RETRIES = 2   # Retries by the Stripe library, sent with idempotency keys
+
+# Reconciliation of unpaid orders against their Checkout sessions
+STRIPE_RECONCILE_DAYS = 2            # Checkout sessions expire after 24 hours
+STRIPE_RECONCILE_BATCH_SIZE = 200    # Checkout sessions per batch
+STRIPE_RECONCILE_WORKERS = 8         # Concurrent Stripe requests, at most STRIPE_HTTP_POOL_SIZE
 
 # -----------------------------
 # REDIS SETTINGS
@@ -175,6 +222,76 @@ REDIS_HOST = 'localhost'
 REDIS_PORT = 6379
 REDIS_DB = 1
 
+# -----------------------------
+# CACHE SETTINGS
+# -----------------------------
+# Redis in production (e.g. CACHE_REDIS_URL=redis://localhost:6379/2),
+# local memory for development
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
+if CACHE_REDIS_URL:
+    from myshop.metrics import RedisConnection
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+            'KEY_PREFIX': 'myshop',
+            # Counts cache round trips in the request metrics
+            'OPTIONS': {'connection_class': RedisConnection},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'myshop',
+        }
+    }
+
+# Seconds catalog fragments stay cached; changes invalidate them earlier
+CATALOG_CACHE_TIMEOUT = 6 * 60 * 60
+
+# -----------------------------
+# METRICS SETTINGS
+# -----------------------------
+# /metrics/ is served to requests with the token (`Authorization: Bearer
+# <token>`) and to the listed addresses; with neither set it is not served.
+# Behind a reverse proxy every request comes from the proxy's address, so only
+# list addresses that reach the application server directly, never loopback.
+# Set PROMETHEUS_MULTIPROC_DIR when running several processes (see
+# `myshop.metrics`).
+METRICS_ALLOWED_IPS = [ip for ip in os.environ.get('METRICS_ALLOWED_IPS', '').split(',') if ip]
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# -----------------------------
+# CELERY SETTINGS
+# -----------------------------
+CELERY_BEAT_SCHEDULE = {
+    'flush-email-outbox': {
+        'task': 'orders.tasks.flush_email_outbox',
+        'schedule': 10.0,  # seconds
+    },
+    'process-pending-stripe-events': {
+        'task': 'payment.tasks.process_pending_stripe_events',
+        'schedule': 60.0,
+    },
+    'release-expired-stock': {
+        'task': 'orders.tasks.release_expired_stock',
+        'schedule': 60.0,
+    },
+    'refresh-sales-rollups': {
+        'task': 'orders.tasks.refresh_sales_rollups',
+        'schedule': 300.0,
+    },
+    'reconcile-payments': {
+        'task': 'payment.tasks.reconcile_payments',
+        'schedule': 900.0,
+    },
+    'flush-product-views': {
+        'task': 'shop.tasks.flush_product_views',
+        'schedule': 60.0,
+    },
+}
+
 # -----------------------------
 # DJANGO PARLER (MULTILINGUAL) SETTINGS
 # -----------------------------
@@ -185,4 +302,6 @@ PARLER_LANGUAGES = {
     ),
     'default': {
         'fallback': 'en',
-        'hide_untranslated': Fal_
+        'hide_untranslated': False,
+    }
+}
@@ -0,0 +1,342 @@
+import os
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+import stripe
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone, translation
+from prometheus_client import REGISTRY
+from myshop.metrics import RedisConnection
+from coupons.models import Coupon, CouponUsage
+from orders import rollups, tasks
+from orders.models import EmailOutbox, Order, OrderItem
+from payment.models import StripeCoupon, StripeEvent
+from payment.stripe_emulator import StripeEmulator
+from payment.tests import signed_event
+from shop import popularity, search
+from shop.category_slugs import clear_category_slugs
+from shop.models import Category, Product, ProductViews
+from shop.recommender import Recommender
+from shop.tests import FakeRedis
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class RequestMetricsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_category_slugs()
+        self.enterContext(translation.override('en'))
+        category = Category.objects.create(name='Tea', slug='tea')
+        Product.objects.create(category=category, name='Green tea', slug='green-tea', price=Decimal('4.50'))
+
+    def test_request_latency_queries_and_redis_calls(self):
+        view = {'view': 'shop:product_list'}
+        requests = sample('myshop_request_duration_seconds_count', method='GET', status='2xx', **view)
+        queries = sample('myshop_request_db_queries_sum', **view)
+        redis_calls = sample('myshop_request_redis_calls_sum', **view)
+
+        # A Redis server that answers every command with an empty list
+        self.enterContext(mock.patch('redis.ConnectionPool.get_connection', side_effect=lambda *a, **kw: RedisConnection()))
+        self.enterContext(mock.patch('redis.Connection.send_packed_command'))
+        self.enterContext(mock.patch('redis.Connection.read_response', return_value=[]))
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get(reverse('shop:product_list'))
+
+        self.assertEqual(
+            sample('myshop_request_duration_seconds_count', method='GET', status='2xx', **view), requests + 1
+        )
+        self.assertEqual(sample('myshop_request_db_queries_sum', **view), queries + len(captured))
+        # The popularity ranking is read from Redis
+        self.assertEqual(sample('myshop_request_redis_calls_sum', **view), redis_calls + 1)
+
+    def test_unknown_methods_share_a_label(self):
+        labels = {'view': 'unmatched', 'status': '4xx'}
+        count = sample('myshop_request_duration_seconds_count', method='other', **labels)
+        for method in ['FOO1', 'FOO2']:
+            self.client.generic(method, '/no/such/page/')
+        self.assertEqual(sample('myshop_request_duration_seconds_count', method='other', **labels), count + 2)
+        self.assertFalse(sample('myshop_request_duration_seconds_count', method='FOO1', **labels))
+
+    def test_unmatched_urls_share_a_label(self):
+        count = sample('myshop_request_duration_seconds_count', view='unmatched', method='GET', status='4xx')
+        self.client.get('/no/such/page/')
+        self.assertEqual(
+            sample('myshop_request_duration_seconds_count', view='unmatched', method='GET', status='4xx'), count + 1
+        )
+
+
+class TaskMetricsTests(TestCase):
+
+    def test_task_duration_and_failures(self):
+        task = 'orders.tasks.release_expired_stock'
+        runs = sample('myshop_celery_task_duration_seconds_count', task=task, state='SUCCESS')
+        failures = sample('myshop_celery_task_failures_total', task=task)
+
+        tasks.release_expired_stock.apply()
+        with mock.patch('orders.stock.release_expired', side_effect=RuntimeError):
+            tasks.release_expired_stock.apply()
+
+        self.assertEqual(sample('myshop_celery_task_duration_seconds_count', task=task, state='SUCCESS'), runs + 1)
+        self.assertEqual(sample('myshop_celery_task_failures_total', task=task), failures + 1)
+        self.assertEqual(sample('myshop_celery_task_duration_seconds_count', task=task, state='FAILURE'), 1)
+
+
+@override_settings(METRICS_ALLOWED_IPS=['10.0.0.1'], METRICS_TOKEN='secret')
+class MetricsEndpointTests(TestCase):
+
+    def test_exports_to_allowed_addresses_and_token(self):
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'myshop_request_duration_seconds')
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+    def test_hidden_from_others(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(METRICS_ALLOWED_IPS=[], METRICS_TOKEN=None)
+    def test_private_by_default(self):
+        # Behind a proxy on the same host every request comes from loopback
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='127.0.0.1').status_code, 403)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer None')
+        self.assertEqual(response.status_code, 403)
+
+
+# -----------------------------
+# Query and time budgets
+# -----------------------------
+# Every page is requested against a catalog and order history of realistic
+# size, with local stand-ins for Redis (`shop.tests.FakeRedis`), Stripe
+# (`payment.stripe_emulator`) and e-mail (Django's locmem backend). Each
+# test starts with an empty cache, so its first page is measured cold.
+# Query budgets are the current counts: a fix that saves queries lowers its
+# budget, a regression fails with the queries made. Time budgets are loose
+# enough for slow machines and can be scaled with TIME_BUDGET_SCALE.
+
+TIME_BUDGET_SCALE = float(os.environ.get('TIME_BUDGET_SCALE', 1))
+
+CATEGORIES = 8
+PRODUCTS_PER_CATEGORY = 50
+ORDERS = 60
+ITEMS_PER_ORDER = 4
+
+
+def seed_shop():
+    """
+    Creates categories in both languages, products with views, coupons,
+    orders with items, e-mails, Stripe events and sales rollups.
+    """
+    categories = []
+    for i in range(CATEGORIES):
+        category = Category(name=f'Category {i}', slug=f'category-{i}')
+        category.set_current_language('az')
+        category.name = f'Kateqoriya {i}'
+        category.slug = f'kateqoriya-{i}'
+        category.save()
+        category.set_current_language('en')
+        categories.append(category)
+    products = Product.objects.bulk_create([
+        Product(
+            category=category, name=f'Product {c}-{i}', slug=f'product-{c}-{i}',
+            description=f'Fresh leaves from garden {i}', price=Decimal(5 + i),
+            stock=None if i % 3 else i % 5,
+        )
+        for c, category in enumerate(categories) for i in range(PRODUCTS_PER_CATEGORY)
+    ])
+    ProductViews.objects.bulk_create([
+        ProductViews(product=product, views=i, unique_visitors=i) for i, product in enumerate(products[::3])
+    ])
+    if search.is_supported():
+        search.rebuild_index()
+
+    now = timezone.now()
+    coupons = Coupon.objects.bulk_create([
+        Coupon(code=f'SAVE{i}', valid_from=now - timedelta(days=30), valid_to=now + timedelta(days=30),
+               discount=10, max_uses_per_email=1 if i % 2 else None)
+        for i in range(40)
+    ])
+    CouponUsage.objects.bulk_create([
+        CouponUsage(coupon=coupon, email=f'customer{i}@example.com', count=1)
+        for i, coupon in enumerate(coupons[1::2])
+    ])
+    StripeCoupon.objects.bulk_create([
+        StripeCoupon(coupon=coupon, percent_off=coupon.discount, stripe_id=f'co_{coupon.id}') for coupon in coupons[:20]
+    ])
+
+    orders = Order.objects.bulk_create([
+        Order(first_name='Ali', last_name=f'Customer {i}', email=f'customer{i}@example.com',
+              address='Nizami 1', postal_code='12345', city='Baku', paid=i % 3 > 0,
+              coupon=coupons[i % 40] if i % 4 == 0 else None, discount=10 if i % 4 == 0 else 0)
+        for i in range(ORDERS)
+    ])
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product=product, price=product.price, quantity=j + 1)
+        for i, order in enumerate(orders)
+        for j, product in enumerate(products[i * 7 % len(products):][:ITEMS_PER_ORDER])
+    ])
+    EmailOutbox.objects.bulk_create([
+        EmailOutbox(key=f'order_created:{order.id}', kind=EmailOutbox.KIND_ORDER_CREATED, order=order,
+                    subject=f'Order nr. {order.id}', body='Thank you', from_email='shop@example.com',
+                    to=order.email)
+        for order in orders
+    ])
+    StripeEvent.objects.bulk_create([
+        StripeEvent(event_id=f'evt_{order.id}', type='checkout.session.completed',
+                    payload={'data': {'object': {'client_reference_id': str(order.id)}}}, processed=now)
+        for order in orders if order.paid
+    ])
+    rollups.refresh_sales_rollups(full=True)
+    return categories, products, orders, coupons
+
+
+class ViewBudgetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        with translation.override('en'):
+            cls.categories, cls.products, cls.orders, cls.coupons = seed_shop()
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+
+    def setUp(self):
+        cache.clear()
+        clear_category_slugs()
+        self.enterContext(translation.override('en'))
+        self.redis = FakeRedis()
+        self.enterContext(mock.patch('shop.recommender.r', self.redis))
+        self.enterContext(mock.patch('shop.popularity.r', self.redis))
+        self.redis.zadd(popularity.ranking_key(), {p.id: i for i, p in enumerate(self.products[:20])})
+        for order in Order.objects.prefetch_related('items__product')[:20]:
+            Recommender().products_bought([item.product for item in order.items.all()])
+        self.enterContext(mock.patch('payment.tasks.process_stripe_event.delay'))
+        self.product = self.products[0]
+        self.category = self.categories[0]
+
+    def assertWithinBudget(self, queries, milliseconds, url, method='get', status=200, **kwargs):
+        """
+        Requests a page and checks its status, its number of queries and its
+        response time.
+        """
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = getattr(self.client, method)(url, **kwargs)
+            elapsed = (time.perf_counter() - start) * 1000
+        self.assertEqual(response.status_code, status, url)
+        self.assertLessEqual(
+            len(captured), queries,
+            f'{method.upper()} {url} made {len(captured)} queries:\n' + '\n'.join(q['sql'] for q in captured)
+        )
+        self.assertLessEqual(elapsed, milliseconds * TIME_BUDGET_SCALE, f'{method.upper()} {url}')
+        return response
+
+    def fill_cart(self, count=5):
+        for product in [p for p in self.products if p.stock is None][:count]:
+            self.client.post(reverse('cart:cart_add', args=[product.id]), {'quantity': 2})
+
+    def test_catalog_pages(self):
+        self.assertWithinBudget(5, 250, reverse('shop:product_list'))
+        # The sidebar and facet counts are cached by the first page
+        self.assertWithinBudget(1, 250, self.category.get_absolute_url())
+        self.assertWithinBudget(1, 250, self.category.get_absolute_url(), data={'price': '10-25'})
+        self.assertWithinBudget(1, 250, reverse('shop:product_list'), data={'availability': 'in_stock'})
+        self.assertWithinBudget(4, 250, self.product.get_absolute_url())
+        self.assertWithinBudget(0, 250, '/en/missing/', status=404)
+
+    @skipUnless(search.is_supported(), 'Product search needs SQLite FTS5 or PostgreSQL')
+    def test_search(self):
+        self.assertWithinBudget(3, 250, reverse('shop:product_search'), data={'q': 'fresh garden'})
+
+    def test_api(self):
+        self.assertWithinBudget(2, 250, reverse('api:category_list'))
+        self.assertWithinBudget(1, 250, reverse('api:product_list'), data={'limit': 100})
+        # Rows are read while the response is streamed
+        response = self.assertWithinBudget(0, 250, reverse('api:product_export'))
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), len(self.products))
+
+    def test_cart(self):
+        self.assertWithinBudget(5, 250, reverse('cart:cart_add', args=[self.product.id]), 'post',
+                                302, data={'quantity': 1})
+        self.fill_cart()
+        response = self.assertWithinBudget(3, 500, reverse('cart:cart_detail'))
+        self.assertContains(response, 'name="override"', count=6)
+        self.assertWithinBudget(5, 250, reverse('coupons:apply'), 'post', 302, data={'code': 'SAVE1'})
+        self.assertWithinBudget(4, 500, reverse('cart:cart_detail'))
+        self.assertWithinBudget(5, 250, reverse('cart:cart_remove', args=[self.product.id]), 'post', 302)
+
+    def test_browsing_writes_no_session(self):
+        for url in [reverse('shop:product_list'), self.category.get_absolute_url(), self.product.get_absolute_url()]:
+            self.client.get(url)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, self.client.cookies)
+
+    def test_checkout(self):
+        self.fill_cart()
+        self.client.post(reverse('coupons:apply'), {'code': 'SAVE1'})
+        self.assertWithinBudget(3, 250, reverse('orders:order_create'))
+        self.assertWithinBudget(14, 500, reverse('orders:order_create'), 'post', 302, data={
+            'first_name': 'Ali', 'last_name': 'Mammadov', 'email': 'new@example.com',
+            'address': 'Nizami 1', 'postal_code': '12345', 'city': 'Baku', 'idempotency_key': str(uuid.uuid4()),
+        })
+        self.assertWithinBudget(4, 250, reverse('payment:process'))
+        with StripeEmulator() as emulator, \
+                mock.patch.multiple(stripe, api_base=emulator.url, api_key='sk_test_emulator'):
+            self.assertWithinBudget(5, 1000, reverse('payment:process'), 'post', 302)
+        self.assertWithinBudget(1, 250, reverse('payment:completed'))
+        self.assertWithinBudget(7, 250, reverse('payment:canceled'))
+
+    @override_settings(STRIPE_WEBHOOK_SECRET='whsec_test')
+    def test_stripe_webhook(self):
+        payload, signature = signed_event({
+            'id': 'evt_new', 'object': 'event', 'type': 'checkout.session.completed',
+            'data': {'object': {'id': 'cs_1', 'object': 'checkout.session', 'mode': 'payment',
+                                'payment_status': 'paid', 'client_reference_id': str(self.orders[0].id)}},
+        })
+        self.assertWithinBudget(3, 250, reverse('payment:stripe-webhook'), 'post', data=payload,
+                                content_type='application/json', HTTP_STRIPE_SIGNATURE=signature)
+
+    def test_admin_pages(self):
+        self.client.force_login(self.admin)
+        order = self.orders[0]
+        coupon = self.coupons[1]
+        pages = [
+            (3, reverse('admin:index')),
+            (6, reverse('admin:shop_category_changelist')),
+            (7, reverse('admin:shop_category_change', args=[self.category.id])),
+            (5, reverse('admin:shop_product_changelist')),
+            (7, reverse('admin:shop_product_change', args=[self.product.id])),
+            (5, reverse('admin:shop_productviews_changelist')),
+            (7, reverse('admin:shop_productviews_change', args=[ProductViews.objects.first().pk])),
+            (5, reverse('admin:orders_order_changelist')),
+            # The raw ID widget of every inline item looks up its product
+            (8 + ITEMS_PER_ORDER, reverse('admin:orders_order_change', args=[order.id])),
+            (5, reverse('admin:orders_emailoutbox_changelist')),
+            (7, reverse('admin:orders_emailoutbox_change', args=[EmailOutbox.objects.first().id])),
+            (5, reverse('admin:coupons_coupon_changelist')),
+            (6, reverse('admin:coupons_coupon_change', args=[coupon.id])),
+            (5, reverse('admin:coupons_couponusage_changelist')),
+            # The raw ID widget looks up the coupon a second time
+            (8, reverse('admin:coupons_couponusage_change', args=[coupon.usages.get().id])),
+            (5, reverse('admin:payment_stripecoupon_changelist')),
+            (7, reverse('admin:payment_stripecoupon_change', args=[coupon.stripe_coupons.get().id])),
+            (6, reverse('admin:payment_stripeevent_changelist')),
+            (6, reverse('admin:payment_stripeevent_change', args=[StripeEvent.objects.first().id])),
+            (5, reverse('orders:admin_order_detail', args=[order.id])),
+            (9, reverse('orders:admin_sales_report')),
+        ]
+        for queries, url in pages:
+            with self.subTest(url):
+                self.assertWithinBudget(queries, 1000, url)
+        # Rendering the PDF itself takes most of the time
+        self.assertWithinBudget(5, 5000, reverse('orders:admin_order_pdf', args=[order.id]))
@@ -4,6 +4,8 @@ Root URL configuration for myshop project.
 This configuration includes:
 - Multilingual URL patterns using `i18n_patterns`
 - App namespaces for clear URL resolution
+- Read-only catalog API outside the language prefixes
+- Prometheus metrics endpoint
 - Static & media file serving in development
 - Admin panel with translated URL prefix
 """
@@ -14,6 +16,7 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.conf.urls.i18n import i18n_patterns
 from django.utils.translation import gettext_lazy as _
+from myshop.metrics import metrics_view
 
 # -----------------------------
 # Multilingual URL patterns
@@ -41,6 +44,20 @@ urlpatterns = i18n_patterns(
     path('', include('shop.urls', namespace='shop')),
 )
 
+# -----------------------------
+# Catalog API (language given as a query parameter, not a URL prefix)
+# -----------------------------
+urlpatterns += [
+    path('api/', include('shop.api_urls', namespace='api')),
+]
+
+# -----------------------------
+# Prometheus metrics
+# -----------------------------
+urlpatterns += [
+    path('metrics/', metrics_view, name='metrics'),
+]
+
 # -----------------------------
 # Serve media files in development
 # -----------------------------
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myshop.settings')
 
 application = get_wsgi_application()
+
+# Resolve category URLs from the first request on without a query
+from shop.category_slugs import warm_category_slugs  # noqa: E402
+
+warm_category_slugs()
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Order, OrderItem
+from .models import Order, OrderItem, EmailOutbox
 import csv
 import datetime
 from django.http import HttpResponse
@@ -112,3 +112,20 @@ class OrderAdmin(admin.ModelAdmin):
     list_filter = ['paid', 'created', 'updated']
     inlines = [OrderItemInline]
     actions = [export_to_csv]
+
+
+# ------------------------------
+# Admin for the e-mail outbox
+# ------------------------------
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for EmailOutbox model.
+
+    Read-mostly view of queued transactional e-mails, used to inspect
+    delivery status and errors.
+    """
+    list_display = ['key', 'kind', 'to', 'status', 'attempts', 'next_attempt', 'sent']
+    list_filter = ['status', 'kind', 'created']
+    search_fields = ['key', 'to']
+    raw_id_fields = ['order']
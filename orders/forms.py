@@ -1,3 +1,4 @@
+import uuid
 from django import forms
 from .models import Order
 from localflavor.us.forms import USZipCodeField
@@ -9,6 +10,10 @@ class OrderCreateForm(forms.ModelForm):
     Overrides the postal_code field to use a US-specific zip code validator.
     This ensures that users enter valid postal codes for US addresses.
 
+    Carries a hidden idempotency key, generated when the form is first shown,
+    so a double-clicked or retried submission maps back to the order it
+    already created.
+
     Fields included:
         - first_name
         - last_name
@@ -16,8 +21,15 @@ class OrderCreateForm(forms.ModelForm):
         - address
         - postal_code (validated as US ZIP code)
         - city
+        - idempotency_key (hidden, not saved by the form)
     """
     postal_code = USZipCodeField()
+    idempotency_key = forms.UUIDField(required=False, widget=forms.HiddenInput)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.is_bound:
+            self.initial.setdefault('idempotency_key', uuid.uuid4())
 
     class Meta:
         model = Order
@@ -0,0 +1,88 @@
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import setup_test_environment, teardown_test_environment
+from shop.models import Category, Product
+from orders.models import Order, StockReservation
+from orders import stock
+
+
+class Command(BaseCommand):
+    """
+    Runs many parallel stock reservations against one hot product.
+
+    Verifies that no more units are reserved than were in stock and reports
+    reservation latency. Runs in a throwaway database (a temporary file on
+    SQLite, so the threads can share it) with its own product and orders:
+
+        python manage.py bench_stock --threads 16 --checkouts 2000 --stock 500
+    """
+    help = 'Benchmark concurrent stock reservations on a single product.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16, help='Number of parallel checkouts.')
+        parser.add_argument('--checkouts', type=int, default=1000, help='Total number of checkouts.')
+        parser.add_argument('--stock', type=int, default=200, help='Initial stock of the product.')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        if connection.vendor == 'sqlite':
+            # A file database lets the checkout threads share it
+            test_settings = connection.settings_dict.setdefault('TEST', {})
+            test_settings['NAME'] = os.path.join(tempfile.mkdtemp(), 'bench_stock.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def run(self, options):
+        category = Category.objects.create(name='Benchmark', slug='benchmark')
+        product = Product.objects.create(
+            category=category, name='Hot product', slug='hot-product',
+            price=Decimal('1.00'), stock=options['stock']
+        )
+        orders = Order.objects.bulk_create([
+            Order(first_name='Bench', last_name='Mark', email='bench@example.com',
+                  address='-', postal_code='00000', city='-')
+            for _ in range(options['checkouts'])
+        ])
+
+        def checkout(order):
+            start = time.perf_counter()
+            try:
+                with transaction.atomic():
+                    stock.reserve(order, [(product, 1)])
+                reserved = True
+            except stock.OutOfStock:
+                reserved = False
+            finally:
+                connection.close()
+            return reserved, time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            results = list(pool.map(checkout, orders))
+        elapsed = time.perf_counter() - start
+
+        product.refresh_from_db()
+        reserved = sum(1 for ok, _ in results if ok)
+        held = StockReservation.objects.filter(product=product).count()
+        latencies = sorted(latency for _, latency in results)
+
+        self.stdout.write(
+            f'{len(results)} checkouts with {options["threads"]} threads in {elapsed:.2f}s '
+            f'({len(results) / elapsed:.0f}/s)\n'
+            f'Reserved {reserved} of {options["stock"]} units, {product.stock} left, {held} reservations\n'
+            f'Latency p50 {statistics.median(latencies) * 1000:.1f}ms, '
+            f'p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f}ms, '
+            f'max {latencies[-1] * 1000:.1f}ms'
+        )
+        if reserved != held or reserved + product.stock != options['stock']:
+            raise CommandError('Stock is inconsistent: oversold or lost units.')
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from orders.rollups import refresh_sales_rollups
+
+
+class Command(BaseCommand):
+    """
+    Updates the daily sales rollups outside of Celery beat.
+
+    Use --full to rebuild every day, e.g. after deleting orders or when
+    populating the rollup tables for the first time:
+
+        python manage.py refresh_sales_rollups --full
+    """
+    help = 'Update the daily sales rollup tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild all days, ignoring the watermark.')
+
+    def handle(self, *args, **options):
+        days = refresh_sales_rollups(full=options['full'])
+        self.stdout.write(f'Recomputed {days} days of sales rollups.')
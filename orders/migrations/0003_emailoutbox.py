@@ -0,0 +1,103 @@
+# Generated by Django 4.2.3 on 2026-10-19 08:14
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0003_translations'),
+        ('coupons', '0002_alter_coupon_help_text'),
+        ('orders', '0002_order_coupon_order_discount'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='address',
+            field=models.CharField(max_length=250, verbose_name='address'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='city',
+            field=models.CharField(max_length=100, verbose_name='city'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='coupon',
+            field=models.ForeignKey(blank=True, help_text='Applied coupon for this order, if any.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to='coupons.coupon'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='discount',
+            field=models.IntegerField(default=0, help_text='Discount percentage applied to the order.', validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(100)]),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='email',
+            field=models.EmailField(max_length=254, verbose_name='e-mail'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='first_name',
+            field=models.CharField(max_length=50, verbose_name='first name'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='last_name',
+            field=models.CharField(max_length=50, verbose_name='last name'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='postal_code',
+            field=models.CharField(max_length=20, verbose_name='postal code'),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='order',
+            field=models.ForeignKey(help_text='The order this item belongs to.', on_delete=django.db.models.deletion.CASCADE, related_name='items', to='orders.order'),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='price',
+            field=models.DecimalField(decimal_places=2, help_text='Price per item at time of order.', max_digits=10),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='product',
+            field=models.ForeignKey(help_text='The product that was ordered.', on_delete=django.db.models.deletion.CASCADE, related_name='order_items', to='shop.product'),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='quantity',
+            field=models.PositiveIntegerField(default=1, help_text='Quantity of this product ordered.'),
+        ),
+        migrations.CreateModel(
+            name='EmailOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text="Deduplication key, e.g. 'invoice:12'.", max_length=100, unique=True)),
+                ('kind', models.CharField(choices=[('order_created', 'Order confirmation'), ('invoice', 'Invoice')], max_length=20)),
+                ('subject', models.CharField(max_length=250)),
+                ('body', models.TextField()),
+                ('from_email', models.CharField(max_length=254)),
+                ('to', models.EmailField(max_length=254)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0, help_text='Number of delivery attempts so far.')),
+                ('next_attempt', models.DateTimeField(default=django.utils.timezone.now, help_text='Earliest time of the next delivery attempt.')),
+                ('last_error', models.TextField(blank=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('sent', models.DateTimeField(blank=True, null=True)),
+                ('order', models.ForeignKey(help_text='The order this e-mail is about.', on_delete=django.db.models.deletion.CASCADE, related_name='emails', to='orders.order')),
+            ],
+            options={
+                'verbose_name': 'outbox e-mail',
+                'verbose_name_plural': 'e-mail outbox',
+                'ordering': ['next_attempt'],
+                'indexes': [models.Index(fields=['status', 'next_attempt'], name='orders_emai_status_889df2_idx')],
+            },
+        ),
+    ]
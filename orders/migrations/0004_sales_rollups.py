@@ -0,0 +1,101 @@
+# Generated by Django 4.2.3 on 2026-10-19 08:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0003_translations'),
+        ('orders', '0003_emailoutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCategorySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('orders', models.PositiveIntegerField(default=0, help_text='Number of paid orders.')),
+                ('units', models.PositiveIntegerField(default=0, help_text='Number of items sold.')),
+                ('gross', models.DecimalField(decimal_places=2, default=0, help_text='Sales before discount.', max_digits=12)),
+                ('discount', models.DecimalField(decimal_places=2, default=0, help_text='Coupon discounts given.', max_digits=12)),
+                ('net', models.DecimalField(decimal_places=2, default=0, help_text='Sales after discount.', max_digits=12)),
+            ],
+            options={
+                'verbose_name_plural': 'daily category sales',
+                'ordering': ['-day'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('orders', models.PositiveIntegerField(default=0, help_text='Number of paid orders.')),
+                ('units', models.PositiveIntegerField(default=0, help_text='Number of items sold.')),
+                ('gross', models.DecimalField(decimal_places=2, default=0, help_text='Sales before discount.', max_digits=12)),
+                ('discount', models.DecimalField(decimal_places=2, default=0, help_text='Coupon discounts given.', max_digits=12)),
+                ('net', models.DecimalField(decimal_places=2, default=0, help_text='Sales after discount.', max_digits=12)),
+            ],
+            options={
+                'verbose_name_plural': 'daily product sales',
+                'ordering': ['-day'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('orders', models.PositiveIntegerField(default=0, help_text='Number of paid orders.')),
+                ('units', models.PositiveIntegerField(default=0, help_text='Number of items sold.')),
+                ('gross', models.DecimalField(decimal_places=2, default=0, help_text='Sales before discount.', max_digits=12)),
+                ('discount', models.DecimalField(decimal_places=2, default=0, help_text='Coupon discounts given.', max_digits=12)),
+                ('net', models.DecimalField(decimal_places=2, default=0, help_text='Sales after discount.', max_digits=12)),
+            ],
+            options={
+                'verbose_name_plural': 'daily sales',
+                'ordering': ['-day'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dailysales',
+            constraint=models.UniqueConstraint(fields=('day',), name='orders_dailysales_day_uniq'),
+        ),
+        migrations.AddField(
+            model_name='dailyproductsales',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_product_sales', to='shop.category'),
+        ),
+        migrations.AddField(
+            model_name='dailyproductsales',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='shop.product'),
+        ),
+        migrations.AddField(
+            model_name='dailycategorysales',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='shop.category'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyproductsales',
+            constraint=models.UniqueConstraint(fields=('day', 'product'), name='orders_dailyproductsales_day_product_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailycategorysales',
+            constraint=models.UniqueConstraint(fields=('day', 'category'), name='orders_dailycategorysales_day_category_uniq'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.3 on 2026-10-19 08:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_stockreservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='idempotency_key',
+            field=models.UUIDField(blank=True, editable=False, help_text='Token of the checkout form submission that created this order.', null=True, unique=True),
+        ),
+    ]
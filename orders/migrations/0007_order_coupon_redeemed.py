@@ -0,0 +1,25 @@
+# Generated by Django 4.2.3 on 2026-10-19 09:37
+
+from django.db import migrations, models
+
+
+def mark_coupon_orders_redeemed(apps, schema_editor):
+    # Orders placed with a coupon were counted when they were created
+    Order = apps.get_model('orders', 'Order')
+    Order.objects.filter(coupon__isnull=False).update(coupon_redeemed=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_order_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='coupon_redeemed',
+            field=models.BooleanField(default=False, editable=False, help_text="Whether the order counts against its coupon's redemption limits. Cleared when an unpaid checkout is released."),
+        ),
+        migrations.RunPython(mark_coupon_orders_redeemed, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,9 @@
 from django.db import models
-from shop.models import Product
+from shop.models import Category, Product
 from decimal import Decimal
 from django.core.validators import MinValueValidator, MaxValueValidator
 from coupons.models import Coupon
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 # Models for handling orders and order items in the e-commerce application.
@@ -38,6 +39,19 @@ class Order(models.Model):
         validators=[MinValueValidator(0), MaxValueValidator(100)],
         help_text="Discount percentage applied to the order."
     )
+    coupon_redeemed = models.BooleanField(
+        default=False,
+        editable=False,
+        help_text="Whether the order counts against its coupon's redemption limits. "
+                  "Cleared when an unpaid checkout is released."
+    )
+    idempotency_key = models.UUIDField(
+        unique=True,
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Token of the checkout form submission that created this order."
+    )
 
     class Meta:
         ordering = ['-created']
@@ -120,3 +134,177 @@ class OrderItem(models.Model):
             Decimal: Total cost for this order item.
         """
         return self.price * self.quantity
+
+
+class StockReservation(models.Model):
+    """
+    Stock held for an order while the customer pays.
+
+    Created together with the order, committed when the payment webhook
+    arrives and released (stock returned to the product) when the payment
+    is canceled or the reservation expires.
+    """
+
+    STATUS_HELD = 'held'
+    STATUS_COMMITTED = 'committed'
+    STATUS_RELEASED = 'released'
+    STATUS_CHOICES = [
+        (STATUS_HELD, 'Held'),
+        (STATUS_COMMITTED, 'Committed'),
+        (STATUS_RELEASED, 'Released'),
+    ]
+
+    order = models.ForeignKey(Order, related_name='reservations', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, related_name='reservations', on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_HELD)
+    expires = models.DateTimeField(help_text="Held stock is released after this time.")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'expires'])
+        ]
+
+    def __str__(self):
+        """
+        Returns a string representation of the reservation.
+        """
+        return f'{self.quantity} x {self.product_id} for order {self.order_id}'
+
+
+class EmailOutbox(models.Model):
+    """
+    A transactional e-mail waiting to be delivered.
+
+    Rows are written in the same database transaction as the order or
+    payment change that triggers them, and are delivered in batches by the
+    `flush_email_outbox` task over a single reused mail connection.
+    The unique `key` suppresses duplicates (e.g. a redelivered webhook).
+    """
+
+    KIND_ORDER_CREATED = 'order_created'
+    KIND_INVOICE = 'invoice'
+    KIND_CHOICES = [
+        (KIND_ORDER_CREATED, 'Order confirmation'),
+        (KIND_INVOICE, 'Invoice'),
+    ]
+
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    key = models.CharField(max_length=100, unique=True, help_text="Deduplication key, e.g. 'invoice:12'.")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    order = models.ForeignKey(
+        Order,
+        related_name='emails',
+        on_delete=models.CASCADE,
+        help_text="The order this e-mail is about."
+    )
+    subject = models.CharField(max_length=250)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    to = models.EmailField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0, help_text="Number of delivery attempts so far.")
+    next_attempt = models.DateTimeField(default=timezone.now, help_text="Earliest time of the next delivery attempt.")
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    sent = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['next_attempt']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt'])
+        ]
+        verbose_name = 'outbox e-mail'
+        verbose_name_plural = 'e-mail outbox'
+
+    def __str__(self):
+        """
+        Returns a string representation of the outbox entry.
+        """
+        return self.key
+
+
+class SalesRollup(models.Model):
+    """
+    Abstract base for daily sales rollups.
+
+    Holds the aggregated figures of paid orders for one day. Rollups are
+    maintained incrementally by `orders.rollups.refresh_sales_rollups` and
+    are the only source read by the sales report, so reporting cost does not
+    grow with the size of the order table.
+    """
+
+    day = models.DateField()
+    orders = models.PositiveIntegerField(default=0, help_text="Number of paid orders.")
+    units = models.PositiveIntegerField(default=0, help_text="Number of items sold.")
+    gross = models.DecimalField(max_digits=12, decimal_places=2, default=0, help_text="Sales before discount.")
+    discount = models.DecimalField(max_digits=12, decimal_places=2, default=0, help_text="Coupon discounts given.")
+    net = models.DecimalField(max_digits=12, decimal_places=2, default=0, help_text="Sales after discount.")
+
+    class Meta:
+        abstract = True
+        ordering = ['-day']
+
+
+class DailySales(SalesRollup):
+    """
+    Shop-wide sales totals per day.
+    """
+
+    class Meta(SalesRollup.Meta):
+        constraints = [
+            models.UniqueConstraint(fields=['day'], name='orders_dailysales_day_uniq')
+        ]
+        verbose_name_plural = 'daily sales'
+
+
+class DailyCategorySales(SalesRollup):
+    """
+    Sales totals per day and product category.
+    """
+
+    category = models.ForeignKey(Category, related_name='daily_sales', on_delete=models.CASCADE)
+
+    class Meta(SalesRollup.Meta):
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'category'], name='orders_dailycategorysales_day_category_uniq')
+        ]
+        verbose_name_plural = 'daily category sales'
+
+
+class DailyProductSales(SalesRollup):
+    """
+    Sales totals per day and product.
+    """
+
+    product = models.ForeignKey(Product, related_name='daily_sales', on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, related_name='daily_product_sales', on_delete=models.CASCADE)
+
+    class Meta(SalesRollup.Meta):
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product'], name='orders_dailyproductsales_day_product_uniq')
+        ]
+        verbose_name_plural = 'daily product sales'
+
+
+class RollupWatermark(models.Model):
+    """
+    Remembers up to which `Order.updated` time a rollup job has processed orders.
+    """
+
+    name = models.CharField(max_length=50, unique=True)
+    value = models.DateTimeField()
+
+    def __str__(self):
+        """
+        Returns a string representation of the watermark.
+        """
+        return f'{self.name} @ {self.value}'
@@ -0,0 +1,225 @@
+from datetime import timedelta
+from io import BytesIO
+import weasyprint
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils import timezone
+from .models import EmailOutbox
+
+# Transactional e-mail outbox.
+# Views and webhooks queue e-mails inside their own transaction; the periodic
+# `flush_email_outbox` task delivers them in batches over one mail connection.
+
+
+def queue_email(order, kind, subject, body, from_email):
+    """
+    Adds an e-mail about `order` to the outbox.
+
+    The row is keyed by kind and order ID, so queueing the same e-mail
+    twice (double submit, webhook redelivery) is a no-op. Call this inside
+    the transaction that creates or updates the order.
+
+    Args:
+        order (Order): The order the e-mail is about.
+        kind (str): One of the `EmailOutbox.KIND_*` constants.
+        subject (str): E-mail subject.
+        body (str): Plain-text e-mail body.
+        from_email (str): Sender address.
+    """
+    EmailOutbox.objects.bulk_create(
+        [EmailOutbox(
+            key=f'{kind}:{order.id}',
+            kind=kind,
+            order=order,
+            subject=subject,
+            body=body,
+            from_email=from_email,
+            to=order.email,
+        )],
+        ignore_conflicts=True
+    )
+
+
+def queue_order_created(order):
+    """
+    Queues the order confirmation e-mail for a newly created order.
+    """
+    queue_email(
+        order,
+        EmailOutbox.KIND_ORDER_CREATED,
+        f'Order nr. {order.id}',
+        f'Dear {order.first_name},\n\nYou have successfully placed an order. Your order ID is {order.id}',
+        'admin@myshop',
+    )
+
+
+def queue_invoice(order):
+    """
+    Queues the invoice e-mail for a paid order.
+
+    The PDF is rendered when the e-mail is delivered, not here, so the
+    webhook transaction stays short.
+    """
+    queue_email(
+        order,
+        EmailOutbox.KIND_INVOICE,
+        f'My Shop - Invoice no. {order.id}',
+        'Please find attached the invoice for your recent purchase.',
+        'admin@myshop.com',
+    )
+
+
+def render_invoice_pdf(order):
+    """
+    Renders the PDF invoice for an order.
+
+    Returns:
+        bytes: The PDF document.
+    """
+    html = render_to_string('orders/order/pdf.html', {'order': order})
+    out = BytesIO()
+    stylesheets = [weasyprint.CSS(settings.STATIC_ROOT / 'css/pdf.css')]
+    weasyprint.HTML(string=html).write_pdf(out, stylesheets=stylesheets)
+    return out.getvalue()
+
+
+def build_message(entry, connection=None):
+    """
+    Builds the `EmailMessage` for an outbox entry.
+
+    Args:
+        entry (EmailOutbox): The outbox entry.
+        connection: Mail backend instance the message will be sent with.
+
+    Returns:
+        EmailMessage: The message, with the invoice attached if applicable.
+    """
+    message = EmailMessage(
+        entry.subject,
+        entry.body,
+        entry.from_email,
+        [entry.to],
+        connection=connection
+    )
+    if entry.kind == EmailOutbox.KIND_INVOICE:
+        message.attach(f'order_{entry.order_id}.pdf', render_invoice_pdf(entry.order), 'application/pdf')
+    return message
+
+
+def retry_delay(attempts):
+    """
+    Returns the exponential backoff delay before the next delivery attempt.
+
+    Args:
+        attempts (int): Number of attempts made so far (at least 1).
+    """
+    seconds = settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1)
+    return timedelta(seconds=min(seconds, settings.EMAIL_OUTBOX_MAX_RETRY_DELAY))
+
+
+def _claim(batch_size):
+    """
+    Leases up to `batch_size` pending, due entries to this flusher.
+
+    The rows are locked only while their `next_attempt` is pushed
+    `EMAIL_OUTBOX_LEASE` seconds ahead (skipping rows locked by a concurrent
+    flusher on databases that support it), so no transaction stays open
+    while mail is sent. Entries of a flusher that dies mid-batch become due
+    again when the lease runs out.
+
+    Returns:
+        list[EmailOutbox]: The leased entries, with their orders.
+    """
+    with transaction.atomic():
+        entries = list(
+            EmailOutbox.objects
+            .select_for_update(skip_locked=True, of=('self',))
+            .select_related('order')
+            .filter(status=EmailOutbox.STATUS_PENDING, next_attempt__lte=timezone.now())
+            [:batch_size]
+        )
+        if entries:
+            EmailOutbox.objects.filter(id__in=[entry.id for entry in entries]).update(
+                next_attempt=timezone.now() + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE)
+            )
+    return entries
+
+
+def _fail(entry, exc):
+    """
+    Records a failed delivery attempt on `entry` (not saved): reschedules it
+    with exponential backoff, or marks it failed after
+    `EMAIL_OUTBOX_MAX_ATTEMPTS`.
+    """
+    entry.attempts += 1
+    entry.last_error = repr(exc)
+    if entry.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        entry.status = EmailOutbox.STATUS_FAILED
+    else:
+        entry.next_attempt = timezone.now() + retry_delay(entry.attempts)
+
+
+def flush(batch_size=None, connection=None):
+    """
+    Delivers one batch of due outbox e-mails over a single mail connection.
+
+    Steps:
+    1. Leases up to `batch_size` pending, due entries in a short
+       transaction (see `_claim`).
+    2. Opens the mail connection once and sends every message through it,
+       outside any transaction. Each delivered entry is marked sent right
+       away, so a later failure cannot get it sent twice.
+    3. Failed entries, or the whole batch if the connection cannot be
+       opened, are rescheduled with exponential backoff, or marked failed
+       after `EMAIL_OUTBOX_MAX_ATTEMPTS`.
+
+    Args:
+        batch_size (int, optional): Maximum number of e-mails to send.
+            Defaults to `EMAIL_OUTBOX_BATCH_SIZE`.
+        connection (optional): Mail backend instance to reuse. Defaults to
+            `get_connection()`.
+
+    Returns:
+        tuple[int, int]: Number of e-mails sent and number of failures.
+    """
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    connection = connection or get_connection()
+
+    entries = _claim(batch_size)
+    if not entries:
+        return 0, 0
+
+    sent = 0
+    failed = []
+    try:
+        # Opening the connection once keeps a single SMTP session for the batch
+        connection.open()
+    except Exception as exc:
+        for entry in entries:
+            _fail(entry, exc)
+        failed = entries
+    else:
+        try:
+            for entry in entries:
+                try:
+                    connection.send_messages([build_message(entry, connection)])
+                except Exception as exc:
+                    _fail(entry, exc)
+                    failed.append(entry)
+                else:
+                    EmailOutbox.objects.filter(id=entry.id).update(
+                        status=EmailOutbox.STATUS_SENT,
+                        sent=timezone.now(),
+                        attempts=F('attempts') + 1
+                    )
+                    sent += 1
+        finally:
+            connection.close()
+
+    if failed:
+        EmailOutbox.objects.bulk_update(failed, ['attempts', 'last_error', 'status', 'next_attempt'])
+
+    return sent, len(failed)
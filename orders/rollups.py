@@ -0,0 +1,127 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import (
+    Order, OrderItem, DailySales, DailyCategorySales, DailyProductSales, RollupWatermark
+)
+
+# Incremental daily sales rollups.
+# Each run finds the days touched by orders created or changed since the last
+# watermark and recomputes only those days with database-side aggregation.
+
+WATERMARK_NAME = 'sales_rollups'
+
+# `Order.updated` is set when the order is saved, before its transaction
+# commits, so an order saved just before a run may only become visible after
+# it. Each run re-scans this window before its own start.
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+CENT = Decimal('0.01')
+
+# Rollup model -> extra grouping of the aggregation besides the day,
+# as {rollup field: OrderItem lookup}
+ROLLUPS = [
+    (DailySales, {}),
+    (DailyCategorySales, {'category_id': 'product__category'}),
+    (DailyProductSales, {'product_id': 'product', 'category_id': 'product__category'}),
+]
+
+
+def _aggregate(days, group_by):
+    """
+    Aggregates paid order items for the given days.
+
+    Args:
+        days (list[date]): Days to aggregate.
+        group_by (dict): Extra grouping as {rollup field: OrderItem lookup}.
+
+    Yields:
+        dict: Field values for one rollup row per group.
+    """
+    line_total = F('price') * F('quantity')
+    rows = (
+        OrderItem.objects
+        .filter(order__paid=True, order__created__date__in=days)
+        .annotate(day=TruncDate('order__created'))
+        .values('day', *group_by.values())
+        .annotate(
+            orders=Count('order_id', distinct=True),
+            units=Sum('quantity'),
+            gross=Sum(line_total, output_field=DecimalField()),
+            # Discount percentage is applied after summing to keep the
+            # arithmetic exact on every backend.
+            discount_pct=Sum(line_total * F('order__discount'), output_field=DecimalField()),
+        )
+        .order_by()
+    )
+    for row in rows:
+        gross = Decimal(row['gross']).quantize(CENT)
+        discount = (Decimal(row['discount_pct']) / 100).quantize(CENT)
+        values = {field: row[lookup] for field, lookup in group_by.items()}
+        values.update(
+            day=row['day'],
+            orders=row['orders'],
+            units=row['units'],
+            gross=gross,
+            discount=discount,
+            net=gross - discount,
+        )
+        yield values
+
+
+def recompute_days(days):
+    """
+    Rebuilds all rollup rows for the given days.
+
+    Args:
+        days (Iterable[date]): Days whose rollups should be recomputed.
+    """
+    days = list(days)
+    if not days:
+        return
+
+    with transaction.atomic():
+        for model, group_by in ROLLUPS:
+            model.objects.filter(day__in=days).delete()
+            model.objects.bulk_create(
+                [model(**row) for row in _aggregate(days, group_by)],
+                batch_size=500
+            )
+
+
+def refresh_sales_rollups(full=False, chunk_size=100):
+    """
+    Brings the daily sales rollups up to date.
+
+    Only days that contain orders created or updated since the previous run,
+    less `WATERMARK_OVERLAP`, are recomputed. Overlap between runs is
+    harmless because recomputing a day is idempotent.
+
+    Args:
+        full (bool): Ignore the watermark and rebuild every day.
+        chunk_size (int): Number of days recomputed per transaction.
+
+    Returns:
+        int: Number of days recomputed.
+    """
+    started = timezone.now()
+    watermark = RollupWatermark.objects.filter(name=WATERMARK_NAME).first()
+
+    orders = Order.objects.all()
+    if watermark and not full:
+        orders = orders.filter(updated__gte=watermark.value)
+    days = sorted(
+        orders.annotate(day=TruncDate('created'))
+        .order_by()
+        .values_list('day', flat=True)
+        .distinct()
+    )
+
+    for i in range(0, len(days), chunk_size):
+        recompute_days(days[i:i + chunk_size])
+
+    RollupWatermark.objects.update_or_create(name=WATERMARK_NAME, defaults={'value': started - WATERMARK_OVERLAP})
+    return len(days)
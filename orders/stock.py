@@ -0,0 +1,255 @@
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from coupons import redemption
+from shop.catalog_cache import bump_catalog_version
+from shop.facets import refresh_facets
+from shop.models import Product
+from .models import Order, StockReservation
+
+# Stock reservations for checkout.
+# Stock is only ever changed with conditional UPDATE ... SET stock = stock - n
+# WHERE stock >= n statements, so concurrent checkouts cannot oversell and
+# no row is read and written back. Restocks and corrections from the admin
+# go through `adjust` for the same reason. Releasing the stock of an unpaid
+# order also gives back its coupon redemption. When a product sells out or comes back
+# into stock, the catalog pages and facet counts of its category are
+# refreshed after the commit; other stock moves do not change them.
+
+logger = logging.getLogger(__name__)
+
+
+class OutOfStock(Exception):
+    """
+    Raised when a product does not have enough stock for a reservation.
+    """
+
+    def __init__(self, product):
+        super().__init__(f'Not enough stock for {product}')
+        self.product = product
+
+
+def _take(product_id, quantity):
+    """
+    Atomically removes `quantity` units from a product's stock.
+
+    Returns:
+        bool: False if the product does not have enough stock.
+    """
+    return bool(
+        Product.objects
+        .filter(id=product_id, stock__gte=quantity)
+        .update(stock=F('stock') - quantity)
+    )
+
+
+def _give_back(product_id, quantity):
+    """
+    Atomically returns `quantity` units to a product's stock.
+    """
+    Product.objects.filter(id=product_id).update(stock=F('stock') + quantity)
+
+
+def adjust(product_id, delta):
+    """
+    Adds `delta` units to a product's stock, or removes them if negative,
+    relative to the stock at the time of the UPDATE. A product without
+    tracked stock starts tracking it at `delta`.
+
+    Returns:
+        bool: False if more units would be removed than are in stock.
+    """
+    products = Product.objects.filter(id=product_id)
+    if delta < 0:
+        products = products.filter(stock__gte=-delta)
+    if not products.update(stock=Coalesce(F('stock'), 0) + delta):
+        return False
+    # Sold out, or stock equal to the added quantity was zero before
+    if Product.objects.filter(id=product_id, stock=0 if delta < 0 else delta).exists():
+        _stock_state_changed([product_id])
+    return True
+
+
+def _stock_state_changed(product_ids):
+    """
+    Refreshes the catalog of the categories of products that sold out or
+    came back into stock, once the transaction commits.
+    """
+    def refresh():
+        category_ids = set(
+            Product.objects.filter(id__in=product_ids).values_list('category_id', flat=True)
+        )
+        bump_catalog_version(*category_ids)
+        refresh_facets(*category_ids)
+    if product_ids:
+        transaction.on_commit(refresh)
+
+
+def reserve(order, items):
+    """
+    Reserves stock for the items of an order.
+
+    Must run inside the transaction that creates the order, as late as
+    possible: each UPDATE locks its product row until the transaction
+    commits. Products are locked in ID order so concurrent checkouts of
+    the same products cannot deadlock. Products without tracked stock are
+    skipped.
+
+    Args:
+        order (Order): The order the stock is held for.
+        items (Iterable[tuple[Product, int]]): Products and quantities.
+
+    Raises:
+        OutOfStock: If any product has less stock than requested. The caller's
+            transaction must be rolled back.
+    """
+    quantities = {}
+    products = {}
+    for product, quantity in items:
+        if product.stock is None:
+            continue
+        products[product.id] = product
+        quantities[product.id] = quantities.get(product.id, 0) + quantity
+
+    expires = timezone.now() + timedelta(seconds=settings.STOCK_RESERVATION_TIMEOUT)
+    reservations = []
+    for product_id in sorted(quantities):
+        if not _take(product_id, quantities[product_id]):
+            raise OutOfStock(products[product_id])
+        reservations.append(StockReservation(
+            order=order,
+            product_id=product_id,
+            quantity=quantities[product_id],
+            expires=expires
+        ))
+    StockReservation.objects.bulk_create(reservations)
+    # The rows are locked by the updates above, so this sees our own changes
+    _stock_state_changed(list(
+        Product.objects.filter(id__in=quantities, stock=0).values_list('id', flat=True)
+    ))
+
+
+def _release_coupon(order_id):
+    """
+    Gives back the coupon redemption of an unpaid order, once: the order's
+    `coupon_redeemed` flag is cleared with a conditional UPDATE first.
+    """
+    orders = Order.objects.filter(id=order_id, paid=False, coupon_redeemed=True)
+    order = orders.select_related('coupon').first()
+    if order is None:
+        return
+    if orders.update(coupon_redeemed=False) and order.coupon:
+        redemption.give_back(order.coupon, order.email)
+
+
+def release(reservations):
+    """
+    Returns the stock of held reservations to their products, and the
+    coupon redemptions of their orders.
+
+    Each reservation is flipped from held to released with a conditional
+    UPDATE first, so a reservation committed or released concurrently is
+    never returned twice.
+
+    Args:
+        reservations (QuerySet[StockReservation]): Reservations to release.
+
+    Returns:
+        int: Number of reservations released.
+    """
+    released = 0
+    order_ids = set()
+    held = (
+        reservations
+        .filter(status=StockReservation.STATUS_HELD)
+        .values_list('id', 'order_id', 'product_id', 'quantity')
+    )
+    for reservation_id, order_id, product_id, quantity in held:
+        with transaction.atomic():
+            flipped = StockReservation.objects.filter(
+                id=reservation_id, status=StockReservation.STATUS_HELD
+            ).update(status=StockReservation.STATUS_RELEASED)
+            if flipped:
+                _give_back(product_id, quantity)
+                released += 1
+                if order_id not in order_ids:
+                    order_ids.add(order_id)
+                    _release_coupon(order_id)
+                # Stock equal to the returned quantity was zero before
+                if Product.objects.filter(id=product_id, stock=quantity).exists():
+                    _stock_state_changed([product_id])
+    return released
+
+
+def release_order(order_id):
+    """
+    Releases the stock and coupon redemption held by an unpaid order, when
+    its payment is cancelled.
+
+    Returns:
+        int: Number of reservations released.
+    """
+    released = release(StockReservation.objects.filter(order_id=order_id))
+    # Orders without tracked stock hold no reservation, only their coupon
+    with transaction.atomic():
+        _release_coupon(order_id)
+    return released
+
+
+def release_expired():
+    """
+    Releases every held reservation whose checkout window has passed, and
+    the coupon redemptions of unpaid orders past that window.
+
+    Returns:
+        int: Number of reservations released.
+    """
+    now = timezone.now()
+    released = release(StockReservation.objects.filter(expires__lt=now))
+    # Orders without tracked stock hold no reservation, only their coupon
+    expired = Order.objects.filter(
+        paid=False, coupon_redeemed=True, created__lt=now - timedelta(seconds=settings.STOCK_RESERVATION_TIMEOUT)
+    )
+    for order_id in expired.values_list('id', flat=True):
+        with transaction.atomic():
+            _release_coupon(order_id)
+    return released
+
+
+def commit(order):
+    """
+    Turns the reservations of a paid order into a permanent stock decrease.
+
+    Held reservations are simply marked committed. Reservations that were
+    already released (payment arrived after the checkout window) take their
+    stock again if it is still available; otherwise the shortfall is logged,
+    because the customer has paid and the order must stand. A coupon
+    redemption given back with the released stock is counted again.
+
+    Args:
+        order (Order): The paid order, with its `coupon_id`, `coupon_redeemed`
+            and `email`.
+    """
+    StockReservation.objects.filter(
+        order=order, status=StockReservation.STATUS_HELD
+    ).update(status=StockReservation.STATUS_COMMITTED)
+
+    late = list(StockReservation.objects.filter(order=order, status=StockReservation.STATUS_RELEASED))
+    for reservation in late:
+        if not _take(reservation.product_id, reservation.quantity):
+            logger.warning('Oversold product %s for late payment of order %s', reservation.product_id, order.id)
+        reservation.status = StockReservation.STATUS_COMMITTED
+        reservation.save(update_fields=['status'])
+    if late:
+        _stock_state_changed(list(
+            Product.objects
+            .filter(id__in=[reservation.product_id for reservation in late], stock=0)
+            .values_list('id', flat=True)
+        ))
+    if order.coupon_id and not order.coupon_redeemed:
+        redemption.count_paid(order.coupon, order.email)
+        Order.objects.filter(id=order.id).update(coupon_redeemed=True)
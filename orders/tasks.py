@@ -1,36 +1,55 @@
 from celery import shared_task
-from django.core.mail import send_mail
-from .models import Order
+from django.conf import settings
+from . import outbox, rollups, stock
 
 @shared_task
-def order_created(order_id):
+def flush_email_outbox():
     """
-    Celery task to send an order confirmation email to the customer.
+    Periodic Celery task that delivers queued transactional e-mails.
 
     This task:
-    1. Retrieves the order by its ID.
-    2. Composes an email with order details.
-    3. Sends the email asynchronously via Celery.
+    1. Sends due outbox e-mails in batches of `EMAIL_OUTBOX_BATCH_SIZE`,
+       each batch over one reused mail connection.
+    2. Keeps flushing until the outbox has no due e-mails left or
+       `EMAIL_OUTBOX_MAX_BATCHES` batches have been sent, so a sale spike
+       drains quickly without one run monopolising a worker.
 
-    Args:
-        order_id (int): The ID of the created order.
+    Scheduled through `CELERY_BEAT_SCHEDULE`.
 
     Returns:
-        int: Number of successfully delivered messages (as returned by send_mail).
+        dict: Number of e-mails sent and failed during this run.
     """
-    # Retrieve the order from the database
-    order = Order.objects.get(id=order_id)
-
-    # Email subject and body
-    subject = f'Order nr. {order.id}'
-    message = f'Dear {order.first_name},\n\nYou have successfully placed an order. Your order ID is {order.id}'
-
-    # Send email asynchronously
-    mail_sent = send_mail(
-        subject,
-        message,
-        'admin@myshop',  # From email
-        [order.email]     # Recipient list
-    )
-
-    return mail_sent
+    total_sent = total_failed = 0
+    for _ in range(settings.EMAIL_OUTBOX_MAX_BATCHES):
+        sent, failed = outbox.flush()
+        total_sent += sent
+        total_failed += failed
+        if sent + failed < settings.EMAIL_OUTBOX_BATCH_SIZE:
+            break
+
+    return {'sent': total_sent, 'failed': total_failed}
+
+
+@shared_task
+def refresh_sales_rollups():
+    """
+    Periodic Celery task that updates the daily sales rollups.
+
+    Only days with orders created or changed since the previous run are
+    recomputed (see `orders.rollups.refresh_sales_rollups`).
+
+    Returns:
+        int: Number of days recomputed.
+    """
+    return rollups.refresh_sales_rollups()
+
+
+@shared_task
+def release_expired_stock():
+    """
+    Periodic Celery task that returns stock held by abandoned checkouts.
+
+    Returns:
+        int: Number of reservations released.
+    """
+    return stock.release_expired()
@@ -1,3 +1,453 @@
-from django.test import TestCase
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone, translation
+from coupons.models import Coupon
+from payment.events import mark_orders_paid
+from shop.models import Category, Product
+from .models import Order, EmailOutbox, StockReservation, DailySales, DailyCategorySales, DailyProductSales
+from . import outbox, rollups, stock
 
-# Create your tests here.
+
+class CountingBackend(EmailBackend):
+    """
+    Locmem backend that counts how often a connection is opened and can
+    be told to reject messages for given recipients, or to fail to open.
+    """
+    opened = 0
+
+    def __init__(self, *args, reject=(), down=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reject = set(reject)
+        self.down = down
+
+    def open(self):
+        if self.down:
+            raise ConnectionRefusedError('SMTP server down')
+        CountingBackend.opened += 1
+        return True
+
+    def send_messages(self, messages):
+        for message in messages:
+            if self.reject.intersection(message.to):
+                raise ConnectionError('recipient refused')
+        return super().send_messages(messages)
+
+
+def create_order(**kwargs):
+    """
+    Creates an order with sensible defaults for tests.
+    """
+    data = {
+        'first_name': 'Ali',
+        'last_name': 'Mammadov',
+        'email': 'ali@example.com',
+        'address': 'Nizami 1',
+        'postal_code': '12345',
+        'city': 'Baku',
+    }
+    data.update(kwargs)
+    return Order.objects.create(**data)
+
+
+class EmailOutboxTests(TestCase):
+
+    def setUp(self):
+        CountingBackend.opened = 0
+
+    def test_queue_suppresses_duplicates(self):
+        order = create_order()
+        outbox.queue_order_created(order)
+        outbox.queue_order_created(order)
+        self.assertEqual(EmailOutbox.objects.filter(order=order).count(), 1)
+
+    def test_flush_sends_batch_over_one_connection(self):
+        for i in range(5):
+            outbox.queue_order_created(create_order(email=f'c{i}@example.com'))
+
+        sent, failed = outbox.flush(batch_size=10, connection=CountingBackend())
+
+        self.assertEqual((sent, failed), (5, 0))
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(CountingBackend.opened, 1)
+        self.assertFalse(EmailOutbox.objects.exclude(status=EmailOutbox.STATUS_SENT).exists())
+
+    def test_flush_respects_batch_size(self):
+        for i in range(3):
+            outbox.queue_order_created(create_order())
+
+        self.assertEqual(outbox.flush(batch_size=2, connection=CountingBackend()), (2, 0))
+        self.assertEqual(outbox.flush(batch_size=2, connection=CountingBackend()), (1, 0))
+        self.assertEqual(outbox.flush(batch_size=2, connection=CountingBackend()), (0, 0))
+
+    @override_settings(EMAIL_OUTBOX_RETRY_DELAY=60, EMAIL_OUTBOX_MAX_ATTEMPTS=2)
+    def test_failed_email_backs_off_then_fails(self):
+        outbox.queue_order_created(create_order(email='bad@example.com'))
+        outbox.queue_order_created(create_order(email='good@example.com'))
+        backend = CountingBackend(reject=['bad@example.com'])
+
+        self.assertEqual(outbox.flush(connection=backend), (1, 1))
+        entry = EmailOutbox.objects.get(to='bad@example.com')
+        self.assertEqual(entry.status, EmailOutbox.STATUS_PENDING)
+        self.assertEqual(entry.attempts, 1)
+        self.assertGreater(entry.next_attempt, timezone.now() + timedelta(seconds=50))
+
+        # Not due yet, so nothing is retried
+        self.assertEqual(outbox.flush(connection=backend), (0, 0))
+
+        EmailOutbox.objects.filter(id=entry.id).update(next_attempt=timezone.now())
+        self.assertEqual(outbox.flush(connection=backend), (0, 1))
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, EmailOutbox.STATUS_FAILED)
+        self.assertIn('recipient refused', entry.last_error)
+
+    @override_settings(EMAIL_OUTBOX_RETRY_DELAY=60)
+    def test_unreachable_server_backs_off_whole_batch(self):
+        for i in range(3):
+            outbox.queue_order_created(create_order())
+
+        self.assertEqual(outbox.flush(connection=CountingBackend(down=True)), (0, 3))
+        for entry in EmailOutbox.objects.all():
+            self.assertEqual(entry.status, EmailOutbox.STATUS_PENDING)
+            self.assertEqual(entry.attempts, 1)
+            self.assertIn('SMTP server down', entry.last_error)
+            self.assertGreater(entry.next_attempt, timezone.now() + timedelta(seconds=50))
+        self.assertEqual(outbox.flush(connection=CountingBackend()), (0, 0))
+
+    def test_claimed_entries_are_leased_while_sending(self):
+        outbox.queue_order_created(create_order())
+        leased = []
+
+        def send_messages(messages):
+            leased.append(EmailOutbox.objects.get().next_attempt)
+            return len(messages)
+
+        backend = CountingBackend()
+        with mock.patch.object(backend, 'send_messages', side_effect=send_messages):
+            self.assertEqual(outbox.flush(connection=backend), (1, 0))
+        self.assertGreater(leased[0], timezone.now() + timedelta(seconds=60))
+        self.assertEqual(EmailOutbox.objects.get().status, EmailOutbox.STATUS_SENT)
+
+
+class OrderCreateTests(TestCase):
+
+    def setUp(self):
+        self.enterContext(translation.override('en'))
+        category = Category.objects.create(name='Tea', slug='tea')
+        self.product = Product.objects.create(
+            category=category, name='Green tea', slug='green-tea', price=Decimal('4.50')
+        )
+
+    def test_order_create_queues_confirmation_email(self):
+        self.client.post(reverse('cart:cart_add', args=[self.product.id]), {'quantity': 2})
+        response = self.client.post(reverse('orders:order_create'), {
+            'first_name': 'Ali',
+            'last_name': 'Mammadov',
+            'email': 'ali@example.com',
+            'address': 'Nizami 1',
+            'postal_code': '12345',
+            'city': 'Baku',
+        })
+
+        self.assertRedirects(response, reverse('payment:process'), fetch_redirect_response=False)
+        order = Order.objects.get()
+        self.assertEqual(order.items.get().quantity, 2)
+        entry = EmailOutbox.objects.get(order=order)
+        self.assertEqual(entry.kind, EmailOutbox.KIND_ORDER_CREATED)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_repeated_submission_returns_original_order(self):
+        self.client.post(reverse('cart:cart_add', args=[self.product.id]), {'quantity': 1})
+        data = {
+            'first_name': 'Ali',
+            'last_name': 'Mammadov',
+            'email': 'ali@example.com',
+            'address': 'Nizami 1',
+            'postal_code': '12345',
+            'city': 'Baku',
+            'idempotency_key': str(uuid.uuid4()),
+        }
+        self.client.post(reverse('orders:order_create'), data)
+        order = Order.objects.get()
+
+        self.client.post(reverse('cart:cart_add', args=[self.product.id]), {'quantity': 1})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('orders:order_create'), data)
+
+        self.assertRedirects(response, reverse('payment:process'), fetch_redirect_response=False)
+        self.assertEqual(self.client.session['order-id'], order.id)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(EmailOutbox.objects.count(), 1)
+        writes = [q['sql'] for q in queries if not q['sql'].startswith('SELECT')]
+        self.assertFalse([sql for sql in writes if 'orders_' in sql])
+
+    def test_form_is_rendered_with_idempotency_key(self):
+        response = self.client.get(reverse('orders:order_create'))
+        self.assertContains(response, 'name="idempotency_key"')
+
+
+class SalesRollupTests(TestCase):
+
+    def setUp(self):
+        self.enterContext(translation.override('en'))
+        self.tea = Category.objects.create(name='Tea', slug='tea')
+        self.green = Product.objects.create(category=self.tea, name='Green', slug='green', price=Decimal('4.50'))
+        self.black = Product.objects.create(category=self.tea, name='Black', slug='black', price=Decimal('3.00'))
+
+    def add_order(self, items, paid=True, discount=0):
+        order = create_order(paid=paid, discount=discount)
+        for product, quantity in items:
+            order.items.create(product=product, price=product.price, quantity=quantity)
+        return order
+
+    def test_rollups_match_order_totals(self):
+        first = self.add_order([(self.green, 2), (self.black, 1)], discount=10)
+        second = self.add_order([(self.green, 1)])
+        self.add_order([(self.black, 5)], paid=False)
+
+        self.assertEqual(rollups.refresh_sales_rollups(), 1)
+
+        day = DailySales.objects.get()
+        self.assertEqual(day.orders, 2)
+        self.assertEqual(day.units, 4)
+        self.assertEqual(day.gross, first.get_total_cost_before_discount() + second.get_total_cost())
+        self.assertEqual(day.net, (first.get_total_cost() + second.get_total_cost()).quantize(Decimal('0.01')))
+        self.assertEqual(DailyCategorySales.objects.get(category=self.tea).orders, 2)
+        green = DailyProductSales.objects.get(product=self.green)
+        self.assertEqual((green.orders, green.units, green.gross), (2, 3, Decimal('13.50')))
+
+    def test_only_changed_orders_are_reprocessed(self):
+        order = self.add_order([(self.green, 1)])
+        Order.objects.filter(id=order.id).update(updated=timezone.now() - timedelta(hours=1))
+        rollups.refresh_sales_rollups()
+        self.assertEqual(rollups.refresh_sales_rollups(), 0)
+
+        pending = self.add_order([(self.black, 2)], paid=False)
+        pending.paid = True
+        pending.save()
+        self.assertEqual(rollups.refresh_sales_rollups(), 1)
+        self.assertEqual(DailySales.objects.get().orders, 2)
+
+    def test_orders_committed_after_a_run_are_picked_up(self):
+        started = timezone.now()
+        rollups.refresh_sales_rollups()
+        # Saved just before the run started, committed after its scan
+        order = self.add_order([(self.green, 1)])
+        Order.objects.filter(id=order.id).update(updated=started - timedelta(seconds=1))
+
+        self.assertEqual(rollups.refresh_sales_rollups(), 1)
+        self.assertEqual(DailySales.objects.get().orders, 1)
+
+    def test_report_reads_rollups_only(self):
+        self.add_order([(self.green, 1)])
+        rollups.refresh_sales_rollups()
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+        self.client.force_login(admin)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('orders:admin_sales_report'))
+
+        self.assertContains(response, 'Green')
+        tables = ' '.join(q['sql'] for q in queries)
+        self.assertNotIn('"orders_orderitem"', tables)
+        self.assertNotIn('"orders_order"', tables)
+
+
+class StockReservationTests(TestCase):
+
+    def setUp(self):
+        self.enterContext(translation.override('en'))
+        category = Category.objects.create(name='Tea', slug='tea')
+        self.product = Product.objects.create(
+            category=category, name='Green tea', slug='green-tea', price=Decimal('4.50'), stock=3
+        )
+
+    def checkout(self, quantity):
+        self.client.post(reverse('cart:cart_add', args=[self.product.id]), {'quantity': quantity})
+        return self.client.post(reverse('orders:order_create'), {
+            'first_name': 'Ali',
+            'last_name': 'Mammadov',
+            'email': 'ali@example.com',
+            'address': 'Nizami 1',
+            'postal_code': '12345',
+            'city': 'Baku',
+        })
+
+    def test_checkout_reserves_stock(self):
+        self.checkout(2)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 1)
+        self.assertEqual(Order.objects.get().reservations.get().status, StockReservation.STATUS_HELD)
+
+    def test_checkout_fails_without_stock(self):
+        response = self.checkout(4)
+        self.assertContains(response, 'does not have enough stock')
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(EmailOutbox.objects.exists())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
+
+    def test_expired_reservation_is_released_once(self):
+        self.checkout(2)
+        StockReservation.objects.update(expires=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(stock.release_expired(), 1)
+        self.assertEqual(stock.release_expired(), 0)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
+
+    def test_commit_keeps_stock_taken(self):
+        self.checkout(2)
+        order = Order.objects.get()
+        stock.commit(order)
+        self.assertEqual(stock.release_expired(), 0)
+        self.assertEqual(order.reservations.get().status, StockReservation.STATUS_COMMITTED)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 1)
+
+    def test_late_payment_takes_stock_again(self):
+        self.checkout(2)
+        order = Order.objects.get()
+        stock.release(order.reservations.all())
+        stock.commit(order)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 1)
+
+    def apply_coupon(self):
+        now = timezone.now()
+        coupon = Coupon.objects.create(
+            code='FIRST1', valid_from=now - timedelta(days=1), valid_to=now + timedelta(days=1), discount=10,
+            max_uses=1, max_uses_per_email=1
+        )
+        self.client.post(reverse('coupons:apply'), {'code': coupon.code})
+        return coupon
+
+    def assertCouponCounts(self, coupon, used_count, usage_count):
+        coupon.refresh_from_db()
+        self.assertEqual(coupon.used_count, used_count)
+        self.assertEqual(coupon.usages.get().count, usage_count)
+
+    def test_expired_checkout_gives_coupon_back(self):
+        coupon = self.apply_coupon()
+        self.checkout(2)
+        self.assertCouponCounts(coupon, 1, 1)
+
+        StockReservation.objects.update(expires=timezone.now() - timedelta(seconds=1))
+        stock.release_expired()
+        stock.release_expired()
+        self.assertCouponCounts(coupon, 0, 0)
+
+        # Paid after all: the redemption is counted again
+        with transaction.atomic():
+            mark_orders_paid([Order.objects.get().id])
+        self.assertCouponCounts(coupon, 1, 1)
+        self.assertEqual(stock.release_expired(), 0)
+        self.assertCouponCounts(coupon, 1, 1)
+
+    def test_cancelled_checkout_without_tracked_stock_gives_coupon_back(self):
+        Product.objects.filter(id=self.product.id).update(stock=None)
+        coupon = self.apply_coupon()
+        self.checkout(1)
+        session = self.client.session
+        session['order-id'] = Order.objects.get().id
+        session.save()
+
+        self.client.get(reverse('payment:canceled'))
+        self.assertCouponCounts(coupon, 0, 0)
+        self.assertFalse(Order.objects.get().coupon_redeemed)
+
+    @override_settings(STOCK_RESERVATION_TIMEOUT=60)
+    def test_abandoned_checkout_without_tracked_stock_gives_coupon_back(self):
+        Product.objects.filter(id=self.product.id).update(stock=None)
+        coupon = self.apply_coupon()
+        self.checkout(1)
+        stock.release_expired()
+        self.assertCouponCounts(coupon, 1, 1)
+
+        Order.objects.update(created=timezone.now() - timedelta(seconds=61))
+        stock.release_expired()
+        self.assertCouponCounts(coupon, 0, 0)
+
+    def post_product_change(self, **data):
+        return self.client.post(reverse('admin:shop_product_change', args=[self.product.id]), {
+            'category': self.product.category_id,
+            'name': self.product.name,
+            'slug': self.product.slug,
+            'price': '4.50',
+            'available': 'on',
+            # Loaded with the page; the admin must not write it back
+            'stock': '3',
+            **data,
+        })
+
+    def test_admin_changes_stock_by_delta(self):
+        self.checkout(2)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        response = self.post_product_change(stock_change='5')
+        self.assertEqual(response.status_code, 302)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 6)
+
+        response = self.post_product_change(price='5.00')
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.price, self.product.stock), (Decimal('5.00'), 6))
+
+    def test_admin_cannot_remove_more_than_in_stock(self):
+        self.checkout(2)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        response = self.post_product_change(stock_change='-2')
+        self.assertContains(response, 'Only 1 units are in stock.')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 1)
+
+    def test_untracked_stock_is_not_reserved(self):
+        Product.objects.filter(id=self.product.id).update(stock=None)
+        self.checkout(5)
+        self.assertFalse(StockReservation.objects.exists())
+
+
+@skipUnlessDBFeature('test_db_allows_multiple_connections')
+class StockConcurrencyTests(TransactionTestCase):
+    """
+    Many parallel checkouts on one hot product must never oversell.
+
+    Needs a test database that accepts concurrent connections (PostgreSQL);
+    on SQLite use `manage.py bench_stock` against a file database instead.
+    """
+
+    def test_parallel_reservations_do_not_oversell(self):
+        with translation.override('en'):
+            category = Category.objects.create(name='Tea', slug='tea')
+        product = Product.objects.create(category=category, name='Hot', slug='hot', price=Decimal('1.00'), stock=25)
+        orders = [create_order() for _ in range(60)]
+        latencies = []
+
+        def checkout(order):
+            start = time.perf_counter()
+            try:
+                with transaction.atomic():
+                    stock.reserve(order, [(product, 1)])
+                return True
+            except stock.OutOfStock:
+                return False
+            finally:
+                latencies.append(time.perf_counter() - start)
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=12) as pool:
+            results = list(pool.map(checkout, orders))
+
+        product.refresh_from_db()
+        self.assertEqual(results.count(True), 25)
+        self.assertEqual(product.stock, 0)
+        self.assertEqual(StockReservation.objects.count(), 25)
+        self.assertLess(max(latencies), 2)
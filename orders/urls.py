@@ -14,4 +14,7 @@ urlpatterns = [
 
     # Admin route to generate/download PDF invoice for a specific order
     path("admin/order/<int:order_id>/pdf/", views.admin_order_pdf, name="admin_order_pdf"),
+
+    # Admin route to view the daily sales report built from rollup tables
+    path("admin/sales/", views.admin_sales_report, name="admin_sales_report"),
 ]
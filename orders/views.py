@@ -1,26 +1,61 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.db import IntegrityError, transaction
+from django.db.models import Sum
 from django.contrib.admin.views.decorators import staff_member_required
-from .models import OrderItem, Order
+from .models import OrderItem, Order, DailySales, DailyCategorySales, DailyProductSales
 from .forms import OrderCreateForm
 from cart.cart import Cart
-from .tasks import order_created
+from .outbox import queue_order_created
+from . import stock
+from coupons import redemption
 from django.urls import reverse
 from django.conf import settings
 from django.http import HttpResponse
 from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from datetime import timedelta
+from shop.models import Category, Product
 import weasyprint
 
+def _order_id_for_key(key):
+    """
+    Returns the ID of the order created with the given idempotency key, or None.
+    """
+    if not key:
+        return None
+    return Order.objects.filter(idempotency_key=key).values_list('id', flat=True).first()
+
+
+def _proceed_to_payment(request, order_id):
+    """
+    Stores the order ID in the session and redirects to the payment process.
+    """
+    request.session['order-id'] = order_id
+    return redirect(reverse('payment:process'))
+
+
 def order_create(request):
     """
     Handles order creation during the checkout process.
 
     Steps:
     1. Retrieves the shopping cart.
-    2. On POST, validates the order form and saves the order.
+    2. On POST, validates the order form. If an order was already created
+       with the form's idempotency key (double submit or client retry), the
+       customer is sent on to pay for that order without any writes.
+       Otherwise the order is saved.
     3. Associates coupon and discount if applied.
     4. Creates OrderItem instances for each cart item.
-    5. Clears the cart and triggers asynchronous email task.
-    6. Stores order ID in session and redirects to payment process.
+    5. Queues the confirmation e-mail in the outbox and reserves stock for
+       the items, in the same transaction. If a product is out of stock the
+       order is rolled back and the form is shown again with an error.
+       The same happens if the coupon has reached a redemption limit (see
+       `coupons.redemption`); the coupon is then removed from the cart.
+    6. Clears the cart.
+    7. Stores order ID in session and redirects to payment process.
+       A concurrent duplicate submission that loses the race on the unique
+       idempotency key is redirected to the winning order.
 
     Args:
         request (HttpRequest): Incoming request object.
@@ -33,34 +68,56 @@ def order_create(request):
     if request.method == 'POST':
         form = OrderCreateForm(request.POST)
         if form.is_valid():
+            key = form.cleaned_data['idempotency_key']
+            existing_id = _order_id_for_key(key)
+            if existing_id:
+                return _proceed_to_payment(request, existing_id)
+
             order = form.save(commit=False)
+            order.idempotency_key = key
             
             # Apply coupon if available in cart
-            if cart.coupon:
-                order.coupon = cart.coupon
-                order.discount = cart.coupon.discount
-
-            order.save()
-
-            # Create OrderItem for each cart item
-            for item in cart:
-                OrderItem.objects.create(
-                    order=order,
-                    product=item['product'],
-                    price=item['price'],
-                    quantity=item['quantity']
-                )
-
-            cart.clear()
-
-            # Send asynchronous confirmation email
-            order_created.delay(order.id)
-
-            # Save order ID in session for payment process
-            request.session['order-id'] = order.id
-
-            # Redirect to payment processing page
-            return redirect(reverse('payment:process'))
+            coupon = cart.coupon
+            if coupon:
+                order.coupon = coupon
+                order.discount = coupon.discount
+                order.coupon_redeemed = True
+
+            items = [(item['product'], item['price'], item['quantity']) for item in cart]
+
+            try:
+                with transaction.atomic():
+                    order.save()
+
+                    # Create OrderItem for each cart item
+                    OrderItem.objects.bulk_create([
+                        OrderItem(order=order, product=product, price=price, quantity=quantity)
+                        for product, price, quantity in items
+                    ])
+
+                    # Queue the confirmation email; it is sent by the outbox flusher
+                    queue_order_created(order)
+
+                    # Reserve stock and count the coupon use last so product
+                    # and coupon rows stay locked as briefly as possible
+                    stock.reserve(order, [(product, quantity) for product, _, quantity in items])
+                    if coupon:
+                        redemption.redeem(coupon, order.email)
+            except stock.OutOfStock as e:
+                form.add_error(None, f'Sorry, "{e.product.name}" does not have enough stock left.')
+            except redemption.CouponUnavailable as e:
+                # Drop the coupon so the customer can order without it
+                cart.remove_coupon()
+                form.add_error(None, f'Sorry, coupon "{e.coupon.code}" is no longer available.')
+            except IntegrityError:
+                # A concurrent submission with the same key committed first
+                existing_id = _order_id_for_key(key)
+                if not existing_id:
+                    raise
+                return _proceed_to_payment(request, existing_id)
+            else:
+                cart.clear()
+                return _proceed_to_payment(request, order.id)
     else:
         form = OrderCreateForm()
 
@@ -84,7 +141,9 @@ def admin_order_detail(request, order_id):
     Returns:
         HttpResponse: Rendered admin order detail page.
     """
-    order = get_object_or_404(Order, id=order_id)
+    order = get_object_or_404(
+        Order.objects.select_related('coupon').prefetch_related('items__product'), id=order_id
+    )
     return render(request, 'admin/orders/order/detail.html', {'order': order})
 
 
@@ -106,7 +165,9 @@ def admin_order_pdf(request, order_id):
     Returns:
         HttpResponse: PDF file response with order invoice.
     """
-    order = get_object_or_404(Order, id=order_id)
+    order = get_object_or_404(
+        Order.objects.select_related('coupon').prefetch_related('items__product'), id=order_id
+    )
     html = render_to_string('orders/order/pdf.html', {'order': order})
     response = HttpResponse(content_type='application/pdf')
     response['Content-Disposition'] = f'filename=order_{order.id}.pdf'
@@ -115,3 +176,57 @@ def admin_order_pdf(request, order_id):
         stylesheets=[weasyprint.CSS(settings.STATIC_ROOT / 'css/pdf.css')]
     )
     return response
+
+
+@staff_member_required
+def admin_sales_report(request):
+    """
+    Renders the daily sales report for admin users.
+
+    Reads only from the daily rollup tables maintained by the
+    `refresh_sales_rollups` task, never from Order/OrderItem, so the page
+    cost depends on the reported period rather than the order volume.
+
+    Query parameters:
+        start, end (YYYY-MM-DD, optional): Reported period, inclusive.
+            Defaults to the last 30 days.
+
+    Args:
+        request (HttpRequest): Incoming request object.
+
+    Returns:
+        HttpResponse: Rendered admin sales report page.
+    """
+    end = parse_date(request.GET.get('end') or '') or timezone.now().date()
+    start = parse_date(request.GET.get('start') or '') or end - timedelta(days=29)
+    totals = ['orders', 'units', 'gross', 'discount', 'net']
+    sums = {field: Sum(field) for field in totals}
+
+    days = DailySales.objects.filter(day__range=(start, end))
+
+    categories = list(
+        DailyCategorySales.objects.filter(day__range=(start, end))
+        .values('category').annotate(**sums).order_by('-net')
+    )
+    names = Category.objects.filter(id__in=[c['category'] for c in categories]).prefetch_related('translations')
+    names = {c.id: c for c in names}
+    for row in categories:
+        row['category'] = names.get(row['category'])
+
+    products = list(
+        DailyProductSales.objects.filter(day__range=(start, end))
+        .values('product').annotate(**sums).order_by('-net')[:20]
+    )
+    names = Product.objects.in_bulk([p['product'] for p in products])
+    for row in products:
+        row['product'] = names.get(row['product'])
+
+    context = {
+        'start': start,
+        'end': end,
+        'days': days,
+        'total': days.aggregate(**sums),
+        'categories': categories,
+        'products': products,
+    }
+    return render(request, 'admin/orders/sales/report.html', context)
@@ -1,3 +1,22 @@
 from django.contrib import admin
+from .models import StripeCoupon, StripeEvent
 
-# Register your models here.
+@admin.register(StripeCoupon)
+class StripeCouponAdmin(admin.ModelAdmin):
+    """
+    Admin interface for the mapping of local coupons to Stripe coupons.
+    """
+    list_display = ['stripe_id', 'coupon', 'percent_off', 'created']
+    raw_id_fields = ['coupon']
+
+
+@admin.register(StripeEvent)
+class StripeEventAdmin(admin.ModelAdmin):
+    """
+    Admin interface for recorded Stripe webhook events.
+
+    Shows which events are still waiting to be processed.
+    """
+    list_display = ['event_id', 'type', 'received', 'processed']
+    list_filter = ['type', 'processed', 'received']
+    search_fields = ['event_id']
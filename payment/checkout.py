@@ -0,0 +1,79 @@
+import stripe
+from django.db.models import F, IntegerField
+from django.db.models.functions import Cast, Round
+from .stripe_coupons import get_stripe_coupon_id
+
+# Stripe Checkout session building.
+
+CURRENCY = 'azn'
+
+
+def build_line_items(order):
+    """
+    Builds the Stripe line items of an order.
+
+    Items and product names are loaded in a single query, and unit prices
+    are converted to minor units (qəpik) by the database, so no per-item
+    queries or Decimal arithmetic happen in Python.
+
+    Args:
+        order (Order): The order being paid.
+
+    Returns:
+        list[dict]: Stripe `line_items` parameters.
+    """
+    items = (
+        order.items
+        .annotate(unit_amount=Cast(Round(F('price') * 100), IntegerField()))
+        .values_list('unit_amount', 'quantity', 'product__name')
+    )
+    return [
+        {
+            'price_data': {
+                'unit_amount': unit_amount,
+                'currency': CURRENCY,
+                'product_data': {'name': name},
+            },
+            'quantity': quantity,
+        }
+        for unit_amount, quantity, name in items
+    ]
+
+
+def build_session_params(order, success_url, cancel_url):
+    """
+    Builds the parameters of the Stripe Checkout session for an order.
+
+    Args:
+        order (Order): The order being paid.
+        success_url (str): Absolute URL Stripe redirects to after payment.
+        cancel_url (str): Absolute URL Stripe redirects to on cancellation.
+
+    Returns:
+        dict: Keyword arguments for `stripe.checkout.Session.create`.
+    """
+    params = {
+        'mode': 'payment',
+        'client_reference_id': order.id,
+        'success_url': success_url,
+        'cancel_url': cancel_url,
+        'line_items': build_line_items(order),
+    }
+    if order.coupon_id:
+        # Reuse the Stripe coupon created the first time this coupon was used
+        params['discounts'] = [{'coupon': get_stripe_coupon_id(order.coupon, order.discount)}]
+    return params
+
+
+def create_checkout_session(order, success_url, cancel_url):
+    """
+    Creates the Stripe Checkout session for an order.
+
+    The call goes through the pooled HTTP client configured in
+    `payment.stripe_client`, with its timeouts and retry budget.
+
+    Returns:
+        stripe.checkout.Session: The created session.
+    """
+    params = build_session_params(order, success_url, cancel_url)
+    return stripe.checkout.Session.create(**params)
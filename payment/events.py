@@ -0,0 +1,102 @@
+import logging
+from django.db import transaction
+from django.utils import timezone
+from orders.models import Order
+from orders.outbox import queue_invoice
+from orders import stock
+from .models import StripeEvent
+
+# Application of recorded Stripe webhook events.
+# Every step is idempotent: events are marked processed in the same
+# transaction that applies them, orders are only updated while unpaid, and
+# outbox e-mails are deduplicated by key.
+
+logger = logging.getLogger(__name__)
+
+
+def mark_orders_paid(order_ids):
+    """
+    Marks orders as paid in bulk, skipping those already paid.
+
+    The unpaid orders are locked and flipped with a single UPDATE, so
+    only the first caller commits each order's stock reservations and
+    queues its invoice e-mail. Must run inside a transaction.
+
+    Args:
+        order_ids (Iterable[int]): IDs of the paid orders.
+
+    Returns:
+        list[int]: IDs of the orders this call marked as paid.
+    """
+    orders = list(
+        Order.objects
+        .select_for_update()
+        .filter(id__in=order_ids, paid=False)
+        .only('id', 'email', 'coupon_id', 'coupon_redeemed')
+    )
+    if not orders:
+        return []
+
+    Order.objects.filter(id__in=[order.id for order in orders]).update(paid=True, updated=timezone.now())
+    for order in orders:
+        # Make the stock held during checkout a permanent decrease
+        stock.commit(order)
+        # Queue the invoice email; it is sent by the outbox flusher
+        queue_invoice(order)
+    return [order.id for order in orders]
+
+
+def mark_order_paid(order_id):
+    """
+    Marks an order as paid if it is not already. See `mark_orders_paid`.
+
+    Returns:
+        bool: True if this call marked the order as paid.
+    """
+    return bool(mark_orders_paid([order_id]))
+
+
+def handle_checkout_session_completed(data):
+    """
+    Applies a 'checkout.session.completed' event payload.
+    """
+    session = data['object']
+    # Only process successful payments
+    if session.get('mode') != 'payment' or session.get('payment_status') != 'paid':
+        return
+    order_id = session.get('client_reference_id')
+    if not Order.objects.filter(id=order_id).exists():
+        logger.warning('Stripe session %s refers to unknown order %s', session.get('id'), order_id)
+        return
+    mark_order_paid(order_id)
+
+
+HANDLERS = {
+    'checkout.session.completed': handle_checkout_session_completed,
+}
+
+
+def apply_event(event_id):
+    """
+    Applies a recorded Stripe event once.
+
+    Args:
+        event_id (int): Primary key of the `StripeEvent`.
+
+    Returns:
+        bool: False if the event was already processed.
+    """
+    with transaction.atomic():
+        event = (
+            StripeEvent.objects
+            .select_for_update()
+            .filter(id=event_id, processed__isnull=True)
+            .first()
+        )
+        if event is None:
+            return False
+        handler = HANDLERS.get(event.type)
+        if handler:
+            handler(event.payload['data'])
+        StripeEvent.objects.filter(id=event.id).update(processed=timezone.now())
+    return True
@@ -0,0 +1,79 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+import stripe
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from shop.models import Category, Product
+from orders.models import Order, OrderItem
+from payment.checkout import build_session_params, create_checkout_session
+from payment.stripe_emulator import StripeEmulator
+
+
+class Command(BaseCommand):
+    """
+    Benchmarks Stripe Checkout session creation against the local emulator.
+
+    Creates a temporary order, then creates sessions for it from several
+    threads through the pooled Stripe client, reporting the number of
+    queries per session and latency percentiles:
+
+        python manage.py bench_checkout_session --items 50 --requests 500 --latency 0.02
+    """
+    help = 'Benchmark Stripe Checkout session creation against a local Stripe emulator.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=20, help='Number of items in the order.')
+        parser.add_argument('--requests', type=int, default=200, help='Number of sessions to create.')
+        parser.add_argument('--threads', type=int, default=8, help='Number of parallel clients.')
+        parser.add_argument('--latency', type=float, default=0.0, help='Simulated Stripe latency in seconds.')
+
+    def handle(self, *args, **options):
+        category = Category.objects.create(name='Benchmark', slug=f'benchmark-{time.time_ns()}')
+        products = Product.objects.bulk_create([
+            Product(category=category, name=f'Product {i}', slug=f'product-{i}', price=Decimal('19.99'))
+            for i in range(options['items'])
+        ])
+        order = Order.objects.create(
+            first_name='Bench', last_name='Mark', email='bench@example.com',
+            address='-', postal_code='00000', city='-'
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, price=product.price, quantity=2)
+            for product in products
+        ])
+
+        api_base = stripe.api_base
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                build_session_params(order, 'http://localhost/ok', 'http://localhost/cancel')
+            self.stdout.write(f'Session for {options["items"]} items built with {len(queries)} queries')
+
+            with StripeEmulator(latency=options['latency']) as emulator:
+                stripe.api_base = emulator.url
+
+                def create(_):
+                    start = time.perf_counter()
+                    create_checkout_session(order, 'http://localhost/ok', 'http://localhost/cancel')
+                    connection.close()
+                    return time.perf_counter() - start
+
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                    latencies = sorted(pool.map(create, range(options['requests'])))
+                elapsed = time.perf_counter() - start
+
+            def percentile(p):
+                return latencies[max(int(len(latencies) * p) - 1, 0)] * 1000
+
+            self.stdout.write(
+                f'{len(latencies)} sessions in {elapsed:.2f}s ({len(latencies) / elapsed:.0f}/s)\n'
+                f'Latency p50 {statistics.median(latencies) * 1000:.1f}ms, '
+                f'p95 {percentile(0.95):.1f}ms, p99 {percentile(0.99):.1f}ms'
+            )
+        finally:
+            stripe.api_base = api_base
+            order.delete()
+            category.delete()
@@ -0,0 +1,186 @@
+import os
+import queue
+import statistics
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from unittest import mock
+import stripe
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment
+)
+from django.urls import reverse
+from django.utils import translation
+from shop.models import Category, Product
+from payment.events import apply_event
+from payment.stripe_emulator import StripeEmulator
+from payment.tasks import process_stripe_event
+
+STAGES = ['cart_add', 'order_create', 'payment_process', 'webhook', 'worker']
+
+
+class Command(BaseCommand):
+    """
+    End-to-end checkout load test against the local Stripe emulator.
+
+    Every simulated customer adds a product to the cart, places the order,
+    starts the Stripe Checkout session, pays on the emulator and has the
+    signed webhook delivered; recorded events are then applied by worker
+    threads. Requests go through the Django test client, so no server or
+    Celery worker is needed. The run uses a throwaway test database.
+
+    Reports throughput, latency percentiles and query counts per stage:
+
+        python manage.py loadtest_checkout --customers 2000 --concurrency 16 --latency 0.05
+    """
+    help = 'Load-test the checkout flow end to end against a local Stripe emulator.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=500, help='Number of checkouts.')
+        parser.add_argument('--concurrency', type=int, default=8, help='Number of parallel customers.')
+        parser.add_argument('--products', type=int, default=50, help='Number of products to choose from.')
+        parser.add_argument('--stock', type=int, default=None, help='Stock per product (default: untracked).')
+        parser.add_argument('--latency', type=float, default=0.0, help='Simulated Stripe latency in seconds.')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        if connection.vendor == 'sqlite':
+            # A file database lets the customer threads share it
+            test_settings = connection.settings_dict.setdefault('TEST', {})
+            test_settings['NAME'] = os.path.join(tempfile.mkdtemp(), 'loadtest.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def run(self, options):
+        with translation.override('en'):
+            category = Category.objects.create(name='Load test', slug='load-test')
+        products = Product.objects.bulk_create([
+            Product(category=category, name=f'Product {i}', slug=f'product-{i}',
+                    price=Decimal('9.99'), stock=options['stock'])
+            for i in range(options['products'])
+        ])
+
+        self.latencies = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.first_error = {}
+        events = queue.Queue()
+
+        with StripeEmulator(latency=options['latency']) as emulator, \
+                override_settings(STRIPE_WEBHOOK_SECRET=emulator.webhook_secret), \
+                mock.patch.multiple(stripe, api_base=emulator.url, api_key='sk_test_emulator'), \
+                mock.patch.object(process_stripe_event, 'delay', side_effect=events.put):
+
+            def customer(i):
+                try:
+                    with translation.override('en'):
+                        self.checkout(Client(), emulator, products[i % len(products)])
+                finally:
+                    connection.close()
+
+            def worker(event_id):
+                try:
+                    self.stage('worker', lambda: apply_event(event_id))
+                finally:
+                    connection.close()
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+                list(pool.map(customer, range(options['customers'])))
+            checkout_time = time.perf_counter() - start
+
+            # SQLite cannot upgrade concurrent read locks taken by
+            # select_for_update(), so events are applied by a single worker there
+            workers = 1 if connection.vendor == 'sqlite' else options['concurrency']
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(worker, list(events.queue)))
+            worker_time = time.perf_counter() - start
+
+        self.report(options['customers'], checkout_time, worker_time, emulator.requests)
+
+    def stage(self, name, call, expected_status=None):
+        """
+        Runs one stage call, recording its latency, query count and errors.
+
+        Returns:
+            The call's result, or None if it failed.
+        """
+        start = time.perf_counter()
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                result = call()
+        except Exception as e:
+            self.errors[name] += 1
+            self.first_error.setdefault(name, repr(e))
+            return None
+        self.latencies[name].append(time.perf_counter() - start)
+        self.queries[name].append(len(queries))
+        if expected_status and result.status_code != expected_status:
+            self.errors[name] += 1
+            self.first_error.setdefault(name, f'HTTP {result.status_code}')
+            return None
+        return result
+
+    def checkout(self, client, emulator, product):
+        """
+        Walks one customer through the checkout flow.
+        """
+        if not self.stage('cart_add', lambda: client.post(
+                reverse('cart:cart_add', args=[product.id]), {'quantity': 1}), 302):
+            return
+        if not self.stage('order_create', lambda: client.post(reverse('orders:order_create'), {
+                'first_name': 'Load',
+                'last_name': 'Test',
+                'email': 'load@example.com',
+                'address': 'Main street 1',
+                'postal_code': '12345',
+                'city': 'Baku',
+                'idempotency_key': str(uuid.uuid4()),
+        }), 302):
+            return
+        response = self.stage('payment_process', lambda: client.post(reverse('payment:process')), 302)
+        if not response:
+            return
+        payload, signature = emulator.complete_session(response['Location'].rsplit('/', 1)[-1])
+        self.stage('webhook', lambda: client.post(
+            reverse('payment:stripe-webhook'), payload,
+            content_type='application/json', HTTP_STRIPE_SIGNATURE=signature
+        ), 200)
+
+    def report(self, customers, checkout_time, worker_time, stripe_requests):
+        """
+        Prints throughput, latency percentiles and query counts per stage.
+        """
+        def ms(values, p):
+            return values[max(int(len(values) * p) - 1, 0)] * 1000 if values else 0
+
+        self.stdout.write(
+            f'{customers} checkouts in {checkout_time:.2f}s ({customers / checkout_time:.1f}/s), '
+            f'events applied in {worker_time:.2f}s, {stripe_requests} Stripe API calls'
+        )
+        self.stdout.write(
+            f'{"stage":<16}{"ok":>7}{"errors":>8}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}'
+            f'{"max ms":>9}{"queries":>9}{"max q":>7}'
+        )
+        for name in STAGES:
+            latencies = sorted(self.latencies[name])
+            queries = self.queries[name]
+            self.stdout.write(
+                f'{name:<16}{len(latencies):>7}{self.errors[name]:>8}'
+                f'{ms(latencies, 0.5):>9.1f}{ms(latencies, 0.95):>9.1f}{ms(latencies, 0.99):>9.1f}'
+                f'{ms(latencies, 1):>9.1f}'
+                f'{statistics.mean(queries) if queries else 0:>9.1f}{max(queries, default=0):>7}'
+            )
+        for name, error in self.first_error.items():
+            self.stdout.write(f'First {name} error: {error}')
@@ -0,0 +1,30 @@
+import time
+from django.core.management.base import BaseCommand
+from payment.reconcile import reconcile_payments
+
+
+class Command(BaseCommand):
+    """
+    Marks orders as paid whose Stripe Checkout session was paid but whose
+    webhook was missed, outside of Celery beat:
+
+        python manage.py reconcile_payments --days 7 --workers 16
+    """
+    help = 'Reconcile unpaid orders with their Stripe Checkout sessions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='How many days of orders to check.')
+        parser.add_argument('--batch-size', type=int, help='Checkout sessions per batch.')
+        parser.add_argument('--workers', type=int, help='Concurrent Stripe requests.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        checked, paid = reconcile_payments(
+            days=options['days'],
+            batch_size=options['batch_size'],
+            max_workers=options['workers']
+        )
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'Checked {checked} sessions in {elapsed:.2f}s ({checked / elapsed:.0f}/s), marked {paid} as paid.'
+        )
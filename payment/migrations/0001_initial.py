@@ -0,0 +1,30 @@
+# Generated by Django 4.2.3 on 2026-10-19 08:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('coupons', '0002_alter_coupon_help_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StripeCoupon',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('percent_off', models.IntegerField(help_text='Discount percentage of the Stripe coupon.')),
+                ('stripe_id', models.CharField(help_text='ID of the coupon in Stripe.', max_length=255)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('coupon', models.ForeignKey(help_text='Local coupon this Stripe coupon was created for.', on_delete=django.db.models.deletion.CASCADE, related_name='stripe_coupons', to='coupons.coupon')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='stripecoupon',
+            constraint=models.UniqueConstraint(fields=('coupon', 'percent_off'), name='payment_stripecoupon_coupon_percent_uniq'),
+        ),
+    ]
@@ -1,3 +1,84 @@
 from django.db import models
+from coupons.models import Coupon
 
-# Create your models here.
+
+class StripeCoupon(models.Model):
+    """
+    Maps a local coupon and discount percentage to the Stripe coupon
+    created for it.
+
+    Stripe coupons are created once per (coupon, percentage) and reused for
+    every checkout, instead of creating a new Stripe coupon per payment.
+    The percentage is part of the key because orders keep the discount they
+    were placed with, even if the coupon is changed later.
+    """
+    coupon = models.ForeignKey(
+        Coupon,
+        related_name='stripe_coupons',
+        on_delete=models.CASCADE,
+        help_text="Local coupon this Stripe coupon was created for."
+    )
+    percent_off = models.IntegerField(help_text="Discount percentage of the Stripe coupon.")
+    stripe_id = models.CharField(max_length=255, help_text="ID of the coupon in Stripe.")
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['coupon', 'percent_off'], name='payment_stripecoupon_coupon_percent_uniq')
+        ]
+
+    def __str__(self):
+        """
+        Returns the Stripe coupon ID.
+        """
+        return self.stripe_id
+
+
+class StripeEvent(models.Model):
+    """
+    A verified Stripe webhook event waiting to be, or already, applied.
+
+    The webhook endpoint only verifies and records events; the unique
+    `event_id` rejects Stripe redeliveries. Events are applied by the
+    `process_stripe_event` Celery task, and `processed` is set in the same
+    transaction, so each event takes effect once.
+    """
+    event_id = models.CharField(max_length=255, unique=True, help_text="Stripe event ID (evt_...).")
+    type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    received = models.DateTimeField(auto_now_add=True)
+    processed = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['processed', 'received'])
+        ]
+
+    def __str__(self):
+        """
+        Returns the Stripe event ID.
+        """
+        return self.event_id
+
+
+class CheckoutSession(models.Model):
+    """
+    A Stripe Checkout session created for an order.
+
+    Every session is kept, not only the latest: a customer who opens
+    checkout twice may pay in either session, and reconciliation has to
+    find the paid one.
+    """
+    order = models.ForeignKey(
+        'orders.Order',
+        related_name='checkout_sessions',
+        on_delete=models.CASCADE
+    )
+    session_id = models.CharField(max_length=255, unique=True, help_text="Stripe Checkout session ID (cs_...).")
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        """
+        Returns the Stripe session ID.
+        """
+        return self.session_id
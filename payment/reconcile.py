@@ -0,0 +1,117 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import stripe
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .events import mark_orders_paid
+from .models import CheckoutSession
+
+# Reconciliation of payments whose webhook never arrived.
+# The Checkout sessions of unpaid recent orders are walked in primary key
+# order, one batch at a time; each batch's sessions are fetched from Stripe
+# concurrently and the paid orders are marked in one transaction.
+
+logger = logging.getLogger(__name__)
+
+
+def _retrieve_session(session_id):
+    """
+    Fetches a Checkout session, returning None if the request fails.
+    """
+    try:
+        return stripe.checkout.Session.retrieve(session_id)
+    except stripe.error.StripeError as exc:
+        logger.warning('Could not retrieve Stripe session %s: %s', session_id, exc)
+        return None
+
+
+def fetch_sessions(session_ids, max_workers):
+    """
+    Fetches Checkout sessions from Stripe in parallel.
+
+    The threads share the pooled HTTP client configured in
+    `payment.stripe_client`, so `max_workers` should not exceed
+    `STRIPE_HTTP_POOL_SIZE`.
+
+    Args:
+        session_ids (list[str]): Session IDs to fetch.
+        max_workers (int): Maximum number of concurrent requests.
+
+    Returns:
+        list: Sessions in the order of `session_ids`; None where the
+        request failed.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(_retrieve_session, session_ids))
+
+
+def is_paid(session, order_id):
+    """
+    Returns True if `session` is a paid Checkout session for the order.
+    """
+    return (
+        session is not None
+        and session.get('mode') == 'payment'
+        and session.get('payment_status') == 'paid'
+        and session.get('client_reference_id') == str(order_id)
+    )
+
+
+def reconcile_payments(days=None, batch_size=None, max_workers=None):
+    """
+    Marks orders as paid whose Stripe Checkout session was paid but whose
+    webhook was never processed.
+
+    Every Checkout session of unpaid orders created in the last `days` days
+    is checked, not only the latest one, since a customer may pay in a
+    session opened earlier. Sessions are read with keyset pagination on
+    their primary key, so every batch is an index range scan however many
+    there are. The sessions of a batch are fetched concurrently, and its
+    paid orders are marked with `events.mark_orders_paid`, which is safe
+    against a webhook arriving at the same time.
+
+    Args:
+        days (int, optional): How far back to look. Defaults to
+            `STRIPE_RECONCILE_DAYS`.
+        batch_size (int, optional): Sessions per batch. Defaults to
+            `STRIPE_RECONCILE_BATCH_SIZE`.
+        max_workers (int, optional): Concurrent Stripe requests. Defaults
+            to `STRIPE_RECONCILE_WORKERS`.
+
+    Returns:
+        tuple[int, int]: Number of sessions checked and number of orders
+        marked as paid.
+    """
+    days = days or settings.STRIPE_RECONCILE_DAYS
+    batch_size = batch_size or settings.STRIPE_RECONCILE_BATCH_SIZE
+    max_workers = max_workers or settings.STRIPE_RECONCILE_WORKERS
+
+    pending = (
+        CheckoutSession.objects
+        .filter(order__paid=False, order__created__gte=timezone.now() - timedelta(days=days))
+        .order_by('id')
+        .values_list('id', 'order_id', 'session_id')
+    )
+    checked = paid = 0
+    last_id = 0
+    while True:
+        batch = list(pending.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1][0]
+        checked += len(batch)
+
+        sessions = fetch_sessions([session_id for _, _, session_id in batch], max_workers)
+        paid_ids = {
+            order_id for (_, order_id, _), session in zip(batch, sessions)
+            if is_paid(session, order_id)
+        }
+        if paid_ids:
+            with transaction.atomic():
+                marked = mark_orders_paid(paid_ids)
+            paid += len(marked)
+            if marked:
+                logger.info('Reconciled %d paid orders: %s', len(marked), marked)
+    return checked, paid
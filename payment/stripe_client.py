@@ -0,0 +1,46 @@
+import requests
+import stripe
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+# Stripe API client configuration.
+# All Stripe calls share one pooled keep-alive HTTP session with strict
+# timeouts and a bounded retry budget, instead of the library defaults
+# (80 second timeout, no retries).
+
+
+def build_http_client():
+    """
+    Builds the HTTP client used for all Stripe API calls.
+
+    The requests session keeps up to `STRIPE_HTTP_POOL_SIZE` connections
+    alive, so checkouts reuse TLS connections instead of opening one per call.
+
+    Returns:
+        stripe.http_client.RequestsClient: The pooled client.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=settings.STRIPE_HTTP_POOL_SIZE,
+        max_retries=0  # retries are handled by the Stripe library
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return stripe.http_client.RequestsClient(
+        timeout=(settings.STRIPE_CONNECT_TIMEOUT, settings.STRIPE_READ_TIMEOUT),
+        session=session
+    )
+
+
+def configure_stripe():
+    """
+    Applies the Stripe settings to the Stripe library.
+
+    Called once when the payment app is ready.
+    """
+    stripe.api_key = settings.STRIPE_SECRET_KEY
+    stripe.api_version = settings.STRIPE_API_VERSION
+    stripe.api_base = settings.STRIPE_API_BASE
+    stripe.max_network_retries = settings.STRIPE_MAX_NETWORK_RETRIES
+    stripe.default_http_client = build_http_client()
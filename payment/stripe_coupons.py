@@ -0,0 +1,73 @@
+import stripe
+from django.core.cache import cache
+from .models import StripeCoupon
+
+# Persistent mapping from local coupons to Stripe coupons.
+# Lookups go cache -> database -> Stripe, so the Stripe API is only called the
+# first time a coupon is used with a given percentage.
+
+CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def _cache_key(coupon_id, percent_off):
+    """
+    Returns the cache key of the Stripe coupon ID for a coupon and percentage.
+    """
+    return f'payment:stripe_coupon:{coupon_id}:{percent_off}'
+
+
+def get_stripe_coupon_id(coupon, percent_off):
+    """
+    Returns the ID of the Stripe coupon for a local coupon and percentage,
+    creating it in Stripe on first use.
+
+    The Stripe coupon gets a deterministic ID and idempotency key, so
+    concurrent first uses (or a lost database write) never create duplicates
+    in Stripe.
+
+    Args:
+        coupon (Coupon): The local coupon applied to the order.
+        percent_off (int): Discount percentage stored on the order.
+
+    Returns:
+        str: The Stripe coupon ID.
+    """
+    key = _cache_key(coupon.id, percent_off)
+    stripe_id = cache.get(key)
+    if stripe_id:
+        return stripe_id
+
+    stripe_id = (
+        StripeCoupon.objects
+        .filter(coupon=coupon, percent_off=percent_off)
+        .values_list('stripe_id', flat=True)
+        .first()
+    )
+    if not stripe_id:
+        stripe_id = _create_stripe_coupon(coupon, percent_off)
+        StripeCoupon.objects.bulk_create(
+            [StripeCoupon(coupon=coupon, percent_off=percent_off, stripe_id=stripe_id)],
+            ignore_conflicts=True
+        )
+
+    cache.set(key, stripe_id, CACHE_TIMEOUT)
+    return stripe_id
+
+
+def _create_stripe_coupon(coupon, percent_off):
+    """
+    Creates the Stripe coupon, or adopts it if it already exists in Stripe.
+    """
+    stripe_id = f'myshop-{coupon.id}-{percent_off}'
+    try:
+        stripe.Coupon.create(
+            id=stripe_id,
+            name=coupon.code,
+            percent_off=percent_off,
+            duration='once',
+            idempotency_key=stripe_id
+        )
+    except stripe.error.InvalidRequestError as e:
+        if e.code != 'resource_already_exists':
+            raise
+    return stripe_id
@@ -0,0 +1,238 @@
+import hashlib
+import hmac
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+# Local Stripe API stand-in for tests and benchmarks.
+# Point `stripe.api_base` (STRIPE_API_BASE) at `StripeEmulator.url` to run
+# checkouts without reaching the real Stripe API.
+
+
+def _unflatten(pairs):
+    """
+    Turns Stripe's form encoding (`line_items[0][quantity]=1`) into nested
+    dicts; list indexes become dict keys.
+    """
+    data = {}
+    for key, value in pairs:
+        parts = key.replace(']', '').split('[')
+        node = data
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = value
+    return data
+
+
+def _not_found(kind, object_id):
+    return {'error': {
+        'type': 'invalid_request_error',
+        'code': 'resource_missing',
+        'message': f'No such {kind}: {object_id}',
+    }}
+
+
+class StripeEmulator:
+    """
+    In-process HTTP server answering a subset of the Stripe API.
+
+    Supported endpoints:
+        POST /v1/checkout/sessions        Create a Checkout session.
+        GET  /v1/checkout/sessions/<id>   Retrieve a Checkout session.
+        POST /v1/coupons                  Create a coupon.
+        GET  /v1/coupons/<id>             Retrieve a coupon.
+
+    Customers "pay" with `complete_session`, which returns the signed
+    'checkout.session.completed' webhook Stripe would deliver.
+
+    Args:
+        latency (float): Seconds added to every response, to imitate the
+            network round trip to Stripe.
+        webhook_secret (str): Secret used to sign webhook payloads.
+    """
+
+    def __init__(self, latency=0, webhook_secret='whsec_emulator'):
+        self.latency = latency
+        self.webhook_secret = webhook_secret
+        self.sessions = {}
+        self.coupons = {}
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        """
+        Base URL of the emulator, to be used as `stripe.api_base`.
+        """
+        host, port = self._server.server_address
+        return f'http://{host}:{port}'
+
+    def start(self):
+        """
+        Starts serving requests in a background thread.
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops the server and closes its socket.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def create_session(self, params):
+        """
+        Creates an open, unpaid Checkout session.
+        """
+        session_id = f'cs_test_{uuid.uuid4().hex}'
+        session = {
+            'id': session_id,
+            'object': 'checkout.session',
+            'mode': params.get('mode', 'payment'),
+            'client_reference_id': params.get('client_reference_id'),
+            'payment_status': 'unpaid',
+            'status': 'open',
+            'url': f'{self.url}/pay/{session_id}',
+            'line_items': params.get('line_items', {}),
+            'discounts': params.get('discounts', {}),
+        }
+        with self._lock:
+            self.sessions[session_id] = session
+        return 200, session
+
+    def create_coupon(self, params):
+        """
+        Creates a coupon; fails like Stripe if the ID is already taken.
+        """
+        coupon_id = params.get('id') or uuid.uuid4().hex[:8]
+        with self._lock:
+            if coupon_id in self.coupons:
+                return 400, {'error': {
+                    'type': 'invalid_request_error',
+                    'code': 'resource_already_exists',
+                    'message': 'Coupon already exists.',
+                    'param': 'id',
+                }}
+            self.coupons[coupon_id] = dict(params, id=coupon_id, object='coupon')
+        return 200, self.coupons[coupon_id]
+
+    def retrieve_session(self, session_id):
+        """
+        Returns a Checkout session by ID.
+        """
+        session = self.sessions.get(session_id)
+        if session is None:
+            return 404, _not_found('checkout.session', session_id)
+        return 200, session
+
+    def retrieve_coupon(self, coupon_id):
+        """
+        Returns a coupon by ID.
+        """
+        coupon = self.coupons.get(coupon_id)
+        if coupon is None:
+            return 404, _not_found('coupon', coupon_id)
+        return 200, coupon
+
+    def complete_session(self, session_id):
+        """
+        Marks a Checkout session as paid, as if the customer had paid.
+
+        Returns:
+            tuple[str, str]: The 'checkout.session.completed' webhook payload
+            and its `Stripe-Signature` header value.
+        """
+        with self._lock:
+            session = self.sessions[session_id]
+            session.update(payment_status='paid', status='complete')
+        return self.sign_event({
+            'id': f'evt_test_{uuid.uuid4().hex}',
+            'object': 'event',
+            'type': 'checkout.session.completed',
+            'created': int(time.time()),
+            'data': {'object': dict(session)},
+        })
+
+    def sign_event(self, event):
+        """
+        Serializes an event and signs it like Stripe does.
+
+        Returns:
+            tuple[str, str]: Payload and `Stripe-Signature` header value.
+        """
+        payload = json.dumps(event)
+        timestamp = int(time.time())
+        signature = hmac.new(
+            self.webhook_secret.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256
+        ).hexdigest()
+        return payload, f't={timestamp},v1={signature}'
+
+    def _route(self, method, path):
+        """
+        Returns the handler for a request and its argument, or (None, None).
+        """
+        collections = {
+            '/v1/checkout/sessions': (self.create_session, self.retrieve_session),
+            '/v1/coupons': (self.create_coupon, self.retrieve_coupon),
+        }
+        base, _, object_id = path.rpartition('/')
+        if method == 'POST' and path in collections:
+            return collections[path][0], None
+        if method == 'GET' and base in collections:
+            return collections[base][1], object_id
+        return None, None
+
+    def _handler(self):
+        emulator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+            def _respond(self, method):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length).decode() if length else ''
+                path, _, query = self.path.partition('?')
+                params = _unflatten(parse_qsl(body or query, keep_blank_values=True))
+                with emulator._lock:
+                    emulator.requests += 1
+                if emulator.latency:
+                    time.sleep(emulator.latency)
+
+                handler, object_id = emulator._route(method, path)
+                if handler:
+                    status, payload = handler(object_id if object_id else params)
+                else:
+                    status, payload = 404, {'error': {
+                        'type': 'invalid_request_error', 'message': f'Unknown route {method} {path}'
+                    }}
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._respond('GET')
+
+            def do_POST(self):
+                self._respond('POST')
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
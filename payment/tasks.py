@@ -1,47 +1,52 @@
-from io import BytesIO
+from datetime import timedelta
 from celery import shared_task
-import weasyprint
-from django.template.loader import render_to_string
-from django.core.mail import EmailMessage
-from django.conf import settings
-from orders.models import Order
+from django.utils import timezone
+from .events import apply_event
+from . import reconcile
+from .models import StripeEvent
 
 @shared_task
-def payment_completed(order_id):
+def process_stripe_event(event_id):
     """
-    Celery task to send an invoice email once payment is completed.
-    
-    This task:
-    1. Retrieves the order by its ID.
-    2. Generates a PDF invoice using WeasyPrint.
-    3. Sends the invoice as an email attachment to the customer.
+    Celery task that applies a Stripe webhook event recorded by the endpoint.
 
     Args:
-        order_id (int): The ID of the completed order.
+        event_id (int): Primary key of the `StripeEvent`.
+
+    Returns:
+        bool: False if the event had already been processed.
     """
-    # Retrieve the order from the database
-    order = Order.objects.get(id=order_id)
-
-    # Email details
-    subject = f'My Shop - Invoice no. {order.id}'
-    message = 'Please find attached the invoice for your recent purchase.'
-    email = EmailMessage(
-        subject,
-        message,
-        'admin@myshop.com',
-        [order.email]  # corrected from order_id.email
-    )
+    return apply_event(event_id)
 
-    # Render the HTML invoice template
-    html = render_to_string('orders/order/pdf.html', {'order': order})
 
-    # Generate PDF from rendered HTML
-    out = BytesIO()
-    stylesheets = [weasyprint.CSS(settings.STATIC_ROOT / 'css/pdf.css')]
-    weasyprint.HTML(string=html).write_pdf(out, stylesheets=stylesheets)
+@shared_task
+def process_pending_stripe_events():
+    """
+    Periodic Celery task that applies recorded events which were never
+    processed, e.g. because the broker was unavailable when the webhook
+    arrived.
 
-    # Attach the generated PDF to the email
-    email.attach(f'order_{order.id}.pdf', out.getvalue(), 'application/pdf')
+    Returns:
+        int: Number of events applied.
+    """
+    cutoff = timezone.now() - timedelta(minutes=1)
+    pending = (
+        StripeEvent.objects
+        .filter(processed__isnull=True, received__lt=cutoff)
+        .order_by('received')
+        .values_list('id', flat=True)
+    )
+    return sum(apply_event(event_id) for event_id in pending[:500])
 
-    # Send the email with the attached invoice
-    email.send()
+
+@shared_task
+def reconcile_payments():
+    """
+    Periodic Celery task that marks orders as paid whose Checkout session
+    was paid but whose webhook never arrived.
+
+    Returns:
+        tuple[int, int]: Number of sessions checked and number of orders
+        marked as paid.
+    """
+    return reconcile.reconcile_payments()
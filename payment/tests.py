@@ -1,3 +1,311 @@
-from django.test import TestCase
+import json
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+import stripe
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone, translation
+from coupons.models import Coupon
+from orders.models import Order, EmailOutbox
+from shop.models import Category, Product
+from .events import apply_event
+from .reconcile import reconcile_payments
+from .models import CheckoutSession, StripeCoupon, StripeEvent
+from .tasks import process_pending_stripe_events
+from .checkout import build_line_items
+from .stripe_coupons import get_stripe_coupon_id
+from .stripe_emulator import StripeEmulator
 
-# Create your tests here.
+
+class FakeStripeCoupons:
+    """
+    Local stand-in for `stripe.Coupon` that records created coupons.
+    """
+
+    def __init__(self):
+        self.created = {}
+
+    def create(self, id, idempotency_key=None, **params):
+        if id in self.created:
+            raise stripe.error.InvalidRequestError(
+                f'Coupon already exists: {id}', 'id', code='resource_already_exists'
+            )
+        self.created[id] = params
+        return stripe.Coupon.construct_from({'id': id, **params}, 'sk_test')
+
+
+class StripeCouponMappingTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.stripe = FakeStripeCoupons()
+        self.enterContext(mock.patch('stripe.Coupon.create', side_effect=self.stripe.create))
+        now = timezone.now()
+        self.coupon = Coupon.objects.create(
+            code='SUMMER', valid_from=now, valid_to=now + timedelta(days=1), discount=10
+        )
+
+    def test_coupon_created_once_and_reused(self):
+        first = get_stripe_coupon_id(self.coupon, 10)
+        cache.clear()
+        with self.assertNumQueries(1):
+            second = get_stripe_coupon_id(self.coupon, 10)
+        with self.assertNumQueries(0):
+            third = get_stripe_coupon_id(self.coupon, 10)
+
+        self.assertEqual(first, second)
+        self.assertEqual(first, third)
+        self.assertEqual(len(self.stripe.created), 1)
+        self.assertEqual(self.stripe.created[first]['name'], 'SUMMER')
+
+    def test_each_percentage_gets_its_own_coupon(self):
+        self.assertNotEqual(get_stripe_coupon_id(self.coupon, 10), get_stripe_coupon_id(self.coupon, 20))
+        self.assertEqual(StripeCoupon.objects.count(), 2)
+
+    def test_existing_stripe_coupon_is_adopted(self):
+        stripe_id = get_stripe_coupon_id(self.coupon, 10)
+        StripeCoupon.objects.all().delete()
+        cache.clear()
+
+        self.assertEqual(get_stripe_coupon_id(self.coupon, 10), stripe_id)
+        self.assertEqual(StripeCoupon.objects.get().stripe_id, stripe_id)
+
+    def test_payment_process_reuses_stripe_coupon(self):
+        with translation.override('en'):
+            category = Category.objects.create(name='Tea', slug='tea')
+        product = Product.objects.create(category=category, name='Tea', slug='tea', price=Decimal('2.00'))
+        sessions = [
+            stripe.checkout.Session.construct_from({'id': f'cs_{i}', 'url': f'https://stripe.test/cs_{i}'}, 'sk_test')
+            for i in range(3)
+        ]
+
+        with translation.override('en'), \
+                mock.patch('stripe.checkout.Session.create', side_effect=sessions) as create_session:
+            for session in sessions:
+                order = Order.objects.create(
+                    first_name='A', last_name='B', email='a@example.com', address='-',
+                    postal_code='12345', city='-', coupon=self.coupon, discount=10
+                )
+                order.items.create(product=product, price=product.price, quantity=1)
+                session_store = self.client.session
+                session_store['order-id'] = order.id
+                session_store.save()
+                response = self.client.post(reverse('payment:process'))
+                self.assertRedirects(response, session.url, fetch_redirect_response=False)
+
+        self.assertEqual(len(self.stripe.created), 1)
+        discounts = {str(c.kwargs['discounts']) for c in create_session.call_args_list}
+        self.assertEqual(len(discounts), 1)
+
+
+class CheckoutSessionTests(TestCase):
+
+    def setUp(self):
+        with translation.override('en'):
+            self.category = Category.objects.create(name='Tea', slug='tea')
+        self.order = Order.objects.create(
+            first_name='A', last_name='B', email='a@example.com', address='-', postal_code='12345', city='-'
+        )
+        for i, price in enumerate(['19.99', '0.29', '1.10']):
+            product = Product.objects.create(
+                category=self.category, name=f'Tea {i}', slug=f'tea-{i}', price=Decimal(price)
+            )
+            self.order.items.create(product=product, price=product.price, quantity=i + 1)
+
+    def test_line_items_built_in_one_query(self):
+        with self.assertNumQueries(1):
+            line_items = build_line_items(self.order)
+
+        self.assertEqual(
+            [(i['price_data']['unit_amount'], i['quantity'], i['price_data']['product_data']['name'])
+             for i in line_items],
+            [(1999, 1, 'Tea 0'), (29, 2, 'Tea 1'), (110, 3, 'Tea 2')]
+        )
+
+    def test_payment_process_creates_session_on_emulator(self):
+        session_store = self.client.session
+        session_store['order-id'] = self.order.id
+        session_store.save()
+
+        with StripeEmulator() as emulator, translation.override('en'), \
+                mock.patch.multiple(stripe, api_base=emulator.url, api_key='sk_test_emulator'):
+            response = self.client.post(reverse('payment:process'))
+
+        session = next(iter(emulator.sessions.values()))
+        self.assertRedirects(response, session['url'], fetch_redirect_response=False)
+        self.assertEqual(session['client_reference_id'], str(self.order.id))
+        self.assertEqual(len(session['line_items']), 3)
+        self.assertEqual(self.order.checkout_sessions.get().session_id, session['id'])
+
+    def test_paid_emulator_session_is_retrieved_and_signed(self):
+        with StripeEmulator() as emulator, translation.override('en'), \
+                override_settings(STRIPE_WEBHOOK_SECRET=emulator.webhook_secret), \
+                mock.patch.multiple(stripe, api_base=emulator.url, api_key='sk_test_emulator'), \
+                mock.patch('payment.tasks.process_stripe_event.delay') as delay:
+            _, session = emulator.create_session({'client_reference_id': str(self.order.id)})
+            payload, signature = emulator.complete_session(session['id'])
+
+            self.assertEqual(stripe.checkout.Session.retrieve(session['id']).payment_status, 'paid')
+            with self.assertRaises(stripe.error.InvalidRequestError):
+                stripe.checkout.Session.retrieve('cs_missing')
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    reverse('payment:stripe-webhook'), payload,
+                    content_type='application/json', HTTP_STRIPE_SIGNATURE=signature
+                )
+
+        self.assertEqual(response.status_code, 200)
+        delay.assert_called_once_with(StripeEvent.objects.get().id)
+
+
+def signed_event(event, secret='whsec_test'):
+    """
+    Returns a Stripe webhook payload and a valid signature header for it.
+    """
+    payload = json.dumps(event)
+    timestamp = int(time.time())
+    signature = stripe.WebhookSignature._compute_signature(f'{timestamp}.{payload}', secret)
+    return payload, f't={timestamp},v1={signature}'
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET='whsec_test')
+class StripeWebhookTests(TestCase):
+
+    def setUp(self):
+        self.enterContext(translation.override('en'))
+        self.delay = self.enterContext(mock.patch('payment.tasks.process_stripe_event.delay'))
+        self.order = Order.objects.create(
+            first_name='A', last_name='B', email='a@example.com', address='-', postal_code='12345', city='-'
+        )
+
+    def deliver(self, event_id='evt_1', order_id=None):
+        payload, signature = signed_event({
+            'id': event_id,
+            'object': 'event',
+            'type': 'checkout.session.completed',
+            'data': {'object': {
+                'id': 'cs_1',
+                'object': 'checkout.session',
+                'mode': 'payment',
+                'payment_status': 'paid',
+                'client_reference_id': str(order_id or self.order.id),
+            }},
+        })
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                reverse('payment:stripe-webhook'), payload,
+                content_type='application/json', HTTP_STRIPE_SIGNATURE=signature
+            )
+
+    def test_webhook_records_and_enqueues_without_touching_order(self):
+        response = self.deliver()
+
+        self.assertEqual(response.status_code, 200)
+        event = StripeEvent.objects.get()
+        self.delay.assert_called_once_with(event.id)
+        self.order.refresh_from_db()
+        self.assertFalse(self.order.paid)
+
+    def test_redelivery_is_ignored(self):
+        self.deliver()
+        self.deliver()
+        self.assertEqual(StripeEvent.objects.count(), 1)
+        self.assertEqual(self.delay.call_count, 1)
+
+    def test_invalid_signature_is_rejected(self):
+        response = self.client.post(
+            reverse('payment:stripe-webhook'), '{}',
+            content_type='application/json', HTTP_STRIPE_SIGNATURE='t=1,v1=bad'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_broker_failure_still_acknowledges(self):
+        self.delay.side_effect = ConnectionError('broker down')
+        self.assertEqual(self.deliver().status_code, 200)
+        self.assertTrue(StripeEvent.objects.filter(processed__isnull=True).exists())
+
+    def test_event_applied_once(self):
+        self.deliver()
+        event = StripeEvent.objects.get()
+
+        self.assertTrue(apply_event(event.id))
+        self.assertFalse(apply_event(event.id))
+
+        self.order.refresh_from_db()
+        self.assertTrue(self.order.paid)
+        self.assertEqual(EmailOutbox.objects.filter(order=self.order, kind=EmailOutbox.KIND_INVOICE).count(), 1)
+
+    def test_separate_events_for_same_order_send_one_invoice(self):
+        self.deliver('evt_1')
+        self.deliver('evt_2')
+        for event in StripeEvent.objects.all():
+            apply_event(event.id)
+        self.assertEqual(EmailOutbox.objects.filter(order=self.order).count(), 1)
+
+    def test_sweeper_applies_stale_events(self):
+        self.deliver()
+        StripeEvent.objects.update(received=timezone.now() - timedelta(minutes=5))
+
+        self.assertEqual(process_pending_stripe_events(), 1)
+        self.order.refresh_from_db()
+        self.assertTrue(self.order.paid)
+
+
+class ReconcilePaymentsTests(TestCase):
+
+    def setUp(self):
+        self.emulator = self.enterContext(StripeEmulator())
+        self.enterContext(mock.patch.multiple(stripe, api_base=self.emulator.url, api_key='sk_test_emulator'))
+
+    def create_order(self, paid_on_stripe=False, **kwargs):
+        order = Order.objects.create(
+            first_name='A', last_name='B', email='a@example.com', address='-', postal_code='12345', city='-',
+            **kwargs
+        )
+        self.create_session(order, paid_on_stripe)
+        return order
+
+    def create_session(self, order, paid_on_stripe=False):
+        _, session = self.emulator.create_session({'mode': 'payment', 'client_reference_id': str(order.id)})
+        if paid_on_stripe:
+            self.emulator.complete_session(session['id'])
+        CheckoutSession.objects.create(order=order, session_id=session['id'])
+
+    def test_paid_sessions_are_marked_in_batches(self):
+        paid = [self.create_order(paid_on_stripe=True) for _ in range(3)]
+        unpaid = [self.create_order() for _ in range(2)]
+        old = self.create_order(paid_on_stripe=True)
+        Order.objects.filter(id=old.id).update(created=timezone.now() - timedelta(days=30))
+
+        self.assertEqual(reconcile_payments(days=2, batch_size=2, max_workers=4), (5, 3))
+
+        self.assertEqual(
+            set(Order.objects.filter(paid=True).values_list('id', flat=True)),
+            {order.id for order in paid}
+        )
+        self.assertEqual(EmailOutbox.objects.filter(kind=EmailOutbox.KIND_INVOICE).count(), 3)
+        self.assertEqual(reconcile_payments(days=2), (2, 0))
+        self.assertFalse(Order.objects.filter(id__in=[o.id for o in unpaid], paid=True).exists())
+
+    def test_missing_session_is_skipped(self):
+        order = self.create_order(paid_on_stripe=True)
+        CheckoutSession.objects.filter(order=order).update(session_id='cs_missing')
+
+        with self.assertLogs('payment.reconcile', 'WARNING'):
+            self.assertEqual(reconcile_payments(), (1, 0))
+
+    def test_paid_earlier_session_is_found(self):
+        order = Order.objects.create(
+            first_name='A', last_name='B', email='a@example.com', address='-', postal_code='12345', city='-'
+        )
+        # Paid in the first tab after opening checkout again in a second one
+        self.create_session(order, paid_on_stripe=True)
+        self.create_session(order)
+
+        self.assertEqual(reconcile_payments(), (2, 1))
+        order.refresh_from_db()
+        self.assertTrue(order.paid)
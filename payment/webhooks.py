@@ -1,25 +1,35 @@
+import json
+import logging
 import stripe
 from django.conf import settings
+from django.db import IntegrityError, transaction
 from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from orders.models import Order
-from .tasks import payment_completed
+from .events import HANDLERS
+from .models import StripeEvent
+from .tasks import process_stripe_event
+
+logger = logging.getLogger(__name__)
 
 @csrf_exempt
 def stripe_webhook(request):
     """
     Handles incoming Stripe webhook events.
     
-    This endpoint:
+    This endpoint does as little as possible before acknowledging:
     1. Verifies the Stripe webhook signature to ensure authenticity.
-    2. Processes 'checkout.session.completed' events.
-    3. Marks the corresponding Order as paid and triggers invoice email via Celery.
+    2. Records events we handle (e.g. 'checkout.session.completed') in the
+       StripeEvent table; the unique event ID drops Stripe redeliveries.
+    3. Enqueues the `process_stripe_event` task once the record is committed.
+       If the broker is down, the recorded event is picked up by the
+       `process_pending_stripe_events` sweeper instead.
+    The order itself is updated by the task (see `payment.events`).
     
     Args:
         request (HttpRequest): Incoming webhook request from Stripe.
     
     Returns:
-        HttpResponse: HTTP 200 for success, 400 for bad request, 404 if order not found.
+        HttpResponse: HTTP 200 for success, 400 for bad request.
     """
     payload = request.body
     sig_header = request.META.get('HTTP_STRIPE_SIGNATURE')
@@ -39,24 +49,32 @@ def stripe_webhook(request):
         # Invalid signature
         return HttpResponse(status=400)
 
-    # Handle checkout session completion
-    if event.type == 'checkout.session.completed':
-        session = event.data.object
-
-        # Only process successful payments
-        if session.mode == 'payment' and session.payment_status == 'paid':
-            try:
-                # Retrieve the order linked via client_reference_id
-                order = Order.objects.get(id=session.client_reference_id)
-            except Order.DoesNotExist:
-                return HttpResponse(status=404)
+    if event.type not in HANDLERS:
+        return HttpResponse(status=200)
 
-            # Mark the order as paid
-            order.paid = True
-            order.save()
+    try:
+        with transaction.atomic():
+            record = StripeEvent.objects.create(
+                event_id=event.id,
+                type=event.type,
+                payload=json.loads(payload)
+            )
+    except IntegrityError:
+        # Redelivery of an event we already recorded
+        return HttpResponse(status=200)
 
-            # Trigger asynchronous invoice email task
-            payment_completed.delay(order.id)
+    transaction.on_commit(lambda: _enqueue(record.id))
 
     # Return 200 to acknowledge receipt of the webhook
     return HttpResponse(status=200)
+
+
+def _enqueue(event_id):
+    """
+    Enqueues the processing task, leaving the event to the sweeper if the
+    broker cannot be reached.
+    """
+    try:
+        process_stripe_event.delay(event_id)
+    except Exception:
+        logger.exception('Could not enqueue Stripe event %s; it will be swept later', event_id)
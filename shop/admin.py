@@ -1,6 +1,8 @@
-from django.contrib import admin
-from .models import Category, Product
+from django import forms
+from django.contrib import admin, messages
+from .models import Category, Product, ProductViews
 from parler.admin import TranslatableAdmin
+from orders import stock
 
 # Register your models here.
 # Django admin configuration for Category and Product models.
@@ -14,15 +16,46 @@ class CategoryAdmin(TranslatableAdmin):
     Uses django-parler's TranslatableAdmin to handle multilingual fields.
     Automatically populates the `slug` field based on the `name`.
     """
-	list_display = ['name','slug']
-	# for django-parler
-	# prepopulated_fields = {'slug':('name',)}
-	def get_prepopulated_fields(self, request, obj=None):
+    list_display = ['name','slug']
+    # for django-parler
+    # prepopulated_fields = {'slug':('name',)}
+    def get_prepopulated_fields(self, request, obj=None):
         """
         Defines fields that should be automatically populated.
         Here, the `slug` is generated from the `name` field.
         """
-		return {'slug': ('name',)}
+        return {'slug': ('name',)}
+
+    def get_queryset(self, request):
+        """
+        Loads the translations of the listed categories with one query
+        instead of one per category.
+        """
+        return super().get_queryset(request).prefetch_related('translations')
+
+
+class ProductAdminForm(forms.ModelForm):
+    """
+    Product form with a stock delta instead of an editable stock value.
+    """
+    stock_change = forms.IntegerField(
+        required=False,
+        label='Add to stock',
+        help_text='Units to add, or remove with a negative number. Applied to the stock '
+                  'at the time of saving, so checkouts made meanwhile are kept.'
+    )
+
+    class Meta:
+        model = Product
+        fields = '__all__'
+
+    def clean_stock_change(self):
+        change = self.cleaned_data['stock_change']
+        if change and change < 0:
+            current = Product.objects.filter(pk=self.instance.pk).values_list('stock', flat=True).first()
+            if current is None or current < -change:
+                raise forms.ValidationError(f'Only {current or 0} units are in stock.')
+        return change
 
 
 @admin.register(Product)
@@ -31,17 +64,55 @@ class ProductAdmin(admin.ModelAdmin):
     Admin configuration for the Product model.
     
     Provides quick access to key product details, filtering, and 
-    inline editing of selected fields in the admin panel.
+    inline editing of selected fields in the admin panel. The stock of an
+    existing product is only changed by a delta (see `orders.stock.adjust`):
+    saving a stock value loaded with the page would undo the checkouts made
+    since.
     """
+    form = ProductAdminForm
 
     # Fields displayed in the list view
-	list_display = ['name','slug','price','available','created','updated']
+    list_display = ['name','slug','price','available','stock','created','updated']
     # Filters available in the sidebar
-	list_filter = ['available','created','updated']
- 	# Fields editable directly from the list view
-	list_editable = ['price','available']
-	# Automatically populate slug based on name
-	prepopulated_fields = {'slug':('name',)}
+    list_filter = ['available','created','updated']
+    # Fields editable directly from the list view
+    list_editable = ['price','available']
+    # Automatically populate slug based on name
+    prepopulated_fields = {'slug':('name',)}
+
+    def get_readonly_fields(self, request, obj=None):
+        return ['stock'] if obj else []
+
+    def get_fields(self, request, obj=None):
+        fields = super().get_fields(request, obj)
+        return fields if obj else [field for field in fields if field != 'stock_change']
+
+    def save_model(self, request, obj, form, change):
+        """
+        Saves an existing product without its stock, then applies the
+        stock delta entered in the change form.
+        """
+        if not change:
+            return super().save_model(request, obj, form, change)
+        obj.save(update_fields=[
+            field.name for field in Product._meta.concrete_fields
+            if not field.primary_key and field.name != 'stock'
+        ])
+        delta = form.cleaned_data.get('stock_change')
+        if delta and not stock.adjust(obj.id, delta):
+            self.message_user(request, f'Not enough stock to remove {-delta} units of {obj}.', messages.ERROR)
 
 
+@admin.register(ProductViews)
+class ProductViewsAdmin(admin.ModelAdmin):
+    """
+    Read-only view statistics, written by the periodic flush of buffered
+    views.
+    """
+    list_display = ['product', 'views', 'unique_visitors', 'updated']
+    ordering = ['-views']
+    list_select_related = ['product']
+    readonly_fields = ['product', 'views', 'unique_visitors', 'updated']
 
+    def has_add_permission(self, request):
+        return False
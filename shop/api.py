@@ -0,0 +1,226 @@
+import json
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import translation
+from django.views.decorators.http import condition, require_safe
+from .conditional import api_etag, api_last_modified
+from .models import Product
+from .sidebar import get_category_sidebar
+
+# Read-only JSON API of the catalog.
+# Products are read with `.values()` (only the columns of the requested
+# fields) and paginated by primary key. Category names and slugs come from
+# the cached sidebar of the requested language, so translations cost no
+# queries. The export endpoint streams every product as JSON Lines.
+
+# API field -> columns it is built from
+PRODUCT_FIELDS = {
+    'id': ['id'],
+    'name': ['name'],
+    'slug': ['slug'],
+    'description': ['description'],
+    'price': ['price'],
+    'in_stock': ['stock'],
+    'category': ['category_id'],
+    'category_name': ['category_id'],
+    'category_slug': ['category_id'],
+    'image': ['image'],
+    'url': ['id', 'slug'],
+    'updated': ['updated'],
+}
+
+CATEGORY_FIELDS = ['id', 'name', 'slug', 'url']
+
+
+class BadRequest(ValueError):
+    """
+    Raised for invalid API query parameters; sent as a 400 response.
+    """
+
+
+def _error(exc):
+    """
+    Returns the JSON response of a `BadRequest`.
+    """
+    return JsonResponse({'error': str(exc)}, status=400)
+
+
+def _language(request):
+    """
+    Returns the `?language=` of a request, by default the first of
+    `LANGUAGES`.
+    """
+    language = request.GET.get('language') or settings.LANGUAGES[0][0]
+    if language not in dict(settings.LANGUAGES):
+        raise BadRequest(f'Unknown language {language!r}')
+    return language
+
+
+def _fields(request, allowed):
+    """
+    Returns the fields selected with `?fields=a,b`, or all allowed fields.
+    """
+    fields = [field for field in request.GET.get('fields', '').split(',') if field]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise BadRequest(f'Unknown fields: {", ".join(unknown)}')
+    return fields or list(allowed)
+
+
+def _int_param(request, name, default=None, minimum=0, maximum=None):
+    """
+    Returns an integer query parameter.
+    """
+    value = request.GET.get(name)
+    if not value:
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise BadRequest(f'{name} must be an integer')
+    if value < minimum:
+        raise BadRequest(f'{name} must be at least {minimum}')
+    if maximum is not None and value > maximum:
+        raise BadRequest(f'{name} must be at most {maximum}')
+    return value
+
+
+def _products(request):
+    """
+    Returns the available products matching the `?category=` of a request,
+    in primary key order, with the columns of the selected fields.
+
+    Returns:
+        tuple[QuerySet, list[str]]: Rows as dicts and the selected fields.
+    """
+    fields = _fields(request, PRODUCT_FIELDS)
+    columns = sorted({column for field in fields for column in PRODUCT_FIELDS[field]} | {'id'})
+    products = Product.objects.filter(available=True).order_by('id')
+    category_id = _int_param(request, 'category')
+    if category_id is not None:
+        products = products.filter(category_id=category_id)
+    return products.values(*columns), fields
+
+
+class ProductSerializer:
+    """
+    Turns product rows from `.values()` into JSON-ready dicts in the active
+    language.
+    """
+
+    def __init__(self, request, fields):
+        self.fields = fields
+        self.categories = {category['id']: category for category in get_category_sidebar()}
+        # Product URLs only differ by ID and slug; resolve the pattern once
+        self.url_prefix = request.build_absolute_uri(reverse('shop:product_list'))
+
+    def __call__(self, row):
+        data = {}
+        for field in self.fields:
+            if field == 'price':
+                value = str(row['price'])
+            elif field == 'in_stock':
+                value = row['stock'] is None or row['stock'] > 0
+            elif field == 'category':
+                value = row['category_id']
+            elif field in ('category_name', 'category_slug'):
+                category = self.categories.get(row['category_id'])
+                value = category[field[len('category_'):]] if category else None
+            elif field == 'image':
+                value = default_storage.url(row['image']) if row['image'] else None
+            elif field == 'url':
+                value = f'{self.url_prefix}{row["id"]}/{row["slug"]}/'
+            elif field == 'updated':
+                value = row['updated'].isoformat()
+            else:
+                value = row[field]
+            data[field] = value
+        return data
+
+
+@require_safe
+@condition(etag_func=api_etag, last_modified_func=api_last_modified)
+def category_list(request):
+    """
+    Lists the categories with their name, slug and page URL in the
+    requested language.
+
+    Query parameters: `language`, `fields`.
+    """
+    try:
+        language = _language(request)
+        fields = _fields(request, CATEGORY_FIELDS)
+    except BadRequest as exc:
+        return _error(exc)
+    with translation.override(language):
+        categories = get_category_sidebar()
+    results = [
+        {field: request.build_absolute_uri(c['url']) if field == 'url' else c[field] for field in fields}
+        for c in categories
+    ]
+    return JsonResponse({'results': results})
+
+
+@require_safe
+@condition(etag_func=api_etag, last_modified_func=api_last_modified)
+def product_list(request):
+    """
+    Lists available products in primary key order, one page at a time.
+
+    Query parameters: `language`, `fields`, `category` (ID), `limit` and
+    `after` (the last ID of the previous page). The `next` link of a page
+    continues after its last product, so every page is an index range scan.
+    """
+    try:
+        language = _language(request)
+        products, fields = _products(request)
+        limit = _int_param(request, 'limit', settings.API_PAGE_SIZE, 1, settings.API_MAX_PAGE_SIZE)
+        after = _int_param(request, 'after')
+    except BadRequest as exc:
+        return _error(exc)
+    if after is not None:
+        products = products.filter(id__gt=after)
+
+    rows = list(products[:limit + 1])
+    next_url = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        query = request.GET.copy()
+        query['after'] = rows[-1]['id']
+        next_url = request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+
+    with translation.override(language):
+        serialize = ProductSerializer(request, fields)
+        results = [serialize(row) for row in rows]
+    return JsonResponse({'results': results, 'next': next_url})
+
+
+@require_safe
+@condition(etag_func=api_etag, last_modified_func=api_last_modified)
+def product_export(request):
+    """
+    Streams every available product as JSON Lines, one object per line.
+
+    Rows are read with a database iterator in chunks of
+    `API_EXPORT_CHUNK_SIZE` and written as they are read, so the whole
+    catalog is exported in constant memory.
+
+    Query parameters: `language`, `fields`, `category` (ID).
+    """
+    try:
+        language = _language(request)
+        products, fields = _products(request)
+    except BadRequest as exc:
+        return _error(exc)
+    with translation.override(language):
+        serialize = ProductSerializer(request, fields)
+
+    def lines():
+        for row in products.iterator(chunk_size=settings.API_EXPORT_CHUNK_SIZE):
+            yield json.dumps(serialize(row), ensure_ascii=False) + '\n'
+
+    response = StreamingHttpResponse(lines(), content_type='application/x-ndjson; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="products.jsonl"'
+    return response
@@ -0,0 +1,19 @@
+from django.urls import path
+from . import api
+
+# Namespace for the catalog API URLs
+app_name = 'api'
+
+
+# URL patterns of the read-only catalog API (see `shop.api`).
+# Handles:
+# - Category list
+# - Paginated product list
+# - Streamed export of every product
+
+
+urlpatterns = [
+	path('categories/',api.category_list,name='category_list'),
+	path('products/',api.product_list,name='product_list'),
+	path('products/export/',api.product_export,name='product_export'),
+]
@@ -0,0 +1,82 @@
+import time
+from datetime import datetime, timezone
+from django.core.cache import cache
+
+# Versions of the cached catalog fragments.
+# Fragment cache keys include the version of the catalog part they show:
+# one version per category and one for the listing of all products.
+# Changing a product or category sets new versions, so exactly the
+# affected fragments miss and stale ones simply expire.
+
+ALL_PRODUCTS = 'all'
+
+
+def _cache_key(scope):
+    """
+    Returns the cache key of the version of a catalog scope.
+    """
+    return f'shop:catalog_version:{scope}'
+
+
+def new_version():
+    """
+    Returns a version that was never used before, even if the cache lost
+    the previous one.
+    """
+    return str(time.time_ns())
+
+
+def cached_version(key):
+    """
+    Returns the version kept under a cache key, replacing a lost one with
+    a new version. Also used for versions of other cached data, such as the
+    popularity rankings.
+    """
+    version = cache.get(key)
+    if version is None:
+        version = new_version()
+        # Another process may have set the version in the meantime
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def catalog_version(category_id=None):
+    """
+    Returns the current version of a category's products, or of all
+    products if `category_id` is None.
+    """
+    return cached_version(_cache_key(category_id or ALL_PRODUCTS))
+
+
+def catalog_versions(*category_ids):
+    """
+    Returns the current versions of several categories with one cache
+    read, as a dict keyed by category ID.
+    """
+    keys = {category_id: _cache_key(category_id) for category_id in category_ids}
+    cached = cache.get_many(keys.values())
+    return {
+        category_id: cached.get(key) or catalog_version(category_id)
+        for category_id, key in keys.items()
+    }
+
+
+def version_time(version):
+    """
+    Returns the time a catalog version was set. Versions are set when the
+    catalog changes (or when a lost version is recreated), so this is never
+    earlier than the last change.
+    """
+    return datetime.fromtimestamp(int(version) / 1e9, tz=timezone.utc)
+
+
+def bump_catalog_version(*category_ids):
+    """
+    Invalidates the cached fragments of the given categories and of the
+    listing of all products.
+    """
+    scopes = {category_id for category_id in category_ids if category_id}
+    scopes.add(ALL_PRODUCTS)
+    version = new_version()
+    cache.set_many({_cache_key(scope): version for scope in scopes}, None)
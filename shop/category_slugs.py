@@ -0,0 +1,70 @@
+import logging
+import time
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import translation
+from .sidebar import get_category_sidebar
+
+# Resolution of category URL slugs without a database query.
+# Each process keeps a map of slug -> sidebar entry per language, built from
+# the shared sidebar cache (see `shop.sidebar`). Category changes clear the
+# map of the process that made them and the shared sidebar; other processes
+# reload theirs after `CATEGORY_SLUG_CACHE_TTL` seconds, or when a slug is not
+# found, so renamed and new categories resolve at once. Misses reload a map
+# at most once per `CATEGORY_SLUG_MISS_RELOAD_INTERVAL` seconds, so requests
+# for unknown slugs (crawlers, old links) are answered from memory too.
+
+logger = logging.getLogger(__name__)
+
+# language -> (load time, {slug: sidebar entry})
+_local = {}
+
+
+def _load(language):
+    """
+    Builds and stores the map of a language from the shared sidebar.
+    """
+    with translation.override(language):
+        sidebar = get_category_sidebar()
+    categories = {entry['slug']: entry for entry in sidebar}
+    _local[language] = (time.monotonic(), categories)
+    return categories
+
+
+def resolve_category(language, slug):
+    """
+    Returns the sidebar entry (`id`, `name`, `slug`, `url`) of the category
+    with a slug in a language, or None if there is none.
+
+    Slugs are those of the sidebar links: a category without a translation
+    in the language is found by its slug in the fallback language.
+    """
+    loaded, categories = _local.get(language, (None, {}))
+    age = time.monotonic() - loaded if loaded is not None else None
+    category = categories.get(slug)
+    if age is None or age > settings.CATEGORY_SLUG_CACHE_TTL or (
+        category is None and age > settings.CATEGORY_SLUG_MISS_RELOAD_INTERVAL
+    ):
+        category = _load(language).get(slug)
+    return category
+
+
+def clear_category_slugs():
+    """
+    Drops this process's maps, after a category or translation change.
+    """
+    _local.clear()
+
+
+def warm_category_slugs():
+    """
+    Loads the maps of every language, so the first category pages served
+    by a new process need no query. A database that is not reachable yet
+    is logged and left to the first request.
+    """
+    for language, _ in settings.LANGUAGES:
+        try:
+            _load(language)
+        except DatabaseError:
+            logger.warning('Could not warm the category slugs for %s', language, exc_info=True)
+            return
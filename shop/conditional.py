@@ -0,0 +1,149 @@
+import hashlib
+import json
+from django.conf import settings
+from django.utils import translation
+from .catalog_cache import catalog_version, version_time
+from .category_slugs import resolve_category
+from .models import Product
+from .popularity import popularity_version
+
+# Validators for conditional GET on catalog pages and the catalog API.
+# They are computed from cached catalog versions or a single primary key
+# lookup, never from the products shown. Catalog pages also show the
+# visitor's cart and carry a CSRF token, so ETags include both; a
+# Last-Modified date is only given to visitors with an empty cart.
+
+
+def _visitor_state(request):
+    """
+    Returns the parts of a catalog page that depend on the visitor.
+    """
+    return [
+        request.session.get(settings.CART_SESSION_ID) or {},
+        request.session.get('coupon_id'),
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+    ]
+
+
+def _etag(*parts):
+    """
+    Returns a short hash of JSON-serializable parts.
+    """
+    raw = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _has_cart(request):
+    """
+    Returns True if the visitor has items in the cart or a coupon.
+    """
+    return bool(request.session.get(settings.CART_SESSION_ID) or request.session.get('coupon_id'))
+
+
+def _category_id(request, category_slug):
+    """
+    Returns the ID of the category with the slug in the active language.
+    """
+    category = resolve_category(request.LANGUAGE_CODE, category_slug)
+    return category['id'] if category else None
+
+
+def _list_version(request, category_slug):
+    """
+    Returns the catalog version of a listing page, or None if the category
+    does not exist.
+    """
+    if not category_slug:
+        return catalog_version()
+    category_id = _category_id(request, category_slug)
+    return catalog_version(category_id) if category_id else None
+
+
+def product_list_etag(request, category_slug=None):
+    """
+    ETag of a product listing page.
+    """
+    version = _list_version(request, category_slug)
+    if version is None:
+        return None
+    return _etag(
+        'list', translation.get_language(), category_slug, request.GET.get('after'),
+        request.GET.get('price'), request.GET.get('availability'), popularity_version(),
+        request.headers.get('x-requested-with'), version, *_visitor_state(request)
+    )
+
+
+def product_list_last_modified(request, category_slug=None):
+    """
+    Last-Modified date of a product listing page.
+    """
+    if _has_cart(request):
+        return None
+    version = _list_version(request, category_slug)
+    if version is None:
+        return None
+    return max(version_time(version), version_time(popularity_version()))
+
+
+def _product_validators(request, id, slug):
+    """
+    Returns the `updated` time and category ID of an available product,
+    loaded once per request.
+    """
+    if not hasattr(request, '_product_validators'):
+        request._product_validators = (
+            Product.objects
+            .filter(id=id, slug=slug, available=True)
+            .values_list('updated', 'category_id')
+            .first()
+        )
+    return request._product_validators
+
+
+def product_detail_etag(request, id, slug):
+    """
+    ETag of a product detail page.
+    """
+    validators = _product_validators(request, id, slug)
+    if validators is None:
+        return None
+    updated, category_id = validators
+    return _etag(
+        'detail', translation.get_language(), id, updated, catalog_version(category_id),
+        *_visitor_state(request)
+    )
+
+
+def product_detail_last_modified(request, id, slug):
+    """
+    Last-Modified date of a product detail page.
+    """
+    validators = _product_validators(request, id, slug)
+    if validators is None or _has_cart(request):
+        return None
+    updated, category_id = validators
+    return max(updated, version_time(catalog_version(category_id)))
+
+
+def _api_version(request):
+    """
+    Returns the catalog version of an API response: that of the requested
+    category, or of the whole catalog.
+    """
+    category = request.GET.get('category', '')
+    return catalog_version(int(category)) if category.isdigit() else catalog_version()
+
+
+def api_etag(request):
+    """
+    ETag of a catalog API response. API responses do not depend on the
+    visitor, so only the query and the catalog version count.
+    """
+    return _etag('api', request.path, sorted(request.GET.lists()), _api_version(request))
+
+
+def api_last_modified(request):
+    """
+    Last-Modified date of a catalog API response.
+    """
+    return version_time(_api_version(request))
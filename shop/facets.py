@@ -0,0 +1,253 @@
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import BooleanField, Case, Count, IntegerField, Q, Value, When
+from .catalog_cache import catalog_versions
+from .models import Product
+
+# Price and availability facets of the catalog.
+# Each category has a histogram of its available products counted by price
+# range and stock state. Histograms are cached under the category's catalog
+# version and rebuilt for the new version right after a product change is
+# committed (see `shop.signals` and `orders.stock`), so listing pages add
+# up cached counts instead of grouping the products table.
+
+# Products without tracked stock are always in stock
+IN_STOCK = Q(stock__isnull=True) | Q(stock__gt=0)
+
+AVAILABILITY_CHOICES = {
+    'in_stock': ('In stock', True),
+    'out_of_stock': ('Out of stock', False),
+}
+
+
+class InvalidFacet(ValueError):
+    """
+    Raised when a facet filter value is unknown.
+    """
+
+
+def price_ranges():
+    """
+    Returns the price ranges of the price facet as (low, high) pairs, from
+    `PRICE_FACET_BOUNDS`. The first range has no lower and the last no
+    upper bound.
+    """
+    bounds = [None] + [Decimal(bound) for bound in settings.PRICE_FACET_BOUNDS] + [None]
+    return list(zip(bounds, bounds[1:]))
+
+
+def price_range_slug(low, high):
+    """
+    Returns the `?price=` value of a price range, e.g. '10-25' or '100-'.
+    """
+    return f'{low or ""}-{high or ""}'
+
+
+def price_range_label(low, high):
+    """
+    Returns the display label of a price range.
+    """
+    if low is None:
+        return f'Under ${high}'
+    if high is None:
+        return f'${low} and over'
+    return f'${low} – ${high}'
+
+
+def parse_filters(query):
+    """
+    Reads the facet filters of a listing request.
+
+    Args:
+        query (QueryDict): The request's GET parameters.
+
+    Returns:
+        tuple[int | None, str | None]: Index of the selected price range
+        and the selected availability.
+
+    Raises:
+        InvalidFacet: If a filter value is unknown.
+    """
+    price = query.get('price')
+    price_index = None
+    if price:
+        slugs = [price_range_slug(low, high) for low, high in price_ranges()]
+        if price not in slugs:
+            raise InvalidFacet(price)
+        price_index = slugs.index(price)
+
+    availability = query.get('availability') or None
+    if availability is not None and availability not in AVAILABILITY_CHOICES:
+        raise InvalidFacet(availability)
+    return price_index, availability
+
+
+def filter_products(products, price_index=None, availability=None):
+    """
+    Restricts products to the selected price range and availability.
+    """
+    if price_index is not None:
+        low, high = price_ranges()[price_index]
+        if low is not None:
+            products = products.filter(price__gte=low)
+        if high is not None:
+            products = products.filter(price__lt=high)
+    if availability is not None:
+        in_stock = AVAILABILITY_CHOICES[availability][1]
+        products = products.filter(IN_STOCK) if in_stock else products.exclude(IN_STOCK)
+    return products
+
+
+def _cache_key(category_id, version):
+    """
+    Returns the cache key of a category's histogram at a catalog version.
+    """
+    return f'shop:facets:{category_id}:{version}'
+
+
+def build_histograms(category_ids):
+    """
+    Counts the available products of categories by price range and stock
+    state, with one grouped query.
+
+    Returns:
+        dict[int, dict[tuple[int, bool], int]]: Per category, the number of
+        products per (price range index, in stock) pair.
+    """
+    bounds = [high for _, high in price_ranges()[:-1]]
+    rows = (
+        Product.objects
+        .filter(available=True, category_id__in=category_ids)
+        .annotate(
+            price_index=Case(
+                *[When(price__lt=high, then=Value(i)) for i, high in enumerate(bounds)],
+                default=Value(len(bounds)),
+                output_field=IntegerField()
+            ),
+            in_stock=Case(When(IN_STOCK, then=Value(True)), default=Value(False), output_field=BooleanField()),
+        )
+        .values_list('category_id', 'price_index', 'in_stock')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    histograms = {category_id: {} for category_id in category_ids}
+    for category_id, price_index, in_stock, count in rows:
+        histograms[category_id][price_index, in_stock] = count
+    return histograms
+
+
+def _store(histograms, versions):
+    """
+    Caches histograms under the catalog versions they were built for.
+    """
+    cache.set_many(
+        {_cache_key(category_id, versions[category_id]): histogram
+         for category_id, histogram in histograms.items()},
+        settings.CATALOG_CACHE_TIMEOUT
+    )
+
+
+def get_histograms(category_ids):
+    """
+    Returns the histograms of categories (see `build_histograms`), building
+    the ones missing from the cache.
+    """
+    category_ids = list(category_ids)
+    versions = catalog_versions(*category_ids)
+    keys = {category_id: _cache_key(category_id, versions[category_id]) for category_id in category_ids}
+    cached = cache.get_many(keys.values())
+    histograms = {
+        category_id: cached[key] for category_id, key in keys.items() if key in cached
+    }
+    missing = [category_id for category_id in category_ids if category_id not in histograms]
+    if missing:
+        built = build_histograms(missing)
+        _store(built, versions)
+        histograms.update(built)
+    return histograms
+
+
+def refresh_facets(*category_ids):
+    """
+    Builds and caches the histograms of categories for their current
+    catalog version. Called once a product change is committed and the
+    version bumped, so listing requests find the new counts cached.
+    """
+    category_ids = [category_id for category_id in category_ids if category_id]
+    if category_ids:
+        _store(build_histograms(category_ids), catalog_versions(*category_ids))
+
+
+def facet_counts(category_ids, price_index=None, availability=None):
+    """
+    Adds up the cached histograms of categories.
+
+    Price range counts are for the selected availability and availability
+    counts for the selected price range, so each count is the number of
+    products the listing would show if that value were chosen.
+
+    Returns:
+        tuple[list[int], dict[str, int]]: Counts per price range and per
+        availability choice.
+    """
+    in_stock = AVAILABILITY_CHOICES[availability][1] if availability else None
+    price_counts = [0] * len(price_ranges())
+    availability_counts = dict.fromkeys(AVAILABILITY_CHOICES, 0)
+    for histogram in get_histograms(category_ids).values():
+        for (index, stocked), count in histogram.items():
+            if in_stock is None or stocked == in_stock:
+                price_counts[index] += count
+            if price_index is None or index == price_index:
+                availability_counts['in_stock' if stocked else 'out_of_stock'] += count
+    return price_counts, availability_counts
+
+
+def _url(query, name, value):
+    """
+    Returns the query string of the first listing page with one filter
+    changed; a None value removes the filter.
+    """
+    query = query.copy()
+    query.pop('after', None)
+    if value is None:
+        query.pop(name, None)
+    else:
+        query[name] = value
+    return f'?{query.urlencode()}' if query else '?'
+
+
+def build_facets(query, category_ids, price_index=None, availability=None):
+    """
+    Returns the facet entries shown beside a listing.
+
+    Args:
+        query (QueryDict): The request's GET parameters.
+        category_ids (list[int]): Categories of the listing.
+        price_index (int, optional): Selected price range.
+        availability (str, optional): Selected availability.
+
+    Returns:
+        dict: 'price' and 'availability' lists of dicts with the `label`,
+        `count`, `selected` flag and `url` that toggles the value.
+    """
+    price_counts, availability_counts = facet_counts(category_ids, price_index, availability)
+    price = []
+    for index, (low, high) in enumerate(price_ranges()):
+        selected = index == price_index
+        price.append({
+            'label': price_range_label(low, high),
+            'count': price_counts[index],
+            'selected': selected,
+            'url': _url(query, 'price', None if selected else price_range_slug(low, high)),
+        })
+    availability_entries = []
+    for value, (label, _) in AVAILABILITY_CHOICES.items():
+        selected = value == availability
+        availability_entries.append({
+            'label': label,
+            'count': availability_counts[value],
+            'selected': selected,
+            'url': _url(query, 'availability', None if selected else value),
+        })
+    return {'price': price, 'availability': availability_entries}
@@ -0,0 +1,288 @@
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from . import search
+from .catalog_cache import bump_catalog_version
+from .facets import refresh_facets
+from .models import RESERVED_CATEGORY_SLUGS, Category, Product
+from .sidebar import invalidate_category_sidebar
+
+# Bulk import of products from supplier feeds.
+# Rows are streamed from CSV or JSON Lines files and applied in fixed-size
+# batches, each in its own transaction: one query finds the batch's
+# existing products by slug, new products are inserted with `bulk_create`
+# and changed ones written with `bulk_update`. Memory use depends on the
+# batch size, not on the size of the feed.
+#
+# A row has the product `slug` and any of `name`, `description`, `price`,
+# `available` and `stock`, plus the `category` slug in the primary language.
+# Unknown categories are created with the `category_name` column and, per
+# other language, `category_name_<code>` and `category_slug_<code>` columns.
+# Columns left out keep their current value.
+
+PRODUCT_FIELDS = ['name', 'description', 'price', 'available', 'stock', 'category_id']
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y'}
+FALSE_VALUES = {'0', 'false', 'no', 'n'}
+
+CategoryTranslation = Category._parler_meta.root_model
+
+_price_field = Product._meta.get_field('price')
+# Prices from this value up do not fit the price column
+PRICE_LIMIT = Decimal(10) ** (_price_field.max_digits - _price_field.decimal_places)
+
+
+class InvalidRow(ValueError):
+    """
+    Raised when a feed row cannot be imported.
+    """
+
+
+def read_rows(stream, format):
+    """
+    Yields the rows of a feed as dicts, one at a time.
+
+    Args:
+        stream: Text stream of the feed.
+        format (str): 'csv' (with a header row) or 'jsonl'.
+
+    Yields:
+        tuple[int, dict]: Line number and row.
+    """
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except ValueError:
+                # Reported as an invalid row by `parse_row`
+                yield line_number, None
+
+
+def _text(row, column):
+    """
+    Returns a column as stripped text; '' for empty or missing values.
+    """
+    value = row.get(column)
+    return '' if value is None else str(value).strip()
+
+
+def parse_row(row):
+    """
+    Validates a feed row.
+
+    Returns:
+        tuple[str, dict, str]: Product slug, the product field values given
+        in the row (without the category) and the category slug ('' if none).
+
+    Raises:
+        InvalidRow: If a value is malformed.
+    """
+    if not isinstance(row, dict):
+        raise InvalidRow('not an object')
+    slug = _text(row, 'slug')
+    if not slug:
+        raise InvalidRow('missing slug')
+    values = {}
+    for column in ('name', 'description'):
+        if column in row:
+            values[column] = _text(row, column)
+    if 'price' in row:
+        try:
+            values['price'] = Decimal(_text(row, 'price')).quantize(Decimal('0.01'))
+        except InvalidOperation:
+            raise InvalidRow(f'invalid price {row["price"]!r}')
+        if not values['price'].is_finite():
+            raise InvalidRow(f'invalid price {row["price"]!r}')
+        if values['price'] >= PRICE_LIMIT:
+            raise InvalidRow(f'price too large {row["price"]!r}')
+        if values['price'] < 0:
+            raise InvalidRow(f'negative price {row["price"]!r}')
+    if 'available' in row:
+        available = row['available']
+        if not isinstance(available, bool):
+            available = _text(row, 'available').lower()
+            if available not in TRUE_VALUES | FALSE_VALUES:
+                raise InvalidRow(f'invalid available {row["available"]!r}')
+            available = available in TRUE_VALUES
+        values['available'] = available
+    if 'stock' in row:
+        stock = _text(row, 'stock')
+        try:
+            values['stock'] = int(stock) if stock else None
+        except ValueError:
+            raise InvalidRow(f'invalid stock {row["stock"]!r}')
+        if values['stock'] is not None and values['stock'] < 0:
+            raise InvalidRow(f'negative stock {row["stock"]!r}')
+    category_slug = _text(row, 'category')
+    category_slugs = [category_slug] + [_text(row, column) for column in row if column.startswith('category_slug_')]
+    for reserved in RESERVED_CATEGORY_SLUGS.intersection(category_slugs):
+        raise InvalidRow(f'reserved category slug {reserved!r}')
+    return slug, values, category_slug
+
+
+class ProductImporter:
+    """
+    Applies feed rows to the catalog batch by batch.
+
+    Keeps the category IDs by slug of the primary language in memory; the
+    number of categories is small compared to the number of products.
+
+    Args:
+        language (str): Language of the `category` slugs and names.
+        batch_size (int): Rows applied per transaction.
+    """
+
+    def __init__(self, language, batch_size=1000):
+        self.language = language
+        self.batch_size = batch_size
+        self.categories = dict(
+            CategoryTranslation.objects
+            .filter(language_code=language)
+            .values_list('slug', 'master_id')
+        )
+        # Categories whose products changed, for the facet refresh at the end
+        self.changed_categories = set()
+        self.created = self.updated = self.unchanged = self.failed = 0
+        # (line number, message) of rejected rows; callers may clear it
+        self.errors = []
+
+    def _reject(self, line_number, message):
+        """
+        Records a row that was not imported.
+        """
+        self.failed += 1
+        self.errors.append((line_number, message))
+
+    def run(self, rows):
+        """
+        Imports rows, yielding after every batch so callers can report
+        progress.
+
+        The catalog versions of changed categories are bumped after every
+        batch, so pages show the imported products right away. Facet counts
+        are rebuilt once at the end: rebuilding them per batch would count
+        the same categories over and over.
+
+        Args:
+            rows (Iterable[tuple[int, dict]]): Line numbers and rows, as
+                yielded by `read_rows`.
+
+        Yields:
+            int: Number of rows processed so far.
+        """
+        rows = iter(rows)
+        processed = 0
+        while batch := list(islice(rows, self.batch_size)):
+            with transaction.atomic():
+                self.apply_batch(batch)
+            processed += len(batch)
+            yield processed
+        refresh_facets(*self.changed_categories)
+
+    def _create_categories(self, rows):
+        """
+        Creates the unknown categories of valid rows with their translations,
+        with one insert for the categories and one for the translations.
+        """
+        new = {}
+        for row in rows:
+            slug = _text(row, 'category')
+            if slug and slug not in self.categories and slug not in new:
+                new[slug] = row
+        if not new:
+            return
+
+        categories = Category.objects.bulk_create([Category() for _ in new])
+        translations = []
+        for category, (slug, row) in zip(categories, new.items()):
+            self.categories[slug] = category.id
+            translations.append(CategoryTranslation(
+                master_id=category.id, language_code=self.language,
+                name=_text(row, 'category_name') or slug, slug=slug
+            ))
+            for code, _ in settings.LANGUAGES:
+                name = _text(row, f'category_name_{code}')
+                if code != self.language and name:
+                    translations.append(CategoryTranslation(
+                        master_id=category.id, language_code=code, name=name,
+                        slug=_text(row, f'category_slug_{code}') or f'{slug}-{code}'
+                    ))
+        CategoryTranslation.objects.bulk_create(translations)
+        transaction.on_commit(invalidate_category_sidebar)
+
+    def apply_batch(self, batch):
+        """
+        Applies one batch of rows. Must run inside a transaction.
+
+        Rows with errors are skipped and recorded in `errors`. When a slug
+        appears more than once in the batch, its last row wins.
+        """
+        parsed = {}
+        valid_rows = []
+        for line_number, row in batch:
+            try:
+                slug, values, category_slug = parse_row(row)
+            except InvalidRow as exc:
+                self._reject(line_number, str(exc))
+                continue
+            parsed[slug] = (line_number, values, category_slug)
+            valid_rows.append(row)
+
+        self._create_categories(valid_rows)
+        existing = {}
+        for product in Product.objects.filter(slug__in=parsed).order_by('-id').only('slug', *PRODUCT_FIELDS):
+            # With duplicate slugs, the oldest product is updated
+            existing[product.slug] = product
+
+        now = timezone.now()
+        to_create, to_update = [], []
+        changed_fields = set()
+        category_ids = set()
+        for slug, (line_number, values, category_slug) in parsed.items():
+            if category_slug:
+                values['category_id'] = self.categories[category_slug]
+            product = existing.get(slug)
+            if product is None:
+                missing = {'name', 'price', 'category_id'} - values.keys()
+                if missing:
+                    self._reject(line_number, f'new product needs {", ".join(sorted(missing))}')
+                    continue
+                to_create.append(Product(slug=slug, **values))
+                category_ids.add(values['category_id'])
+            elif changed := [field for field, value in values.items() if getattr(product, field) != value]:
+                # Both the old and the new category of a moved product change
+                category_ids.add(product.category_id)
+                for field in changed:
+                    setattr(product, field, values[field])
+                category_ids.add(product.category_id)
+                changed_fields.update(changed)
+                # `auto_now` is not applied by bulk_update
+                product.updated = now
+                to_update.append(product)
+            else:
+                self.unchanged += 1
+
+        created = Product.objects.bulk_create(to_create)
+        if to_update:
+            # Each field is one CASE WHEN over the statement's rows, so only
+            # changed fields are written and statements are kept short
+            Product.objects.bulk_update(to_update, [*changed_fields, 'updated'], batch_size=100)
+        self.created += len(created)
+        self.updated += len(to_update)
+
+        # Bulk writes bypass the signals that keep the index and caches current
+        search.index_products([product.id for product in created + to_update])
+
+        if category_ids:
+            self.changed_categories |= category_ids
+            transaction.on_commit(lambda: bump_catalog_version(*category_ids))
@@ -0,0 +1,88 @@
+import os
+import random
+import tempfile
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import translation
+from shop.models import Category, Product
+from shop.pagination import encode_cursor, paginate_products
+
+
+class Command(BaseCommand):
+    """
+    Compares OFFSET and keyset pagination of the product list at growing depth.
+
+    Builds a throwaway database with one category of many products (with
+    repeated names, so the ID tie-breaker matters), then times fetching one
+    page at several depths both ways. Keyset pages should take the same time
+    at any depth:
+
+        python manage.py bench_product_list --products 100000 --per-page 24
+    """
+    help = 'Benchmark deep pages of the product list with OFFSET and keyset pagination.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=50000, help='Number of products to create.')
+        parser.add_argument('--per-page', type=int, default=24, help='Products per page.')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed fetches per depth.')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        if connection.vendor == 'sqlite':
+            test_settings = connection.settings_dict.setdefault('TEST', {})
+            test_settings['NAME'] = os.path.join(tempfile.mkdtemp(), 'bench_product_list.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def run(self, options):
+        count = options['products']
+        per_page = options['per_page']
+        words = ['Green', 'Black', 'White', 'Oolong', 'Herbal', 'Tea', 'Coffee', 'Mug', 'Pot', 'Set']
+        with translation.override('en'):
+            category = Category.objects.create(name='Benchmark', slug='benchmark')
+        Product.objects.bulk_create(
+            [
+                Product(category=category, name=' '.join(random.choices(words, k=3)),
+                        slug=f'product-{i}', price=Decimal('1.00'))
+                for i in range(count)
+            ],
+            batch_size=5000
+        )
+        products = Product.objects.filter(category=category, available=True)
+        ordered = products.order_by('name', 'id')
+
+        self.stdout.write(f'{"depth":>8}{"offset ms":>12}{"keyset ms":>12}')
+        for depth in [0, 0.1, 0.5, 0.9, 0.999]:
+            offset = int(count * depth)
+            cursor = encode_cursor(ordered[offset - 1]) if offset else None
+
+            def fetch_offset():
+                return list(ordered[offset:offset + per_page])
+
+            def fetch_keyset():
+                return paginate_products(products, cursor, per_page)[0]
+
+            if fetch_offset() != fetch_keyset():
+                raise CommandError(f'Keyset page at {offset} differs from the OFFSET page.')
+            self.stdout.write(
+                f'{offset:>8}{self.time(fetch_offset, options["repeat"]):>12.2f}'
+                f'{self.time(fetch_keyset, options["repeat"]):>12.2f}'
+            )
+
+    def time(self, fetch, repeat):
+        """
+        Returns the median time of `fetch` in milliseconds.
+        """
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fetch()
+            timings.append(time.perf_counter() - start)
+        return sorted(timings)[len(timings) // 2] * 1000
@@ -0,0 +1,103 @@
+import itertools
+import os
+import random
+import statistics
+import tempfile
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import translation
+from shop.models import Category, Product
+from shop.search import rebuild_index, search_products
+
+
+class Command(BaseCommand):
+    """
+    Measures product search latency on a generated catalog.
+
+    Builds a throwaway database with `--products` products whose names and
+    descriptions are drawn from a Zipf-distributed vocabulary, indexes them
+    and times searches for common words, rare words, two-word queries and
+    the prefixes typed in search-as-you-type:
+
+        python manage.py bench_search --products 1000000
+    """
+    help = 'Benchmark full-text product search on a generated catalog.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000000, help='Number of products to generate.')
+        parser.add_argument('--words', type=int, default=20000, help='Vocabulary size.')
+        parser.add_argument('--queries', type=int, default=200, help='Searches per query type.')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        if connection.vendor == 'sqlite':
+            test_settings = connection.settings_dict.setdefault('TEST', {})
+            test_settings['NAME'] = os.path.join(tempfile.mkdtemp(), 'bench_search.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def run(self, options):
+        rng = random.Random(42)
+        vocabulary = [self.word(rng) for _ in range(options['words'])]
+        cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(vocabulary) + 1)))
+
+        def text(n):
+            return ' '.join(rng.choices(vocabulary, cum_weights=cum_weights, k=n))
+
+        with translation.override('en'):
+            categories = [
+                Category.objects.create(name=text(2).title(), slug=f'category-{i}') for i in range(50)
+            ]
+
+        start = time.perf_counter()
+        for offset in range(0, options['products'], 10000):
+            with transaction.atomic():
+                Product.objects.bulk_create([
+                    Product(category=rng.choice(categories), name=text(3).title(), slug=f'product-{i}',
+                            description=text(25), price=Decimal('9.99'), available=rng.random() > 0.05)
+                    for i in range(offset, min(offset + 10000, options['products']))
+                ])
+        self.stdout.write(f'Generated {options["products"]} products in {time.perf_counter() - start:.0f}s')
+
+        start = time.perf_counter()
+        with transaction.atomic():
+            rebuild_index()
+        self.stdout.write(f'Indexed in {time.perf_counter() - start:.0f}s')
+
+        queries = {
+            'common word': lambda: rng.choice(vocabulary[:20]),
+            'rare word': lambda: rng.choice(vocabulary[-1000:]),
+            'two words': lambda: f'{rng.choice(vocabulary[:200])} {rng.choice(vocabulary[:2000])}',
+            'prefix (3 chars)': lambda: rng.choice(vocabulary[:2000])[:3],
+        }
+        self.stdout.write(f'{"query":<18}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"results":>9}')
+        for label, make_query in queries.items():
+            latencies = []
+            results = []
+            for _ in range(options['queries']):
+                query = make_query()
+                start = time.perf_counter()
+                results.append(len(search_products(query)))
+                latencies.append(time.perf_counter() - start)
+            latencies.sort()
+            self.stdout.write(
+                f'{label:<18}{statistics.median(latencies) * 1000:>9.1f}'
+                f'{latencies[int(len(latencies) * 0.95) - 1] * 1000:>9.1f}'
+                f'{latencies[int(len(latencies) * 0.99) - 1] * 1000:>9.1f}'
+                f'{statistics.mean(results):>9.1f}'
+            )
+
+    def word(self, rng):
+        """
+        Returns a pronounceable random word.
+        """
+        return ''.join(
+            rng.choice('bcdfghklmnprstvz') + rng.choice('aeiou') for _ in range(rng.randint(2, 4))
+        )
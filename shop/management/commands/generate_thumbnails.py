@@ -0,0 +1,69 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import django
+from django.core.management.base import BaseCommand
+from PIL import Image
+from shop.models import Product
+from shop.thumbnails import generate_thumbnails, save_thumbnails
+
+
+def _generate(image_name):
+    """
+    Makes the derivatives of one image in a worker process.
+
+    Returns:
+        tuple[dict | None, str | None]: The derivatives, or None and the error.
+    """
+    try:
+        return generate_thumbnails(image_name), None
+    except (OSError, Image.DecompressionBombError) as exc:
+        return None, str(exc)
+
+
+class Command(BaseCommand):
+    """
+    Generates the resized derivatives of existing product images.
+
+    Products are read in primary key order, one batch at a time, and each
+    batch's images are resized by a pool of worker processes. Products
+    whose derivatives are up to date are skipped unless `--force` is given,
+    e.g. after changing `THUMBNAIL_WIDTHS`:
+
+        python manage.py generate_thumbnails --workers 8
+    """
+    help = 'Generate thumbnails and WebP variants of product images.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes.')
+        parser.add_argument('--batch-size', type=int, default=200, help='Products read per batch.')
+        parser.add_argument('--force', action='store_true', help='Regenerate up-to-date derivatives too.')
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image='').order_by('id').values_list('id', 'image', 'thumbnails')
+        done = failed = 0
+        last_id = 0
+        start = time.perf_counter()
+        # Workers only read and write media files, never the database
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as pool:
+            while True:
+                batch = list(products.filter(id__gt=last_id)[:options['batch_size']])
+                if not batch:
+                    break
+                last_id = batch[-1][0]
+                pending = [
+                    (product_id, image) for product_id, image, thumbnails in batch
+                    if options['force'] or thumbnails.get('source') != image
+                ]
+                results = pool.map(_generate, [image for _, image in pending])
+                for (product_id, image), (thumbnails, error) in zip(pending, results):
+                    if error:
+                        failed += 1
+                        self.stderr.write(f'Product {product_id} ({image}): {error}')
+                    elif save_thumbnails(product_id, thumbnails):
+                        done += 1
+                elapsed = time.perf_counter() - start
+                self.stderr.write(f'{done} products ({done / elapsed:.1f}/s)', ending='\r')
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f'Generated thumbnails of {done} products in {elapsed:.1f}s; {failed} failed.')
@@ -0,0 +1,55 @@
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from shop.importer import ProductImporter, read_rows
+
+
+class Command(BaseCommand):
+    """
+    Imports products from a supplier feed in CSV or JSON Lines format.
+
+    Rows are matched to existing products by slug and applied in batches,
+    each in its own transaction, so memory use stays flat for feeds of any
+    size and an interrupted import can simply be run again. Progress is
+    reported on stderr:
+
+        python manage.py import_products feed.csv --batch-size 2000
+        zcat feed.jsonl.gz | python manage.py import_products - --format jsonl
+
+    See `shop.importer` for the columns.
+    """
+    help = 'Create and update products in bulk from a CSV or JSON Lines feed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Feed file, or - for stdin.')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Feed format; by default from the file extension.')
+        parser.add_argument('--language', default='en', help='Language of the category slugs and names.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows applied per transaction.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        if path == '-' and not options['format']:
+            raise CommandError('--format is required when reading stdin.')
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+
+        importer = ProductImporter(options['language'], options['batch_size'])
+        processed = 0
+        start = time.perf_counter()
+        try:
+            for processed in importer.run(read_rows(stream, format)):
+                for line_number, message in importer.errors:
+                    self.stderr.write(f'Line {line_number}: {message}')
+                importer.errors.clear()
+                elapsed = time.perf_counter() - start
+                self.stderr.write(f'{processed} rows ({processed / elapsed:.0f}/s)', ending='\r')
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'Imported {processed} rows in {elapsed:.1f}s ({processed / elapsed:.0f}/s): '
+            f'{importer.created} created, {importer.updated} updated, '
+            f'{importer.unchanged} unchanged, {importer.failed} rejected.'
+        )
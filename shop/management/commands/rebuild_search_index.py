@@ -0,0 +1,22 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from shop.search import rebuild_index
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the product search index from scratch.
+
+    Needed after loading products in bulk (e.g. with `bulk_create` or raw
+    SQL), which bypasses the signals that keep the index up to date:
+
+        python manage.py rebuild_search_index
+    """
+    help = 'Rebuild the full-text product search index.'
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        with transaction.atomic():
+            rebuild_index()
+        self.stdout.write(f'Search index rebuilt in {time.perf_counter() - start:.1f}s.')
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.3 on 2026-10-19 08:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0003_translations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='stock',
+            field=models.PositiveIntegerField(blank=True, help_text='Units available for sale. Leave empty to not track stock.', null=True),
+        ),
+    ]
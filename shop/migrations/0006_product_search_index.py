@@ -0,0 +1,60 @@
+from django.db import migrations
+
+# Full-text search index of products, see shop/search.py.
+# The tables are created with backend-specific SQL and filled from the
+# existing products.
+
+SQLITE_CREATE = [
+    "CREATE VIRTUAL TABLE shop_product_fts USING fts5("
+    "name, description, category, tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "INSERT INTO shop_product_fts (rowid, name, description, category) "
+    "SELECT p.id, p.name, p.description, "
+    "(SELECT group_concat(t.name, ' ') FROM shop_category_translation t WHERE t.master_id = p.category_id) "
+    "FROM shop_product p",
+]
+
+SQLITE_DROP = ['DROP TABLE shop_product_fts']
+
+POSTGRESQL_CREATE = [
+    'CREATE TABLE shop_product_search ('
+    'product_id bigint PRIMARY KEY REFERENCES shop_product (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+    'document tsvector NOT NULL)',
+    'CREATE INDEX shop_product_search_document ON shop_product_search USING GIN (document)',
+    "INSERT INTO shop_product_search (product_id, document) "
+    "SELECT p.id, setweight(to_tsvector('simple', p.name), 'A') "
+    "|| setweight(to_tsvector('simple', coalesce(("
+    "SELECT string_agg(t.name, ' ') FROM shop_category_translation t WHERE t.master_id = p.category_id"
+    "), '')), 'B') "
+    "|| setweight(to_tsvector('simple', p.description), 'D') "
+    "FROM shop_product p",
+]
+
+POSTGRESQL_DROP = ['DROP TABLE shop_product_search']
+
+SQL = {
+    'sqlite': (SQLITE_CREATE, SQLITE_DROP),
+    'postgresql': (POSTGRESQL_CREATE, POSTGRESQL_DROP),
+}
+
+
+def create_search_index(apps, schema_editor):
+    create, _ = SQL.get(schema_editor.connection.vendor, ([], []))
+    for statement in create:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    _, drop = SQL.get(schema_editor.connection.vendor, ([], []))
+    for statement in drop:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.3 on 2026-10-19 09:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0007_product_thumbnails'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductViews',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='view_stats', serialize=False, to='shop.product')),
+                ('views', models.PositiveBigIntegerField(default=0)),
+                ('unique_visitors', models.PositiveBigIntegerField(default=0)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'product views',
+                'verbose_name_plural': 'product views',
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.3 on 2026-10-19 09:51
+
+from django.db import migrations, models
+import shop.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0008_product_views'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='categorytranslation',
+            name='slug',
+            field=models.SlugField(max_length=200, unique=True, validators=[shop.models.validate_category_slug]),
+        ),
+    ]
@@ -1,3 +1,4 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.urls import reverse
 from parler.models import TranslatableModel, TranslatedFields
@@ -7,6 +8,19 @@ from parler.models import TranslatableModel, TranslatedFields
 # Models for multilingual product catalog (Category and Product)
 # The Category model supports translations using django-parler.
 
+# Slugs of the shop's own pages, which a category URL would shadow
+# (see `shop.urls`)
+RESERVED_CATEGORY_SLUGS = {'search'}
+
+
+def validate_category_slug(slug):
+    """
+    Rejects a category slug that is taken by one of the shop's own pages.
+    """
+    if slug in RESERVED_CATEGORY_SLUGS:
+        raise ValidationError(f'"{slug}" is reserved for a shop page.', code='reserved')
+
+
 class Category(TranslatableModel):
     """
     Represents a product category with multilingual support.
@@ -17,7 +31,7 @@ class Category(TranslatableModel):
     
     translations = TranslatedFields(
         name = models.CharField(max_length=200),
-        slug = models.SlugField(max_length=200,unique=True)
+        slug = models.SlugField(max_length=200,unique=True,validators=[validate_category_slug])
         )
 
     class Meta:
@@ -47,15 +61,25 @@ class Product(models.Model):
     Represents a single product in the catalog.
 
     Each product belongs to a category and contains information such as
-    name, slug, image, description, price, and availability.
+    name, slug, image, description, price, availability and stock.
+    Resized copies of the image are listed in `thumbnails`.
+    Checkout reserves and releases stock through `orders.stock` using
+    conditional updates.
     """
     category = models.ForeignKey(Category,related_name='products',on_delete=models.CASCADE)
     name = models.CharField(max_length=200)
     slug = models.SlugField(max_length=200)
     image = models.ImageField(upload_to='products/%Y/%m/%d',blank=True)
+    # Resized derivatives of `image`, written by `shop.thumbnails`
+    thumbnails = models.JSONField(default=dict, blank=True, editable=False)
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=10,decimal_places=2)
     available = models.BooleanField(default=True)
+    stock = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Units available for sale. Leave empty to not track stock."
+    )
     created = models.DateTimeField(auto_now_add=True)
     updated  = models.DateTimeField(auto_now=True)
 
@@ -63,7 +87,9 @@ class Product(models.Model):
         ordering = ['name']
         indexes = [
             models.Index(fields=['id','slug']),
-            models.Index(fields=['name']),
+            # Keyset pagination of the catalog, see `shop.pagination`
+            models.Index(fields=['name', 'id']),
+            models.Index(fields=['category', 'name', 'id']),
             models.Index(fields=['-created']),
         ]
     
@@ -78,3 +104,49 @@ class Product(models.Model):
         Returns the URL to the product's detail page.
         """
         return reverse('shop:product_detail',args=[self.id,self.slug])
+
+    def _srcset(self, extension):
+        """
+        Returns the `srcset` of the image derivatives in one format, or ''
+        if there are none yet.
+        """
+        names = self.thumbnails.get(extension) or {}
+        return ', '.join(
+            f'{self.image.storage.url(name)} {width}w'
+            for width, name in sorted(names.items(), key=lambda item: int(item[0]))
+        )
+
+    def image_srcset(self):
+        """
+        Returns the `srcset` of the JPEG derivatives of the image.
+        """
+        return self._srcset('jpeg')
+
+    def image_webp_srcset(self):
+        """
+        Returns the `srcset` of the WebP derivatives of the image.
+        """
+        return self._srcset('webp')
+
+
+class ProductViews(models.Model):
+    """
+    View statistics of a product.
+
+    Kept out of the product table, so the periodic flush of buffered views
+    (see `shop.popularity`) never locks product rows that checkout updates.
+    """
+    product = models.OneToOneField(
+        Product, primary_key=True, related_name='view_stats', on_delete=models.CASCADE
+    )
+    views = models.PositiveBigIntegerField(default=0)
+    # Estimated with a Redis HyperLogLog
+    unique_visitors = models.PositiveBigIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'product views'
+        verbose_name_plural = 'product views'
+
+    def __str__(self):
+        return f'{self.product_id}: {self.views} views'
@@ -0,0 +1,81 @@
+import base64
+import json
+from typing import NamedTuple
+
+# Keyset (cursor) pagination for the product catalog.
+# A page continues after the (name, id) of the last product shown instead of
+# skipping N rows with OFFSET, so every page is an index range scan and deep
+# pages cost the same as the first one.
+
+
+class InvalidCursor(ValueError):
+    """
+    Raised when a pagination cursor cannot be decoded.
+    """
+
+
+class ProductPage(NamedTuple):
+    """
+    One page of products and the cursor of the next page (None on the last).
+    """
+    products: list
+    next_cursor: str = None
+
+
+def encode_cursor(product):
+    """
+    Returns the opaque cursor of the page that follows `product`.
+    """
+    raw = json.dumps([product.name, product.id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decodes a cursor made by `encode_cursor`.
+
+    Returns:
+        tuple[str, int]: Name and ID of the last product of the previous page.
+
+    Raises:
+        InvalidCursor: If the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        name, product_id = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(cursor) from e
+    if not isinstance(name, str) or not isinstance(product_id, int):
+        raise InvalidCursor(cursor)
+    return name, product_id
+
+
+def paginate_products(products, cursor=None, per_page=24):
+    """
+    Returns one page of products in (name, id) order.
+
+    The filter `name >= last_name AND NOT (name = last_name AND id <= last_id)`
+    is the row comparison `(name, id) > (last_name, last_id)` written so that
+    every database can use the (name, id) index for it.
+
+    Args:
+        products (QuerySet[Product]): Products to paginate.
+        cursor (str, optional): Cursor of the page; None for the first page.
+        per_page (int): Number of products per page.
+
+    Returns:
+        ProductPage: Products of the page and the cursor of the next page.
+
+    Raises:
+        InvalidCursor: If `cursor` is malformed.
+    """
+    products = products.order_by('name', 'id')
+    if cursor:
+        name, product_id = decode_cursor(cursor)
+        products = products.filter(name__gte=name).exclude(name=name, id__lte=product_id)
+
+    page = list(products[:per_page + 1])
+    if len(page) > per_page:
+        page = page[:per_page]
+        return ProductPage(page, encode_cursor(page[-1]))
+    return ProductPage(page)
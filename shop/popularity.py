@@ -0,0 +1,177 @@
+import hashlib
+import logging
+from contextlib import suppress
+import redis
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from .catalog_cache import cached_version, new_version
+from .models import Product, ProductViews
+from .recommender import r
+
+# Product view counting and popularity rankings.
+# A detail page view costs one pipelined Redis round trip: the product's
+# count is incremented in a pending hash and the visitor is added to the
+# product's HyperLogLog. A periodic task moves the pending counts into
+# `ProductViews` with a few batched queries and sets every product's total
+# as its score in the sorted set of its category, from which the most
+# popular products are served.
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = 'shop:views:pending'
+FLUSHING_KEY = 'shop:views:flushing'
+FLUSH_LOCK_KEY = 'shop:views:flush_lock'
+VERSION_CACHE_KEY = 'shop:popularity_version'
+
+
+def visitors_key(product_id):
+    """
+    Returns the Redis key of a product's HyperLogLog of visitors.
+    """
+    return f'shop:views:visitors:{product_id}'
+
+
+def ranking_key(category_id=None):
+    """
+    Returns the Redis key of the popularity ranking of a category, or of
+    all products if `category_id` is None.
+    """
+    return f'shop:popular:{category_id or "all"}'
+
+
+def visitor_id(request):
+    """
+    Identifies the visitor of a request without creating a session: by
+    session key if there is one, otherwise by address and user agent.
+    """
+    if request.session.session_key:
+        return request.session.session_key
+    raw = f'{request.META.get("REMOTE_ADDR", "")}|{request.headers.get("user-agent", "")}'
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def record_view(request, product):
+    """
+    Buffers a view of a product. A Redis failure loses the view rather
+    than the page.
+    """
+    try:
+        pipe = r.pipeline(transaction=False)
+        pipe.hincrby(PENDING_KEY, product.id, 1)
+        pipe.pfadd(visitors_key(product.id), visitor_id(request))
+        pipe.execute()
+    except redis.RedisError as exc:
+        logger.warning('Could not record a view of product %s: %s', product.id, exc)
+
+
+def popularity_version():
+    """
+    Returns the version of the popularity rankings, changed by every flush
+    that moved views. A lost version is replaced by a new one, like the
+    catalog versions in `shop.catalog_cache`.
+    """
+    return cached_version(VERSION_CACHE_KEY)
+
+
+def _apply_batch(counts, product_ids):
+    """
+    Adds buffered views of products to their `ProductViews` in one
+    transaction, then removes them from the flushing hash and sets the new
+    totals as their ranking scores.
+    """
+    pipe = r.pipeline(transaction=False)
+    for product_id in product_ids:
+        pipe.pfcount(visitors_key(product_id))
+    unique_visitors = dict(zip(product_ids, pipe.execute()))
+
+    now = timezone.now()
+    with transaction.atomic():
+        # Views of deleted products are dropped here
+        categories = dict(Product.objects.filter(id__in=product_ids).values_list('id', 'category_id'))
+        stats = ProductViews.objects.select_for_update().in_bulk(list(categories))
+        existing = list(stats.values())
+        for product_id in categories:
+            if product_id not in stats:
+                stats[product_id] = ProductViews(product_id=product_id)
+            stats[product_id].views += counts[product_id]
+            stats[product_id].unique_visitors = unique_visitors[product_id]
+            stats[product_id].updated = now
+        ProductViews.objects.bulk_create([s for product_id, s in stats.items() if s._state.adding])
+        ProductViews.objects.bulk_update(existing, ['views', 'unique_visitors', 'updated'])
+
+    pipe = r.pipeline(transaction=False)
+    # Applied, so a resumed flush does not count them again
+    pipe.hdel(FLUSHING_KEY, *product_ids)
+    # Absolute totals, so rankings can be rebuilt from the database
+    for product_id, category_id in categories.items():
+        pipe.zadd(ranking_key(category_id), {product_id: stats[product_id].views})
+        pipe.zadd(ranking_key(), {product_id: stats[product_id].views})
+    pipe.execute()
+
+
+def flush_views(batch_size=500):
+    """
+    Moves buffered views into the database.
+
+    The pending hash is renamed before it is read, so views recorded during
+    the flush go to a new hash. The products of each committed batch are
+    removed from the renamed hash, so a flush that failed part way leaves
+    only the views it did not apply behind, and the next flush applies them
+    first. Only a failure between a batch's commit and its removal counts
+    that batch twice, which is preferred to losing it. A Redis lock keeps flushes from
+    overlapping; it expires after `PRODUCT_VIEWS_FLUSH_LOCK_TIMEOUT` seconds.
+
+    Args:
+        batch_size (int): Products updated per transaction.
+
+    Returns:
+        int: Number of views flushed.
+    """
+    lock = r.lock(FLUSH_LOCK_KEY, timeout=settings.PRODUCT_VIEWS_FLUSH_LOCK_TIMEOUT, blocking=False)
+    if not lock.acquire():
+        return 0
+    try:
+        if not r.exists(FLUSHING_KEY):
+            try:
+                r.rename(PENDING_KEY, FLUSHING_KEY)
+            except redis.ResponseError:
+                # No views since the last flush
+                return 0
+        counts = {int(product_id): int(count) for product_id, count in r.hgetall(FLUSHING_KEY).items()}
+        product_ids = sorted(counts)
+        for i in range(0, len(product_ids), batch_size):
+            _apply_batch(counts, product_ids[i:i + batch_size])
+        r.delete(FLUSHING_KEY)
+        cache.set(VERSION_CACHE_KEY, new_version(), None)
+        return sum(counts.values())
+    finally:
+        # A flush that outlived the lock timeout no longer holds the lock,
+        # which may have been taken by the next flush
+        with suppress(redis.exceptions.LockError):
+            lock.release()
+
+
+def popular_products(category_id=None, limit=5):
+    """
+    Returns the most viewed available products of a category, or of all
+    products if `category_id` is None.
+
+    A few extra IDs are read from the ranking, as products that were
+    hidden or moved to another category keep their old entries.
+
+    Returns:
+        list[Product]: Products by decreasing views; empty if Redis is
+        not reachable.
+    """
+    try:
+        ranked = [int(product_id) for product_id in r.zrevrange(ranking_key(category_id), 0, limit * 2 - 1)]
+    except redis.RedisError as exc:
+        logger.warning('Could not read the popularity ranking: %s', exc)
+        return []
+    products = Product.objects.filter(id__in=ranked, available=True)
+    if category_id:
+        products = products.filter(category_id=category_id)
+    products = products.in_bulk()
+    return [products[product_id] for product_id in ranked if product_id in products][:limit]
@@ -1,11 +1,15 @@
 import redis
 from django.conf import settings
+from myshop.metrics import RedisConnection
 from .models import Product
 
 # connect to redis
 # Establish a Redis connection using Django settings.
 # This Redis instance is used for storing and retrieving product recommendation data.
-r = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB)
+# Its round trips are counted in the request metrics (see `myshop.metrics`).
+r = redis.Redis(connection_pool=redis.ConnectionPool(
+    host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB, connection_class=RedisConnection
+))
 
 class Recommender:
     """
@@ -27,7 +31,7 @@ class Recommender:
         return f'product:{id}:purchased_with'
 
     def products_bought(self, products):
-         """
+        """
         Updates the Redis store to record which products were bought together.
 
         Args:
@@ -68,10 +72,10 @@ class Recommender:
             r.zunionstore(tmp_key, keys)
             
             # Remove the original products from the recommendations
-            r.rem(tmp_key, *product_ids)
+            r.zrem(tmp_key, *product_ids)
 
             # Fetch the top related products
-            suggestions = r.zrange(tmp_key, 0, -1, desc=True)[:max_result]
+            suggestions = r.zrange(tmp_key, 0, -1, desc=True)[:max_results]
 
             # Clean up the temporary key
             r.delete(tmp_key)
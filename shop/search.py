@@ -0,0 +1,221 @@
+import re
+from django.db import connection
+from .models import Product
+
+# Full-text product search.
+# Products are indexed by name, description and the names of their category
+# in every language: in an FTS5 table on SQLite and in a tsvector table with
+# a GIN index on PostgreSQL (both created by migration 0006). The index is
+# updated on every product and category save (see `shop.signals`); bulk
+# loads are indexed with `manage.py rebuild_search_index`.
+
+MAX_TERMS = 8
+
+# Relative weight of the indexed columns in the ranking
+NAME_WEIGHT = 10.0
+CATEGORY_WEIGHT = 4.0
+DESCRIPTION_WEIGHT = 1.0
+
+
+def search_terms(query):
+    """
+    Splits a search query into lower-case word terms.
+    """
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+class SQLiteSearchIndex:
+    """
+    Search index in the FTS5 table `shop_product_fts`, keyed by product ID.
+    """
+
+    # Document rows for the products matching the appended WHERE clause
+    DOCUMENTS_SQL = (
+        'SELECT p.id, p.name, p.description, '
+        "(SELECT group_concat(t.name, ' ') FROM shop_category_translation t WHERE t.master_id = p.category_id) "
+        'FROM shop_product p'
+    )
+
+    def delete(self, cursor, product_ids):
+        """Removes the entries of the given products."""
+        cursor.execute(
+            f'DELETE FROM shop_product_fts WHERE rowid IN ({", ".join(["%s"] * len(product_ids))})',
+            product_ids
+        )
+
+    def index(self, cursor, product_ids):
+        """Creates or replaces the entries of the given products."""
+        self.delete(cursor, product_ids)
+        cursor.execute(
+            f'INSERT INTO shop_product_fts (rowid, name, description, category) {self.DOCUMENTS_SQL} '
+            f'WHERE p.id IN ({", ".join(["%s"] * len(product_ids))})',
+            product_ids
+        )
+
+    def rebuild(self, cursor):
+        """Replaces the whole index with entries for every product."""
+        cursor.execute('DELETE FROM shop_product_fts')
+        cursor.execute(f'INSERT INTO shop_product_fts (rowid, name, description, category) {self.DOCUMENTS_SQL}')
+
+    def search(self, cursor, terms, limit, names_only=False):
+        """Returns the IDs of the best matching available products."""
+        # Every term must match, the last one as a prefix (search as you type)
+        match = '(' + ' '.join(f'"{term}"' for term in terms) + '*)'
+        if names_only:
+            match = '{name category} : ' + match
+        cursor.execute(
+            'SELECT p.id FROM shop_product_fts f JOIN shop_product p ON p.id = f.rowid '
+            'WHERE shop_product_fts MATCH %s AND p.available '
+            'ORDER BY bm25(shop_product_fts, %s, %s, %s), p.id LIMIT %s',
+            [match, NAME_WEIGHT, DESCRIPTION_WEIGHT, CATEGORY_WEIGHT, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+class PostgreSQLSearchIndex:
+    """
+    Search index in the table `shop_product_search` with a GIN-indexed
+    tsvector per product.
+    """
+
+    # Document rows for the products matching the appended WHERE clause.
+    # The 'simple' configuration does not stem, as the catalog is multilingual.
+    DOCUMENTS_SQL = (
+        "SELECT p.id, setweight(to_tsvector('simple', p.name), 'A') "
+        "|| setweight(to_tsvector('simple', coalesce(("
+        "SELECT string_agg(t.name, ' ') FROM shop_category_translation t WHERE t.master_id = p.category_id"
+        "), '')), 'B') "
+        "|| setweight(to_tsvector('simple', p.description), 'D') "
+        'FROM shop_product p'
+    )
+
+    def delete(self, cursor, product_ids):
+        """Removes the entries of the given products."""
+        cursor.execute('DELETE FROM shop_product_search WHERE product_id = ANY(%s)', [list(product_ids)])
+
+    def index(self, cursor, product_ids):
+        """Creates or replaces the entries of the given products."""
+        cursor.execute(
+            f'INSERT INTO shop_product_search (product_id, document) {self.DOCUMENTS_SQL} '
+            'WHERE p.id = ANY(%s) '
+            'ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document',
+            [list(product_ids)]
+        )
+
+    def rebuild(self, cursor):
+        """Replaces the whole index with entries for every product."""
+        cursor.execute('TRUNCATE shop_product_search')
+        cursor.execute(f'INSERT INTO shop_product_search (product_id, document) {self.DOCUMENTS_SQL}')
+
+    def search(self, cursor, terms, limit, names_only=False):
+        """Returns the IDs of the best matching available products."""
+        # Every term must match, the last one as a prefix (search as you type);
+        # weights A and B are the product and category names
+        labels = 'AB' if names_only else ''
+        query = ' & '.join(f'{term}:{labels}' if labels else term for term in terms[:-1])
+        query = (query + ' & ' if query else '') + f'{terms[-1]}:*{labels}'
+        cursor.execute(
+            'SELECT p.id FROM shop_product_search s JOIN shop_product p ON p.id = s.product_id, '
+            "to_tsquery('simple', %s) q "
+            'WHERE s.document @@ q AND p.available '
+            'ORDER BY ts_rank(%s::float4[], s.document, q) DESC, p.id LIMIT %s',
+            # Weights in {D, C, B, A} order, relative to the name
+            [query, [DESCRIPTION_WEIGHT / NAME_WEIGHT, 0, CATEGORY_WEIGHT / NAME_WEIGHT, 1], limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchIndex,
+    'postgresql': PostgreSQLSearchIndex,
+}
+
+
+def is_supported():
+    """
+    Returns True if the default database supports product search.
+    """
+    return connection.vendor in BACKENDS
+
+
+def get_search_index():
+    """
+    Returns the search index of the default database.
+
+    Raises:
+        NotImplementedError: If the database has no supported full-text search.
+    """
+    try:
+        return BACKENDS[connection.vendor]()
+    except KeyError:
+        raise NotImplementedError(f'Product search is not supported on {connection.vendor}')
+
+
+def index_products(product_ids, batch_size=500):
+    """
+    Updates the search index entries of the given products. Does nothing
+    on databases without product search.
+
+    Args:
+        product_ids (Iterable[int]): IDs of new or changed products.
+        batch_size (int): Products indexed per statement.
+    """
+    product_ids = list(product_ids)
+    if not is_supported():
+        return
+    search_index = get_search_index()
+    with connection.cursor() as cursor:
+        for i in range(0, len(product_ids), batch_size):
+            search_index.index(cursor, product_ids[i:i + batch_size])
+
+
+def remove_products(product_ids):
+    """
+    Removes deleted products from the search index.
+    """
+    product_ids = list(product_ids)
+    if product_ids and is_supported():
+        with connection.cursor() as cursor:
+            get_search_index().delete(cursor, product_ids)
+
+
+def rebuild_index():
+    """
+    Rebuilds the whole search index with one INSERT ... SELECT.
+    """
+    with connection.cursor() as cursor:
+        get_search_index().rebuild(cursor)
+
+
+def search_products(query, limit=50):
+    """
+    Returns the available products matching every term of `query`, best
+    matches first. The last term also matches as a prefix, so results can
+    be shown while the customer is typing.
+
+    Products whose name or category name matches are searched first; the
+    descriptions are only searched when that gives fewer than `limit`
+    results. Common words match a large part of the catalog through the
+    descriptions, and ranking all those matches would dominate the cost.
+
+    Args:
+        query (str): The customer's search text.
+        limit (int): Maximum number of results.
+
+    Returns:
+        list[Product]: Matching products in rank order.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+    search_index = get_search_index()
+    with connection.cursor() as cursor:
+        product_ids = search_index.search(cursor, terms, limit, names_only=True)
+        if len(product_ids) < limit:
+            found = set(product_ids)
+            product_ids += [
+                product_id for product_id in search_index.search(cursor, terms, limit)
+                if product_id not in found
+            ][:limit - len(product_ids)]
+    products = Product.objects.in_bulk(product_ids)
+    return [products[product_id] for product_id in product_ids if product_id in products]
@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import translation
+from .models import Category
+
+# Cached category sidebar of the catalog pages.
+# The sidebar is built once per language from a single query with prefetched
+# translations and kept in the cache until a category or one of its
+# translations changes (see `shop.signals`).
+
+CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def _cache_key(language):
+    """
+    Returns the cache key of the sidebar for a language.
+    """
+    return f'shop:category_sidebar:{language}'
+
+
+def build_category_sidebar():
+    """
+    Returns the sidebar entries for the active language.
+
+    Translations are prefetched, so parler resolves names, slugs and
+    fallback languages without a query per category.
+
+    Returns:
+        list[dict]: One dict per category with its `id`, `name`, `slug`
+        and `url`.
+    """
+    categories = Category.objects.order_by('pk').prefetch_related('translations')
+    sidebar = []
+    for category in categories:
+        slug = category.safe_translation_getter('slug', any_language=True)
+        sidebar.append({
+            'id': category.id,
+            'name': category.safe_translation_getter('name', any_language=True),
+            'slug': slug,
+            'url': reverse('shop:product_list_by_category', args=[slug]),
+        })
+    return sidebar
+
+
+def get_category_sidebar():
+    """
+    Returns the cached sidebar entries for the active language.
+
+    The sidebar is cached per language of `LANGUAGES`, the ones
+    `invalidate_category_sidebar` clears: a variant such as the default
+    'en-us' shares the sidebar of 'en', and a language without a supported
+    variant gets an uncached one.
+    """
+    try:
+        language = translation.get_supported_language_variant(translation.get_language())
+    except LookupError:
+        return build_category_sidebar()
+    key = _cache_key(language)
+    sidebar = cache.get(key)
+    if sidebar is None:
+        with translation.override(language):
+            sidebar = build_category_sidebar()
+        cache.set(key, sidebar, CACHE_TIMEOUT)
+    return sidebar
+
+
+def invalidate_category_sidebar():
+    """
+    Removes the cached sidebar of every language.
+    """
+    cache.delete_many([_cache_key(code) for code, _ in settings.LANGUAGES])
@@ -0,0 +1,120 @@
+import logging
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from . import search
+from .catalog_cache import bump_catalog_version
+from .category_slugs import clear_category_slugs
+from .facets import refresh_facets
+from .models import Category, Product
+from .sidebar import invalidate_category_sidebar
+from .tasks import generate_product_thumbnails
+from .thumbnails import needs_thumbnails
+
+logger = logging.getLogger(__name__)
+
+CategoryTranslation = Category._parler_meta.root_model
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=CategoryTranslation)
+@receiver(post_delete, sender=CategoryTranslation)
+def invalidate_category_cache(sender, instance, **kwargs):
+    """
+    Clears the cached category sidebar, this process's slug map and the
+    fragments showing the category once the change is committed.
+    """
+    category_id = instance.master_id if sender is CategoryTranslation else instance.id
+    transaction.on_commit(invalidate_category_sidebar)
+    transaction.on_commit(clear_category_slugs)
+    transaction.on_commit(lambda: bump_catalog_version(category_id))
+
+
+@receiver(pre_save, sender=Product)
+def remember_old_category(sender, instance, **kwargs):
+    """
+    Records the stored category of a product about to be saved, so the
+    category it is moved out of is invalidated too.
+    """
+    if instance.pk:
+        instance._old_category_id = (
+            Product.objects.filter(pk=instance.pk).values_list('category_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_cache(sender, instance, **kwargs):
+    """
+    Invalidates the cached listing fragments of the product's categories
+    once the change is committed, then rebuilds their facet counts for the
+    new version. Saves from the admin change list (`list_editable`) go
+    through `Model.save()` and are covered as well.
+    """
+    category_ids = [instance.category_id, getattr(instance, '_old_category_id', None)]
+
+    def invalidate():
+        bump_catalog_version(*category_ids)
+        refresh_facets(*category_ids)
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    """
+    Updates the product's search index entry in the same transaction.
+    """
+    search.index_products([instance.id])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    """
+    Removes a deleted product from the search index.
+    """
+    search.remove_products([instance.id])
+
+
+@receiver(post_save, sender=CategoryTranslation)
+def reindex_category_products(sender, instance, **kwargs):
+    """
+    Re-indexes the products of a category whose name was translated or
+    changed, as category names are part of the product documents.
+    """
+    search.index_products(
+        Product.objects.filter(category_id=instance.master_id).values_list('id', flat=True)
+    )
+
+
+@receiver(pre_save, sender=Product)
+def clear_stale_thumbnails(sender, instance, **kwargs):
+    """
+    Drops the derivatives of a replaced or removed image, so pages show
+    the new image until its derivatives are ready.
+    """
+    if instance.thumbnails and (
+        not instance.image or instance.thumbnails.get('source') != instance.image.name
+    ):
+        instance.thumbnails = {}
+
+
+def _enqueue_thumbnails(product_id):
+    """
+    Enqueues the thumbnail task, leaving the image to
+    `manage.py generate_thumbnails` if the broker cannot be reached.
+    """
+    try:
+        generate_product_thumbnails.delay(product_id)
+    except Exception:
+        logger.exception('Could not enqueue thumbnails of product %s', product_id)
+
+
+@receiver(post_save, sender=Product)
+def queue_thumbnails(sender, instance, **kwargs):
+    """
+    Queues the derivatives of a new or replaced image once the product is
+    committed.
+    """
+    if needs_thumbnails(instance):
+        transaction.on_commit(lambda: _enqueue_thumbnails(instance.id))
@@ -0,0 +1,29 @@
+from celery import shared_task
+from . import popularity, thumbnails
+
+
+@shared_task
+def generate_product_thumbnails(product_id):
+    """
+    Celery task that writes the resized derivatives of a product's image
+    (see `shop.thumbnails`). Queued when a product's image changes.
+
+    Args:
+        product_id (int): Primary key of the `Product`.
+
+    Returns:
+        bool: True if new derivatives were stored.
+    """
+    return thumbnails.update_product_thumbnails(product_id)
+
+
+@shared_task
+def flush_product_views():
+    """
+    Periodic Celery task that writes the product views buffered in Redis
+    to the database and updates the popularity rankings.
+
+    Returns:
+        int: Number of views flushed.
+    """
+    return popularity.flush_views()
@@ -1,3 +1,966 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import time
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.forms import modelform_factory
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone, translation
+import redis
+from parler.forms import TranslatableModelForm
+from PIL import Image
+from orders import stock
+from orders.models import Order
+from .models import Category, Product, ProductViews
+from .pagination import encode_cursor, paginate_products
+from . import facets, popularity, search, thumbnails
+from .catalog_cache import catalog_version
+from .category_slugs import clear_category_slugs, resolve_category, warm_category_slugs
+from .importer import ProductImporter
+from .sidebar import build_category_sidebar, get_category_sidebar
 
-# Create your tests here.
+
+@override_settings(PRODUCTS_PER_PAGE=3)
+class ProductListPaginationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_category_slugs()
+        self.enterContext(translation.override('en'))
+        self.enterContext(mock.patch.object(popularity, 'r', FakeRedis()))
+        self.category = Category.objects.create(name='Tea', slug='tea')
+        # Repeated names make the ID the tie-breaker between pages
+        self.products = [
+            Product.objects.create(category=self.category, name=name, slug=f'tea-{i}', price=Decimal('1.00'))
+            for i, name in enumerate(['Oolong', 'Black', 'Green', 'Green', 'Green', 'White', 'Black'])
+        ]
+
+    def test_pages_cover_every_product_once_in_order(self):
+        seen = []
+        cursor = None
+        while True:
+            page, cursor = paginate_products(Product.objects.all(), cursor, per_page=2)
+            seen.extend(page)
+            if not cursor:
+                break
+        self.assertEqual(seen, sorted(self.products, key=lambda p: (p.name, p.id)))
+
+    def test_deep_page_is_one_query(self):
+        cursor = encode_cursor(sorted(self.products, key=lambda p: (p.name, p.id))[3])
+        with self.assertNumQueries(1):
+            page, next_cursor = paginate_products(Product.objects.all(), cursor, per_page=2)
+        self.assertEqual([p.name for p in page], ['Green', 'Oolong'])
+        self.assertIsNotNone(next_cursor)
+
+    def test_list_links_to_next_page(self):
+        response = self.client.get(reverse('shop:product_list'))
+        self.assertEqual(len(response.context['page'].products), 3)
+        self.assertContains(response, f'?after={response.context["page"].next_cursor}')
+
+    def test_infinite_scroll_gets_items_only(self):
+        first = self.client.get(reverse('shop:product_list'))
+        response = self.client.get(
+            reverse('shop:product_list'), {'after': first.context['page'].next_cursor},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+        self.assertTemplateUsed(response, 'shop/product/list_items.html')
+        self.assertTemplateNotUsed(response, 'shop/product/list.html')
+        self.assertIn('X-Requested-With', response['Vary'])
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get(reverse('shop:product_list'), {'after': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class CategorySidebarTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_category_slugs()
+        self.enterContext(translation.override('en'))
+        self.enterContext(mock.patch.object(popularity, 'r', FakeRedis()))
+        self.categories = []
+        for i in range(5):
+            category = Category(name=f'Tea {i}', slug=f'tea-{i}')
+            category.set_current_language('az')
+            category.name = f'Çay {i}'
+            category.slug = f'cay-{i}'
+            category.save()
+            self.categories.append(category)
+
+    def test_built_with_prefetched_translations(self):
+        with translation.override('az'), self.assertNumQueries(2):
+            sidebar = build_category_sidebar()
+        self.assertEqual(sidebar[0]['name'], 'Çay 0')
+        self.assertEqual(sidebar[0]['url'], '/az/cay-0/')
+
+    def test_cached_per_language(self):
+        get_category_sidebar()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_category_sidebar()[1]['slug'], 'tea-1')
+        with translation.override('az'):
+            self.assertEqual(get_category_sidebar()[1]['slug'], 'cay-1')
+
+    def test_language_variant_shares_invalidated_cache(self):
+        with translation.override('en-us'):
+            get_category_sidebar()
+        with self.assertNumQueries(0):
+            get_category_sidebar()
+        category = self.categories[0]
+        category.set_current_language('en')
+        category.name = 'Black tea'
+        with self.captureOnCommitCallbacks(execute=True):
+            category.save()
+        with translation.override('en-us'):
+            self.assertEqual(get_category_sidebar()[0]['name'], 'Black tea')
+
+    def test_translation_save_invalidates_cache(self):
+        get_category_sidebar()
+        category = self.categories[0]
+        category.set_current_language('en')
+        category.name = 'Black tea'
+        with self.captureOnCommitCallbacks(execute=True):
+            category.save()
+        self.assertEqual(get_category_sidebar()[0]['name'], 'Black tea')
+
+    def test_listing_page_cost_does_not_grow_with_categories(self):
+        self.client.get(reverse('shop:product_list'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('shop:product_list'))
+        self.assertFalse([q for q in queries if 'shop_category' in q['sql']])
+        self.assertContains(response, 'href="/en/tea-4/"')
+
+
+class CatalogFragmentCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_category_slugs()
+        self.enterContext(translation.override('en'))
+        self.enterContext(mock.patch.object(popularity, 'r', FakeRedis()))
+        self.tea = Category.objects.create(name='Tea', slug='tea')
+        self.coffee = Category.objects.create(name='Coffee', slug='coffee')
+        self.product = Product.objects.create(
+            category=self.tea, name='Green tea', slug='green-tea', price=Decimal('4.50')
+        )
+
+    def product_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response, [q for q in queries if 'shop_product' in q['sql']]
+
+    def test_cached_grid_skips_product_query(self):
+        self.product_queries(reverse('shop:product_list'))
+        response, queries = self.product_queries(reverse('shop:product_list'))
+        self.assertEqual(queries, [])
+        self.assertContains(response, 'Green tea')
+
+    def test_product_save_refreshes_grids(self):
+        self.client.get(reverse('shop:product_list'))
+        self.client.get(self.tea.get_absolute_url())
+        self.product.price = Decimal('5.25')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        self.assertContains(self.client.get(reverse('shop:product_list')), '$5.25')
+        self.assertContains(self.client.get(self.tea.get_absolute_url()), '$5.25')
+
+    def test_moving_product_invalidates_both_categories(self):
+        tea_version = catalog_version(self.tea.id)
+        coffee_version = catalog_version(self.coffee.id)
+        self.product.category = self.coffee
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        self.assertNotEqual(catalog_version(self.tea.id), tea_version)
+        self.assertNotEqual(catalog_version(self.coffee.id), coffee_version)
+
+    def test_other_category_stays_cached(self):
+        coffee_version = catalog_version(self.coffee.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(category=self.tea, name='Black tea', slug='black-tea', price=Decimal('3.00'))
+        self.assertEqual(catalog_version(self.coffee.id), coffee_version)
+
+    def test_admin_list_editable_invalidates(self):
+        self.client.get(reverse('shop:product_list'))
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('admin:shop_product_changelist'), {
+                'form-TOTAL_FORMS': '1',
+                'form-INITIAL_FORMS': '1',
+                'form-0-id': str(self.product.id),
+                'form-0-price': '6.75',
+                'form-0-available': 'on',
+                '_save': 'Save',
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertContains(self.client.get(reverse('shop:product_list')), '$6.75')
+
+    def test_detail_fragment_follows_product_updates(self):
+        recommender = self.enterContext(mock.patch('shop.views.Recommender'))
+        recommender.return_value.suggest_products_for.return_value = []
+        self.client.get(self.product.get_absolute_url())
+        self.product.description = 'Fresh leaves'
+        self.product.save()
+        self.assertContains(self.client.get(self.product.get_absolute_url()), 'Fresh leaves')
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_category_slugs()
+        self.enterContext(translation.override('en'))
+        self.enterContext(mock.patch.object(popularity, 'r', FakeRedis()))
+        recommender = self.enterContext(mock.patch('shop.views.Recommender'))
+        recommender.return_value.suggest_products_for.return_value = []
+        self.category = Category.objects.create(name='Tea', slug='tea')
+        self.product = Product.objects.create(
+            category=self.category, name='Green tea', slug='green-tea', price=Decimal('4.50')
+        )
+
+    def test_unchanged_list_is_not_modified(self):
+        for url in [reverse('shop:product_list'), self.category.get_absolute_url()]:
+            response = self.client.get(url)
+            self.assertTrue(response.has_header('Last-Modified'))
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 304)
+            self.assertFalse([q for q in queries if 'shop_product' in q['sql']])
+
+    def test_catalog_change_invalidates_list(self):
+        etag = self.client.get(reverse('shop:product_list'))['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        response = self.client.get(reverse('shop:product_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_cart_change_invalidates_page(self):
+        response = self.client.get(self.product.get_absolute_url())
+        self.client.post(reverse('cart:cart_add', args=[self.product.id]), {'quantity': 1})
+        response = self.client.get(self.product.get_absolute_url(), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Last-Modified'))
+
+    def test_detail_last_modified(self):
+        response = self.client.get(self.product.get_absolute_url())
+        last_modified = response['Last-Modified']
+        response = self.client.get(self.product.get_absolute_url(), HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+        # HTTP dates have one-second precision
+        Product.objects.filter(id=self.product.id).update(updated=timezone.now() + timedelta(seconds=2))
+        response = self.client.get(self.product.get_absolute_url(), HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+
+    def test_unknown_pages_are_not_found(self):
+        self.assertEqual(self.client.get('/en/missing/').status_code, 404)
+        self.assertEqual(self.client.get(f'/en/{self.product.id}/other/').status_code, 404)
+
+
+@skipUnless(search.is_supported(), 'Product search needs SQLite FTS5 or PostgreSQL')
+class ProductSearchTests(TestCase):
+
+    def setUp(self):
+        self.enterContext(translation.override('en'))
+        self.tea = Category.objects.create(name='Herbal tea', slug='herbal-tea')
+        self.mint = self.create('Peppermint leaves', 'Cooling and fresh')
+        self.chamomile = self.create('Chamomile', 'Calming blend with peppermint')
+
+    def create(self, name, description='', **kwargs):
+        return Product.objects.create(
+            category=self.tea, name=name, slug=name.lower().replace(' ', '-'),
+            description=description, price=Decimal('3.00'), **kwargs
+        )
+
+    def test_name_matches_rank_before_description_matches(self):
+        self.assertEqual(search.search_products('peppermint'), [self.mint, self.chamomile])
+
+    def test_last_term_matches_as_prefix(self):
+        self.assertEqual(search.search_products('pepp'), [self.mint, self.chamomile])
+        self.assertEqual(search.search_products('calming pepp'), [self.chamomile])
+
+    def test_category_name_is_searched(self):
+        self.assertEqual(set(search.search_products('herbal')), {self.mint, self.chamomile})
+
+    def test_unavailable_products_are_hidden(self):
+        self.mint.available = False
+        self.mint.save()
+        self.assertEqual(search.search_products('peppermint'), [self.chamomile])
+
+    def test_index_follows_changes(self):
+        self.mint.name = 'Spearmint'
+        self.mint.save()
+        self.assertEqual(search.search_products('spearmint'), [self.mint])
+        self.mint.delete()
+        self.assertEqual(search.search_products('spearmint'), [])
+
+        self.tea.name = 'Infusion'
+        self.tea.save()
+        self.assertEqual(search.search_products('infusion'), [self.chamomile])
+
+    def test_rebuild_indexes_bulk_created_products(self):
+        Product.objects.bulk_create([
+            Product(category=self.tea, name='Rooibos', slug='rooibos', price=Decimal('2.00'))
+        ])
+        self.assertEqual(search.search_products('rooibos'), [])
+        search.rebuild_index()
+        self.assertEqual([p.name for p in search.search_products('rooibos')], ['Rooibos'])
+
+    def test_punctuation_is_ignored(self):
+        self.assertEqual(search.search_products('"pepper*" ('), [self.mint, self.chamomile])
+        self.assertEqual(search.search_products('!!!'), [])
+
+    def test_search_view(self):
+        response = self.client.get(reverse('shop:product_search'), {'q': 'chamo'})
+        self.assertContains(response, 'Chamomile')
+        self.assertTemplateUsed(response, 'shop/product/search.html')
+
+        response = self.client.get(
+            reverse('shop:product_search'), {'q': 'nothing'}, HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+        self.assertTemplateNotUsed(response, 'shop/product/search.html')
+        self.assertContains(response, 'No products found')
+
+    def test_search_view_without_full_text_search(self):
+        with mock.patch('shop.search.is_supported', return_value=False), \
+                mock.patch('shop.search.get_search_index', side_effect=NotImplementedError):
+            response = self.client.get(reverse('shop:product_search'), {'q': 'mint PEPPER'})
+        self.assertEqual(list(response.context['products']), [self.mint])
+
+
+@override_settings(PRICE_FACET_BOUNDS=[10, 25])
+class ProductFacetTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_category_slugs()
+        self.enterContext(translation.override('en'))
+        self.enterContext(mock.patch.object(popularity, 'r', FakeRedis()))
+        self.tea = Category.objects.create(name='Tea', slug='tea')
+        self.coffee = Category.objects.create(name='Coffee', slug='coffee')
+        self.cheap = self.create(self.tea, 'Green tea', '4.00')
+        self.sold_out = self.create(self.tea, 'Oolong', '12.00', stock=0)
+        self.create(self.coffee, 'Espresso', '25.00', stock=5)
+        self.create(self.coffee, 'Decaf', '8.00', available=False)
+
+    def create(self, category, name, price, **kwargs):
+        return Product.objects.create(
+            category=category, name=name, slug=name.lower().replace(' ', '-'),
+            price=Decimal(price), **kwargs
+        )
+
+    def counts(self, category_ids, *filters):
+        price_counts, availability_counts = facets.facet_counts(category_ids, *filters)
+        return price_counts, availability_counts['in_stock'], availability_counts['out_of_stock']
+
+    def test_counts_by_price_range_and_stock(self):
+        both = [self.tea.id, self.coffee.id]
+        self.assertEqual(self.counts(both), ([1, 1, 1], 2, 1))
+        self.assertEqual(self.counts(both, None, 'in_stock'), ([1, 0, 1], 2, 1))
+        self.assertEqual(self.counts(both, 1), ([1, 1, 1], 0, 1))
+        self.assertEqual(self.counts([self.coffee.id]), ([0, 0, 1], 1, 0))
+
+    def test_cached_counts_skip_product_queries(self):
+        facets.get_histograms([self.tea.id, self.coffee.id])
+        with self.assertNumQueries(0):
+            self.counts([self.tea.id, self.coffee.id])
+
+    def test_product_save_refreshes_counts(self):
+        facets.get_histograms([self.tea.id])
+        self.cheap.price = Decimal('30.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cheap.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.counts([self.tea.id]), ([0, 1, 1], 1, 1))
+
+    def test_selling_out_refreshes_counts(self):
+        facets.get_histograms([self.tea.id])
+        order = Order.objects.create(
+            first_name='A', last_name='B', email='a@example.com',
+            address='Street 1', postal_code='1000', city='Baku'
+        )
+        self.cheap.stock = 1
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cheap.save()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            stock.reserve(order, [(self.cheap, 1)])
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.counts([self.tea.id]), ([1, 1, 0], 0, 2))
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            stock.release(order.reservations.all())
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.counts([self.tea.id]), ([1, 1, 0], 1, 1))
+
+    def test_listing_filters_and_shows_counts(self):
+        response = self.client.get(reverse('shop:product_list'), {'price': '10-25'})
+        self.assertEqual([p.name for p in response.context['page'].products], ['Oolong'])
+        self.assertContains(response, 'Under $10 (1)')
+        self.assertContains(response, 'href="?"')
+
+        response = self.client.get(self.tea.get_absolute_url(), {'availability': 'in_stock'})
+        self.assertEqual([p.name for p in response.context['page'].products], ['Green tea'])
+        self.assertContains(response, 'Out of stock (1)')
+
+    @override_settings(PRODUCTS_PER_PAGE=1)
+    def test_next_page_keeps_filters(self):
+        self.create(self.tea, 'White tea', '9.00')
+        response = self.client.get(reverse('shop:product_list'), {'price': '-10'})
+        self.assertContains(
+            response, f'?price=-10&amp;after={response.context["page"].next_cursor}'
+        )
+
+    def test_unknown_filter_is_not_found(self):
+        response = self.client.get(reverse('shop:product_list'), {'price': '1-2'})
+        self.assertEqual(response.status_code, 404)
+
+
+def make_image(width, height, color='green', format='PNG'):
+    """
+    Returns an uploaded image file of the given size.
+    """
+    out = BytesIO()
+    Image.new('RGB', (width, height), color).save(out, format)
+    return SimpleUploadedFile(f'{color}.{format.lower()}', out.getvalue())
+
+
+@override_settings(THUMBNAIL_WIDTHS=[100, 200, 400])
+class ProductThumbnailTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_category_slugs()
+        self.enterContext(translation.override('en'))
+        self.enterContext(mock.patch.object(popularity, 'r', FakeRedis()))
+        self.enterContext(override_settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())))
+        self.enqueue = self.enterContext(mock.patch('shop.signals.generate_product_thumbnails'))
+        self.category = Category.objects.create(name='Tea', slug='tea')
+        self.product = Product.objects.create(
+            category=self.category, name='Green tea', slug='green-tea',
+            price=Decimal('4.50'), image=make_image(300, 150)
+        )
+
+    def test_derivatives_are_smaller_and_content_hashed(self):
+        result = thumbnails.generate_thumbnails(self.product.image.name)
+        self.assertEqual(result['source'], self.product.image.name)
+        self.assertEqual(sorted(result['jpeg']), ['100', '200'])
+        with default_storage.open(result['webp']['100']) as file, Image.open(file) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (100, 50)))
+
+        # The same content gives the same names
+        other = Product.objects.create(
+            category=self.category, name='Copy', slug='copy', price=Decimal('1.00'), image=make_image(300, 150)
+        )
+        self.assertEqual(thumbnails.generate_thumbnails(other.image.name)['jpeg'], result['jpeg'])
+
+    def test_image_change_queues_task_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        self.enqueue.delay.assert_called_once_with(self.product.id)
+
+        self.assertTrue(thumbnails.update_product_thumbnails(self.product.id))
+        self.product.refresh_from_db()
+        self.enqueue.reset_mock()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        self.enqueue.delay.assert_not_called()
+
+    def test_listing_uses_srcset(self):
+        thumbnails.update_product_thumbnails(self.product.id)
+        response = self.client.get(reverse('shop:product_list'))
+        self.assertContains(response, '-200.webp 200w')
+        self.assertContains(response, 'loading="lazy"')
+
+    def test_replaced_image_drops_stale_derivatives(self):
+        old = thumbnails.generate_thumbnails(self.product.image.name)
+        thumbnails.save_thumbnails(self.product.id, old)
+        self.product.refresh_from_db()
+        self.product.image = make_image(500, 500, 'red')
+        self.product.save()
+        self.assertEqual(self.product.thumbnails, {})
+        # Derivatives of the old image arriving late are not stored
+        self.assertFalse(thumbnails.save_thumbnails(self.product.id, old))
+
+    def test_backfill_command(self):
+        Product.objects.filter(id=self.product.id).update(thumbnails={})
+        out = StringIO()
+        call_command('generate_thumbnails', workers=1, stdout=out, stderr=StringIO())
+        self.assertIn('of 1 products', out.getvalue())
+        self.product.refresh_from_db()
+        self.assertEqual(sorted(self.product.thumbnails['webp']), ['100', '200'])
+
+
+class ProductImportTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_category_slugs()
+        self.enterContext(translation.override('en'))
+        self.tea = Category.objects.create(name='Tea', slug='tea')
+        self.product = Product.objects.create(
+            category=self.tea, name='Green tea', slug='green-tea', price=Decimal('4.50'), stock=3
+        )
+
+    def run_import(self, content, format='csv', **options):
+        path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), f'feed.{format}')
+        with open(path, 'w', newline='') as file:
+            file.write(content)
+        out, err = StringIO(), StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_products', path, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_creates_products_and_categories(self):
+        out, _ = self.run_import(
+            'slug,name,price,stock,category,category_name,category_name_az,category_slug_az\n'
+            'french-press,French press,29.90,,brewing,Brewing,Dəmləmə,demleme\n'
+            'kettle,Kettle,19.00,5,brewing,Brewing,Dəmləmə,demleme\n'
+        )
+        self.assertIn('2 created', out)
+        press = Product.objects.get(slug='french-press')
+        self.assertEqual((press.price, press.stock), (Decimal('29.90'), None))
+        self.assertEqual(press.category.name, 'Brewing')
+        with translation.override('az'):
+            self.assertEqual(Category.objects.get(id=press.category_id).slug, 'demleme')
+        self.assertEqual(Category.objects.count(), 2)
+        if search.is_supported():
+            self.assertEqual(search.search_products('kettle'), [Product.objects.get(slug='kettle')])
+
+    def test_updates_changed_products_only(self):
+        version = catalog_version(self.tea.id)
+        out, _ = self.run_import(
+            '{"slug": "green-tea", "price": 4.5}\n'
+            '{"slug": "green-tea-2", "name": "Green tea 2", "price": "1", "category": "tea"}\n',
+            format='jsonl'
+        )
+        self.assertIn('1 created, 0 updated, 1 unchanged', out)
+
+        out, _ = self.run_import('slug,price,available\ngreen-tea,5.00,no\n')
+        self.assertIn('1 updated', out)
+        self.product.refresh_from_db()
+        # Columns missing from the feed keep their values
+        self.assertEqual((self.product.price, self.product.available, self.product.stock), (Decimal('5.00'), False, 3))
+        self.assertGreater(self.product.updated, self.product.created)
+        self.assertNotEqual(catalog_version(self.tea.id), version)
+
+    def test_rejected_rows_are_reported(self):
+        out, err = self.run_import(
+            '{"slug": "green-tea", "price": "cheap"}\nnot json\n{"slug": "new"}\n{"slug": "green-tea", "stock": 7}\n'
+            '{"slug": "new", "name": "New", "price": "1", "category": "search"}\n',
+            format='jsonl'
+        )
+        self.assertIn('4 rejected', out)
+        self.assertIn('Line 1: invalid price', err)
+        self.assertIn('Line 2: not an object', err)
+        self.assertIn('Line 3: new product needs category_id, name, price', err)
+        self.assertIn("Line 5: reserved category slug 'search'", err)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 7)
+
+    def test_prices_must_fit_the_price_column(self):
+        out, err = self.run_import(
+            'slug,price\ngreen-tea,NaN\ngreen-tea,Infinity\ngreen-tea,1e20\ngreen-tea,99999999.99\n'
+        )
+        self.assertIn('0 created, 1 updated, 0 unchanged, 3 rejected', out)
+        self.assertIn("Line 2: invalid price 'NaN'", err)
+        self.assertIn("Line 3: invalid price 'Infinity'", err)
+        self.assertIn("Line 4: price too large '1e20'", err)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.price, Decimal('99999999.99'))
+
+    def test_batch_cost_does_not_grow_with_rows(self):
+        def queries(count):
+            rows = [
+                (line, {'slug': f'p-{count}-{i}', 'name': 'P', 'price': '1', 'category': f'new-{count}-{i % 3}'})
+                for line, i in enumerate(range(count), 1)
+            ]
+            importer = ProductImporter('en', batch_size=count)
+            with CaptureQueriesContext(connection) as captured:
+                list(importer.run(rows))
+            return len(captured)
+        self.assertEqual(queries(5), queries(50))
+
+
+@override_settings(API_PAGE_SIZE=2)
+class CatalogApiTests(TestCase):
+
+    def setUp(self):
+        self.enterContext(mock.patch.object(popularity, 'r', FakeRedis()))
+        cache.clear()
+        clear_category_slugs()
+        with translation.override('en'):
+            self.tea = Category(name='Tea', slug='tea')
+            self.tea.set_current_language('az')
+            self.tea.name = 'Çay'
+            self.tea.slug = 'cay'
+            self.tea.save()
+            self.coffee = Category.objects.create(name='Coffee', slug='coffee')
+        self.products = [
+            Product.objects.create(category=self.tea, name=f'Tea {i}', slug=f'tea-{i}', price=Decimal('4.50'), stock=i)
+            for i in range(3)
+        ]
+        Product.objects.create(category=self.coffee, name='Hidden', slug='hidden', price=Decimal('1'), available=False)
+
+    def test_product_pages_follow_next_links(self):
+        url = reverse('api:product_list')
+        names = []
+        while url:
+            data = self.client.get(url).json()
+            names += [product['name'] for product in data['results']]
+            url = data['next']
+        self.assertEqual(names, ['Tea 0', 'Tea 1', 'Tea 2'])
+
+    def test_sparse_fields_and_language(self):
+        response = self.client.get(reverse('api:product_list'), {
+            'fields': 'id,price,in_stock,category_name,url', 'language': 'az', 'limit': 1
+        })
+        self.assertEqual(response.json()['results'], [{
+            'id': self.products[0].id,
+            'price': '4.50',
+            'in_stock': False,
+            'category_name': 'Çay',
+            'url': f'http://testserver/az/{self.products[0].id}/tea-0/',
+        }])
+
+    def test_only_requested_columns_are_read(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('api:product_list'), {'fields': 'name'})
+        sql = [q['sql'] for q in queries if 'shop_product' in q['sql']][0]
+        self.assertNotIn('description', sql)
+
+    def test_invalid_parameters(self):
+        for params in [{'fields': 'secret'}, {'language': 'xx'}, {'limit': '0'}, {'after': 'x'}]:
+            response = self.client.get(reverse('api:product_list'), params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn('error', response.json())
+
+    def test_categories(self):
+        response = self.client.get(reverse('api:category_list'), {'language': 'az', 'fields': 'name,slug'})
+        self.assertEqual(response.json()['results'], [{'name': 'Çay', 'slug': 'cay'}, {'name': 'Coffee', 'slug': 'coffee'}])
+
+    def test_export_streams_json_lines(self):
+        response = self.client.get(reverse('api:product_export'), {'category': self.tea.id, 'fields': 'slug'})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [{'slug': f'tea-{i}'} for i in range(3)])
+
+    def test_unchanged_response_is_not_modified(self):
+        url = reverse('api:product_list')
+        etag = self.client.get(url, {'category': self.tea.id})['ETag']
+        response = self.client.get(url, {'category': self.tea.id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get(url, {'category': self.coffee.id}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[0].save()
+        response = self.client.get(url, {'category': self.tea.id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class CategorySlugTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_category_slugs()
+        self.enterContext(translation.override('en'))
+        self.enterContext(mock.patch.object(popularity, 'r', FakeRedis()))
+        self.tea = Category(name='Tea', slug='tea')
+        self.tea.set_current_language('az')
+        self.tea.name = 'Çay'
+        self.tea.slug = 'cay'
+        self.tea.save()
+        self.coffee = Category.objects.create(name='Coffee', slug='coffee')
+
+    def test_category_page_needs_no_category_query(self):
+        warm_category_slugs()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/az/cay/')
+        self.assertEqual(response.context['category']['id'], self.tea.id)
+        self.assertFalse([q for q in queries if 'shop_category' in q['sql']])
+
+    def test_untranslated_category_resolves_by_fallback_slug(self):
+        self.assertEqual(resolve_category('az', 'coffee')['id'], self.coffee.id)
+        self.assertIsNone(resolve_category('az', 'tea'))
+        self.assertEqual(self.client.get('/az/coffee/').status_code, 200)
+
+    def test_renamed_slug_resolves_at_once(self):
+        resolve_category('en', 'tea')
+        self.tea.set_current_language('en')
+        self.tea.slug = 'black-tea'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tea.save()
+        self.assertEqual(resolve_category('en', 'black-tea')['id'], self.tea.id)
+        self.assertIsNone(resolve_category('en', 'tea'))
+
+    def test_other_processes_reload_missing_slugs(self):
+        resolve_category('en', 'tea')
+        # A category created by another process: only the shared cache is cleared
+        with translation.override('en'):
+            herbal = Category.objects.create(name='Herbal', slug='herbal')
+        cache.clear()
+        later = time.monotonic() + settings.CATEGORY_SLUG_MISS_RELOAD_INTERVAL + 1
+        with mock.patch('shop.category_slugs.time.monotonic', return_value=later):
+            self.assertEqual(resolve_category('en', 'herbal')['id'], herbal.id)
+        self.assertEqual(self.client.get('/en/missing/').status_code, 404)
+
+    def test_unknown_slugs_reload_at_most_once_per_interval(self):
+        resolve_category('en', 'tea')
+        with mock.patch('shop.category_slugs.get_category_sidebar') as sidebar:
+            for _ in range(3):
+                self.assertIsNone(resolve_category('en', 'missing'))
+            sidebar.assert_not_called()
+
+            later = time.monotonic() + settings.CATEGORY_SLUG_MISS_RELOAD_INTERVAL + 1
+            with mock.patch('shop.category_slugs.time.monotonic', return_value=later):
+                for _ in range(3):
+                    self.assertIsNone(resolve_category('en', 'missing'))
+            sidebar.assert_called_once()
+
+    def test_page_slugs_are_reserved(self):
+        form = modelform_factory(Category, form=TranslatableModelForm, fields=['name', 'slug'])(
+            data={'name': 'Search', 'slug': 'search'}
+        )
+        self.assertEqual(form.errors['slug'], ['"search" is reserved for a shop page.'])
+        self.assertEqual(self.client.get('/en/search/').resolver_match.url_name, 'product_search')
+
+
+class FakeRedis:
+    """
+    In-memory stand-in for the Redis commands used by `shop.popularity` and
+    `shop.recommender`. HyperLogLogs are exact sets.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.locked = False
+
+    def pipeline(self, transaction=True):
+        self.results = []
+        return self
+
+    def execute(self):
+        results, self.results = self.results, []
+        return results
+
+    def _result(self, value):
+        if hasattr(self, 'results'):
+            self.results.append(value)
+        return value
+
+    def hincrby(self, key, field, amount):
+        counts = self.data.setdefault(key, defaultdict(int))
+        counts[str(field).encode()] += amount
+        return self._result(counts[str(field).encode()])
+
+    def pfadd(self, key, value):
+        return self._result(self.data.setdefault(key, set()).add(value))
+
+    def pfcount(self, key):
+        return self._result(len(self.data.get(key, ())))
+
+    def zadd(self, key, mapping):
+        self.data.setdefault(key, {}).update(mapping)
+        return self._result(len(mapping))
+
+    def zincrby(self, key, amount, member):
+        ranking = self.data.setdefault(key, {})
+        ranking[member] = ranking.get(member, 0) + amount
+        return self._result(ranking[member])
+
+    def zunionstore(self, key, keys):
+        union = defaultdict(int)
+        for source in keys:
+            for member, score in self.data.get(source, {}).items():
+                union[member] += score
+        self.data[key] = dict(union)
+
+    def zrem(self, key, *members):
+        for member in members:
+            self.data.get(key, {}).pop(member, None)
+
+    def zrevrange(self, key, start, end):
+        ranking = sorted(self.data.get(key, {}).items(), key=lambda item: -item[1])
+        return [str(member).encode() for member, _ in ranking[start:end + 1]]
+
+    def zrange(self, key, start, end, desc=False):
+        ranking = sorted(self.data.get(key, {}).items(), key=lambda item: -item[1] if desc else item[1])
+        end = len(ranking) if end == -1 else end + 1
+        return [str(member).encode() for member, _ in ranking[start:end]]
+
+    def exists(self, key):
+        return key in self.data
+
+    def rename(self, key, new_key):
+        if key not in self.data:
+            raise redis.ResponseError('no such key')
+        self.data[new_key] = self.data.pop(key)
+
+    def hgetall(self, key):
+        return {field: str(count).encode() for field, count in self.data.get(key, {}).items()}
+
+    def hdel(self, key, *fields):
+        counts = self.data.get(key, {})
+        for field in fields:
+            counts.pop(str(field).encode(), None)
+        return self._result(len(fields))
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def lock(self, name, timeout=None, blocking=True):
+        fake = self
+
+        class Lock:
+            def acquire(self):
+                if fake.locked:
+                    return False
+                fake.locked = self
+                return True
+
+            def release(self):
+                if fake.locked is not self:
+                    raise redis.exceptions.LockNotOwnedError('Cannot release a lock that is no longer owned')
+                fake.locked = False
+
+        return Lock()
+
+
+class ProductPopularityTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_category_slugs()
+        self.enterContext(translation.override('en'))
+        recommender = self.enterContext(mock.patch('shop.views.Recommender'))
+        recommender.return_value.suggest_products_for.return_value = []
+        self.redis = FakeRedis()
+        self.enterContext(mock.patch.object(popularity, 'r', self.redis))
+        self.tea = Category.objects.create(name='Tea', slug='tea')
+        self.coffee = Category.objects.create(name='Coffee', slug='coffee')
+        self.green = Product.objects.create(category=self.tea, name='Green tea', slug='green-tea', price=Decimal('4.50'))
+        self.black = Product.objects.create(category=self.tea, name='Black tea', slug='black-tea', price=Decimal('3.00'))
+        self.mocha = Product.objects.create(category=self.coffee, name='Mocha', slug='mocha', price=Decimal('6.00'))
+
+    def view(self, product, times=1, **headers):
+        for _ in range(times):
+            self.client.get(product.get_absolute_url(), **headers)
+
+    def test_views_are_buffered_until_flushed(self):
+        self.view(self.green, 3)
+        self.view(self.green, REMOTE_ADDR='10.0.0.2')
+        self.view(self.mocha)
+        self.assertFalse(ProductViews.objects.exists())
+
+        self.assertEqual(popularity.flush_views(), 5)
+        stats = ProductViews.objects.get(product=self.green)
+        self.assertEqual((stats.views, stats.unique_visitors), (4, 2))
+        self.assertEqual(ProductViews.objects.get(product=self.mocha).views, 1)
+        self.assertEqual(popularity.flush_views(), 0)
+
+    def test_flush_adds_to_totals_in_few_queries(self):
+        self.view(self.green)
+        popularity.flush_views()
+        self.view(self.green, 2)
+        self.view(self.black)
+        with self.assertNumQueries(6):
+            # Products, locked stats, insert, update and the savepoint pair
+            popularity.flush_views()
+        self.assertEqual(ProductViews.objects.get(product=self.green).views, 3)
+        self.assertEqual(ProductViews.objects.get(product=self.black).views, 1)
+
+    def test_interrupted_flush_is_resumed(self):
+        self.view(self.green, 2)
+        with mock.patch.object(popularity, '_apply_batch', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                popularity.flush_views()
+        self.view(self.black)
+        self.assertEqual(popularity.flush_views(), 2)
+        self.assertEqual(ProductViews.objects.get(product=self.green).views, 2)
+        self.assertEqual(popularity.flush_views(), 1)
+
+    def test_resumed_flush_skips_committed_batches(self):
+        self.view(self.green, 2)
+        self.view(self.black, 3)
+        apply_batch = popularity._apply_batch
+        batches = []
+
+        def fail_second_batch(counts, product_ids):
+            batches.append(product_ids)
+            if len(batches) == 2:
+                raise RuntimeError
+            apply_batch(counts, product_ids)
+
+        with mock.patch.object(popularity, '_apply_batch', side_effect=fail_second_batch):
+            with self.assertRaises(RuntimeError):
+                popularity.flush_views(batch_size=1)
+        self.assertEqual(popularity.flush_views(batch_size=1), 3)
+        self.assertEqual(ProductViews.objects.get(product=self.green).views, 2)
+        self.assertEqual(ProductViews.objects.get(product=self.black).views, 3)
+
+    def test_lost_version_is_replaced_by_a_new_one(self):
+        version = popularity.popularity_version()
+        self.assertEqual(popularity.popularity_version(), version)
+        cache.delete(popularity.VERSION_CACHE_KEY)
+        self.assertNotEqual(popularity.popularity_version(), version)
+
+    def test_overlapping_flush_is_skipped(self):
+        self.view(self.green)
+        self.redis.locked = True
+        self.assertEqual(popularity.flush_views(), 0)
+        self.assertFalse(ProductViews.objects.exists())
+
+    def test_expired_lock_is_left_to_its_new_owner(self):
+        self.view(self.green)
+        apply_batch = popularity._apply_batch
+
+        def outlive_lock(counts, product_ids):
+            apply_batch(counts, product_ids)
+            # The lock expired and another flush took it
+            self.redis.locked = 'other flush'
+
+        with mock.patch.object(popularity, '_apply_batch', side_effect=outlive_lock):
+            self.assertEqual(popularity.flush_views(), 1)
+        self.assertEqual(self.redis.locked, 'other flush')
+
+    def test_popular_products_by_category(self):
+        self.view(self.black, 2)
+        self.view(self.green)
+        self.view(self.mocha, 3)
+        popularity.flush_views()
+        self.assertEqual(popularity.popular_products(self.tea.id), [self.black, self.green])
+        self.assertEqual(popularity.popular_products(limit=2), [self.mocha, self.black])
+
+        self.black.available = False
+        self.black.save()
+        self.assertEqual(popularity.popular_products(self.tea.id), [self.green])
+
+    def test_list_shows_popular_products_after_flush(self):
+        url = self.tea.get_absolute_url()
+        response = self.client.get(url)
+        self.assertNotContains(response, 'Most popular')
+        self.view(self.black)
+        popularity.flush_views()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Most popular')
+
+    def test_redis_failure_does_not_break_pages(self):
+        with mock.patch.object(self.redis, 'pipeline', side_effect=redis.ConnectionError):
+            with self.assertLogs('shop.popularity', 'WARNING'):
+                response = self.client.get(self.green.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+        with mock.patch.object(self.redis, 'zrevrange', side_effect=redis.ConnectionError):
+            with self.assertLogs('shop.popularity', 'WARNING'):
+                self.assertEqual(popularity.popular_products(self.tea.id), [])
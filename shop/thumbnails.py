@@ -0,0 +1,145 @@
+import hashlib
+import logging
+import posixpath
+from io import BytesIO
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+from .catalog_cache import bump_catalog_version
+from .models import Product
+
+# Resized derivatives of product images.
+# Every uploaded image is scaled to the widths in `THUMBNAIL_WIDTHS` and saved
+# as JPEG and WebP under a name derived from the source file's content hash,
+# so a derivative never changes once written and can be cached forever.
+# Derivatives are made by a Celery task queued when a product's image
+# changes (see `shop.signals`); `manage.py generate_thumbnails` backfills
+# existing images.
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', {'quality': 80, 'method': 6}),
+}
+
+
+def content_hash(file):
+    """
+    Returns the SHA-256 hex digest of a file's content.
+    """
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def derivative_name(digest, width, extension):
+    """
+    Returns the storage name of a derivative, e.g.
+    'products/thumbnails/ab/ab12…-320.webp'.
+    """
+    return posixpath.join(
+        settings.THUMBNAIL_DIRECTORY, digest[:2], f'{digest}-{width}.{extension}'
+    )
+
+
+def _encode(image, extension):
+    """
+    Encodes an image in one of `FORMATS`.
+    """
+    format, options = FORMATS[extension]
+    if format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    out = BytesIO()
+    image.save(out, format, **options)
+    return out.getvalue()
+
+
+def generate_thumbnails(image_name, storage=default_storage):
+    """
+    Writes the derivatives of a stored image.
+
+    The image is decoded once and scaled down to each width in
+    `THUMBNAIL_WIDTHS` that is smaller than the original; images are never
+    enlarged. Derivatives that already exist are not written again, since
+    equal names mean equal content. Uses no database, so it can run in a
+    worker process.
+
+    Args:
+        image_name (str): Storage name of the source image.
+        storage (Storage): Storage of the source image and derivatives.
+
+    Returns:
+        dict: The `source` name and, per format extension, a dict of
+        derivative names keyed by width (as a string, like JSON keys).
+    """
+    with storage.open(image_name, 'rb') as file:
+        digest = content_hash(file)
+        file.seek(0)
+        with Image.open(file) as image:
+            image = ImageOps.exif_transpose(image)
+            image.load()
+
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or 'A' in image.mode else 'RGB')
+    widths = sorted({width for width in settings.THUMBNAIL_WIDTHS if width < image.width})
+
+    thumbnails = {'source': image_name}
+    for extension in FORMATS:
+        thumbnails[extension] = {}
+    for width in widths:
+        height = round(image.height * width / image.width)
+        resized = image.resize((width, height), Image.Resampling.LANCZOS)
+        for extension in FORMATS:
+            name = derivative_name(digest, width, extension)
+            if not storage.exists(name):
+                name = storage.save(name, ContentFile(_encode(resized, extension)))
+            thumbnails[extension][str(width)] = name
+    return thumbnails
+
+
+def needs_thumbnails(product):
+    """
+    Returns True if a product's derivatives are missing or were made from
+    another image.
+    """
+    return bool(product.image) and product.thumbnails.get('source') != product.image.name
+
+
+def save_thumbnails(product_id, thumbnails):
+    """
+    Stores the derivatives of a product's image, unless the product's image
+    was changed while they were generated, and refreshes the catalog pages
+    showing it.
+
+    Returns:
+        bool: False if the product no longer has the source image.
+    """
+    product = Product.objects.filter(id=product_id, image=thumbnails['source'])
+    if not product.update(thumbnails=thumbnails):
+        return False
+    category_id = product.values_list('category_id', flat=True).first()
+    transaction.on_commit(lambda: bump_catalog_version(category_id))
+    return True
+
+
+def update_product_thumbnails(product_id):
+    """
+    Generates and stores the derivatives of a product's current image.
+
+    Returns:
+        bool: True if new derivatives were stored.
+    """
+    product = Product.objects.filter(id=product_id).only('image', 'thumbnails').first()
+    if product is None or not needs_thumbnails(product):
+        return False
+    try:
+        thumbnails = generate_thumbnails(product.image.name)
+    except (OSError, Image.DecompressionBombError) as exc:
+        logger.warning('Could not make thumbnails of product %s: %s', product_id, exc)
+        return False
+    return save_thumbnails(product_id, thumbnails)
+
@@ -8,6 +8,7 @@ app_name = 'shop'
 # URL patterns for the shop application.
 # Handles:
 # - Product list view (all products or filtered by category)
+# - Product search
 # - Product detail view (specific product by ID and slug)
 
 
@@ -15,6 +16,10 @@ urlpatterns = [
 	# Displays all available products
 	path('',views.product_list,name='product_list'),
 
+	# Full-text product search; listed before the category pattern it would
+	# match, so `search` is a reserved category slug (see `shop.models`)
+	path('search/',views.product_search,name='product_search'),
+
 	# Displays products filtered by category slug
 	path('<slug:category_slug>/',views.product_list,name='product_list_by_category'),
 
@@ -1,5 +1,21 @@
+from django.conf import settings
+from django.http import Http404
 from django.shortcuts import render, get_object_or_404
-from .models import Category, Product
+from django.utils.cache import patch_vary_headers
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import urlencode
+from django.views.decorators.http import condition
+from .catalog_cache import catalog_version
+from .category_slugs import resolve_category
+from .conditional import (
+    product_detail_etag, product_detail_last_modified, product_list_etag, product_list_last_modified
+)
+from .facets import InvalidFacet, build_facets, filter_products, parse_filters
+from .models import Product
+from .pagination import InvalidCursor, decode_cursor, paginate_products
+from .popularity import popular_products, popularity_version, record_view
+from . import search
+from .sidebar import get_category_sidebar
 from cart.forms import CartAddProductForm
 from .recommender import Recommender
 
@@ -7,12 +23,30 @@ from .recommender import Recommender
 # Handles product listing, category filtering, and detailed product pages with recommendations.
 
 
+@condition(etag_func=product_list_etag, last_modified_func=product_list_last_modified)
 def product_list(request, category_slug=None):
     """
-    Display a list of available products.
+    Display a page of available products.
     
     If a category slug is provided, filter the products by that category.
-    Supports multilingual category lookup using django-parler's translation system.
+    The slug is resolved in the active language without a query (see
+    `shop.category_slugs`); `category` in the context is its sidebar entry.
+
+    Products are paginated with a keyset cursor passed as `?after=`
+    (see `shop.pagination`). Infinite-scroll requests (sent with
+    `X-Requested-With: XMLHttpRequest`) get only the product items and
+    the link to the next page.
+
+    Products can be filtered by price range (`?price=10-25`) and stock
+    (`?availability=in_stock`). The number of products for every filter
+    value is shown beside the list, added up from per-category histograms
+    kept in the cache (see `shop.facets`), together with the most viewed
+    products (see `shop.popularity`).
+
+    The product grid is a cached template fragment keyed by language,
+    category, filters, cursor and catalog version (see `shop.catalog_cache`); the
+    page is only queried when the fragment is not cached. Repeat requests
+    for an unchanged page get a 304 (see `shop.conditional`).
     
     Args:
         request (HttpRequest): The incoming HTTP request object.
@@ -22,38 +56,77 @@ def product_list(request, category_slug=None):
         HttpResponse: Rendered HTML page displaying a list of products.
     """
     category = None
-    categories = Category.objects.all()
+    # Sidebar entries for the active language, cached (see `shop.sidebar`)
+    categories = get_category_sidebar()
     products = Product.objects.filter(available=True)
 
     if category_slug:
-        # Fetch the current request's active language
-        language = request.LANGUAGE_CODE
-
-        # Get category for the current language and slug
-        category = get_object_or_404(
-            Category,
-            translations__language_code=language,
-            translations__slug=category_slug
-        )
+        # Resolve the slug in the active language from the in-process map
+        # (see `shop.category_slugs`) instead of joining the translations
+        category = resolve_category(request.LANGUAGE_CODE, category_slug)
+        if category is None:
+            raise Http404('No category with this slug')
 
         # Filter products belonging to the selected category
-        products = products.filter(category=category)
+        products = products.filter(category_id=category['id'])
+
+    try:
+        price_index, availability = parse_filters(request.GET)
+    except InvalidFacet:
+        raise Http404('Invalid filter')
+    products = filter_products(products, price_index, availability)
+    # Canonical filter parameters, carried over to the next page links
+    filter_query = urlencode({
+        name: request.GET[name] for name in ('price', 'availability') if request.GET.get(name)
+    })
+    category_ids = [category['id']] if category else [c['id'] for c in categories]
+
+    cursor = request.GET.get('after')
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except InvalidCursor:
+            raise Http404('Invalid page cursor')
 
     context = {
         'category': category,
         'categories': categories,
-        'products': products,
+        'page': SimpleLazyObject(
+            lambda: paginate_products(products, cursor, settings.PRODUCTS_PER_PAGE)
+        ),
+        'cursor': cursor,
+        'facets': SimpleLazyObject(
+            lambda: build_facets(request.GET, category_ids, price_index, availability)
+        ),
+        'filter_query': filter_query,
+        'popular_products': SimpleLazyObject(
+            lambda: popular_products(category['id'] if category else None, settings.POPULAR_PRODUCTS_LIMIT)
+        ),
+        'popularity_version': popularity_version(),
+        'language': request.LANGUAGE_CODE,
+        'catalog_version': catalog_version(category['id'] if category else None),
+        'catalog_cache_timeout': settings.CATALOG_CACHE_TIMEOUT,
     }
 
-    return render(request, 'shop/product/list.html', context)
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        response = render(request, 'shop/product/list_items.html', context)
+    else:
+        response = render(request, 'shop/product/list.html', context)
+    patch_vary_headers(response, ['X-Requested-With'])
+    return response
 
 
+@condition(etag_func=product_detail_etag, last_modified_func=product_detail_last_modified)
 def product_detail(request, id, slug):
     """
     Display detailed information about a single product.
     
     Also provides a form to add the product to the cart and 
     shows recommended products using the Redis-based Recommender system.
+    The view is counted for the popularity rankings (see `shop.popularity`).
+    The product body is a cached template fragment that changes with the
+    product's `updated` time and its category's catalog version. Repeat
+    requests for an unchanged page get a 304 (see `shop.conditional`).
     
     Args:
         request (HttpRequest): The incoming HTTP request object.
@@ -74,10 +147,56 @@ def product_detail(request, id, slug):
     r = Recommender()
     recommended_products = r.suggest_products_for([product], 4)
 
+    # Buffered in Redis and written to the database in batches
+    record_view(request, product)
+
     context = {
         'product': product,
         'cart_product_form': cart_product_form,
         'recommended_products': recommended_products,
+        'language': request.LANGUAGE_CODE,
+        'catalog_version': catalog_version(product.category_id),
+        'catalog_cache_timeout': settings.CATALOG_CACHE_TIMEOUT,
     }
 
     return render(request, 'shop/product/detail.html', context)
+
+
+def product_search(request):
+    """
+    Display the available products matching the search query `q`.
+
+    Uses the full-text index in `shop.search`, ranked by relevance; the
+    last word also matches as a prefix. On databases without full-text
+    search, products whose name contains every word are listed by name.
+    Search-as-you-type requests (sent with `X-Requested-With:
+    XMLHttpRequest`) get only the results.
+
+    Args:
+        request (HttpRequest): The incoming HTTP request object.
+
+    Returns:
+        HttpResponse: Rendered HTML page with the search results.
+    """
+    query = request.GET.get('q', '').strip()
+    if not query:
+        products = []
+    elif search.is_supported():
+        products = search.search_products(query, settings.SEARCH_RESULTS_LIMIT)
+    else:
+        products = Product.objects.filter(available=True)
+        for term in search.search_terms(query):
+            products = products.filter(name__icontains=term)
+        products = list(products[:settings.SEARCH_RESULTS_LIMIT])
+
+    context = {
+        'query': query,
+        'products': products,
+    }
+
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        response = render(request, 'shop/product/search_results.html', context)
+    else:
+        response = render(request, 'shop/product/search.html', context)
+    patch_vary_headers(response, ['X-Requested-With'])
+    return response